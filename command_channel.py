@@ -0,0 +1,129 @@
+import collections
+import logging
+import socket
+import threading
+import time
+
+
+class CommandChannel:
+    """
+    Long-lived, rate-limited command link to the ESP32.
+
+    One connected UDP socket is kept for the lifetime of the channel and a
+    dedicated sender thread drains a command queue:
+     - A queued MOVE or TURN is dropped when a newer command of the same kind
+       arrives, which goes to the tail of the queue (only the newest target
+       matters, e.g. with key auto-repeat, and it must not overtake commands
+       queued before it).
+     - STOP jumps the queue, drops pending MOVE/TURN commands and bypasses the
+       rate limit.
+     - Other commands are sent in order, at most one per min_interval seconds.
+    """
+
+    COALESCED_KINDS = ("MOVE", "TURN")
+
+    def __init__(self, host: str, port: int, min_interval: float = 0.02):
+        self.logger = logging.getLogger(__name__)
+        self.host = host
+        self.port = port
+        self.min_interval = min_interval
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.connect((host, port))
+
+        self._queue = collections.deque()  # Entries: [kind, command_string, enqueue_time]
+        self._cond = threading.Condition()
+        self._running = True
+        self._last_send_time = 0.0
+
+        # Statistics
+        self.sent = 0
+        self.coalesced = 0  # Commands replaced by a newer one of the same kind
+        self.preempted = 0  # Pending commands dropped by a STOP
+        self.send_errors = 0
+        self.max_queue_depth = 0
+        self.last_latency = 0.0  # Seconds from send() to the datagram leaving
+        self.max_latency = 0.0
+        self._latency_sum = 0.0
+
+        self._thread = threading.Thread(target=self._sender_loop, name="CommandChannel", daemon=True)
+        self._thread.start()
+
+    def send(self, command_string: str):
+        """Queues a command string (e.g. "MOVE,100,50") for sending."""
+        kind = command_string.split(',', 1)[0].strip().upper()
+        now = time.perf_counter()
+        with self._cond:
+            if kind == "STOP":
+                pending = len(self._queue)
+                self._queue = collections.deque(e for e in self._queue if e[0] not in self.COALESCED_KINDS)
+                self.preempted += pending - len(self._queue)
+                self._queue.appendleft([kind, command_string, now])
+            else:
+                if kind in self.COALESCED_KINDS:
+                    for entry in self._queue:
+                        if entry[0] == kind:
+                            # Send only the newest target, after everything queued before it
+                            self._queue.remove(entry)
+                            self.coalesced += 1
+                            break
+                self._queue.append([kind, command_string, now])
+            self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+            self._cond.notify()
+
+    def _sender_loop(self):
+        while True:
+            with self._cond:
+                while self._running and not self._queue:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                kind = self._queue[0][0]
+                wait = self._last_send_time + self.min_interval - time.perf_counter()
+                if kind != "STOP" and wait > 0:
+                    # Rate limit, but wake up early if a STOP arrives
+                    self._cond.wait(wait)
+                    continue
+                kind, command_string, enqueue_time = self._queue.popleft()
+
+            try:
+                self.sock.send(command_string.encode('utf-8'))
+                sent_time = time.perf_counter()
+                self.logger.debug("⬆️ Sent command to %s:%s: '%s'", self.host, self.port, command_string)
+            except OSError as e:
+                # A connected UDP socket reports ICMP errors (e.g. port unreachable) here
+                with self._cond:
+                    self.send_errors += 1
+                self.logger.error(f"❌ Failed to send command '{command_string}': {e}")
+                continue
+
+            with self._cond:
+                latency = sent_time - enqueue_time
+                self._last_send_time = sent_time
+                self.sent += 1
+                self.last_latency = latency
+                self.max_latency = max(self.max_latency, latency)
+                self._latency_sum += latency
+
+    def stats(self) -> dict:
+        """Returns send-latency (ms) and queue-depth statistics."""
+        with self._cond:
+            return {
+                "sent": self.sent,
+                "queue_depth": len(self._queue),
+                "max_queue_depth": self.max_queue_depth,
+                "coalesced": self.coalesced,
+                "preempted": self.preempted,
+                "send_errors": self.send_errors,
+                "last_latency_ms": self.last_latency * 1e3,
+                "avg_latency_ms": self._latency_sum / self.sent * 1e3 if self.sent else 0.0,
+                "max_latency_ms": self.max_latency * 1e3,
+            }
+
+    def close(self, timeout: float = 1.0):
+        """Stops the sender thread (pending commands are discarded) and closes the socket."""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join(timeout=timeout)
+        self.sock.close()
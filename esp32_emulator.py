@@ -0,0 +1,370 @@
+"""
+Local stand-in for the ESP32-S3 running esp32_s3_UDP_code.ino.
+
+Sends combined MF/RB telemetry datagrams to the host (port 12346) and accepts
+MOVE/TURN/STOP commands (port 12345), driving a differential-drive model whose
+ToF readings are ray-cast against a 2D floor plan. Useful for load and
+regression testing RobotInterface without hardware:
+
+    python esp32_emulator.py --rate 2000 --target-host 127.0.0.1
+    python main.py --robot-host 127.0.0.1
+
+Units follow the firmware: pose and odometer in cm, ToF ranges in mm, yaw in
+degrees (clockwise positive).
+"""
+import argparse
+import json
+import logging
+import math
+import selectors
+import socket
+import time
+import numpy as np
+
+import logger_config
+import telemetry_codec
+
+logger = logging.getLogger(__name__)
+
+# ToF beam directions relative to the robot's forward direction, same as RobotInterface
+TOF_ANGLES_RAD = np.deg2rad(np.arange(22.15, 342.15, 45))
+
+
+class FloorPlan:
+    """
+    A set of wall segments in cm that ToF beams are ray-cast against.
+    """
+
+    def __init__(self, walls):
+        """
+        Args:
+            walls: Sequence of (x1, y1, x2, y2) wall segments in cm.
+        """
+        walls = np.asarray(walls, dtype=np.float64).reshape(-1, 4)
+        self.p = walls[:, 0:2]
+        self.d = walls[:, 2:4] - walls[:, 0:2]
+
+    @classmethod
+    def rectangle(cls, width: float = 300.0, height: float = 200.0):
+        """A closed rectangular room centered on the origin."""
+        w, h = width / 2, height / 2
+        return cls([(-w, -h, w, -h), (w, -h, w, h), (w, h, -w, h), (-w, h, -w, -h)])
+
+    @classmethod
+    def from_file(cls, path: str):
+        """
+        Loads a floor plan from a JSON file of the form
+        {"walls": [[x1, y1, x2, y2], ...]} (cm).
+        """
+        with open(path) as f:
+            return cls(json.load(f)["walls"])
+
+    def raycast(self, x: float, y: float, angles_rad: np.ndarray, max_range: float) -> np.ndarray:
+        """
+        Returns the distance from (x, y) to the nearest wall along every beam,
+        or inf if no wall is hit within max_range.
+        """
+        rays = np.stack((np.cos(angles_rad), np.sin(angles_rad)), axis=1)  # (beams, 2)
+        # Solve origin + t * ray = p + u * d for every beam/wall pair
+        denom = rays[:, None, 0] * self.d[None, :, 1] - rays[:, None, 1] * self.d[None, :, 0]
+        qx = self.p[None, :, 0] - x
+        qy = self.p[None, :, 1] - y
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = (qx * self.d[None, :, 1] - qy * self.d[None, :, 0]) / denom
+            u = (qx * rays[:, None, 1] - qy * rays[:, None, 0]) / denom
+        hit = (denom != 0) & (t >= 0) & (u >= 0) & (u <= 1) & (t <= max_range)
+        return np.where(hit, t, np.inf).min(axis=1, initial=np.inf)
+
+
+class DifferentialDriveModel:
+    """
+    Kinematic model of the two-wheeled robot executing the firmware commands.
+
+    TURN,<heading>,<speed> rotates in place to an absolute yaw, MOVE,<odometer>,<speed>
+    drives straight until the odometer reaches the given value and STOP halts both
+    wheels. The wheel speed is the command speed in cm/s.
+    """
+
+    def __init__(self, wheel_base: float = 15.0, ticks_per_cm: float = 20.0,
+                 max_speed: float = 100.0):
+        """
+        Args:
+            wheel_base: Distance between the wheels in cm.
+            ticks_per_cm: Encoder ticks per cm of wheel travel.
+            max_speed: Wheel speed limit in cm/s.
+        """
+        self.wheel_base = wheel_base
+        self.ticks_per_cm = ticks_per_cm
+        self.max_speed = max_speed
+        self.x = 0.0
+        self.y = 0.0
+        self.yaw_deg = 0.0  # Clockwise positive, like robotYawDegrees
+        self.odometer = 0.0  # Signed travelled distance, like robotDistanceCm
+        self.left_wheel = 0.0  # Wheel travel in cm
+        self.right_wheel = 0.0
+        self.mode = "STOP"
+        self.setpoint = 0.0
+        self.speed = 0.0
+
+    def command(self, command_string: str) -> bool:
+        """Applies one "CMD,value,speed" command. Returns False if it is malformed."""
+        parts = command_string.strip().split(",")
+        if len(parts) != 3:
+            return False
+        cmd = parts[0].strip().upper()
+        try:
+            # The firmware parses both fields with String.toInt()
+            value, speed = int(float(parts[1])), int(float(parts[2]))
+        except ValueError:
+            return False
+        if cmd not in ("MOVE", "TURN", "STOP"):
+            return False
+        self.mode = cmd
+        self.setpoint = float(value)
+        self.speed = min(abs(float(speed)), self.max_speed)
+        return True
+
+    def step(self, dt: float):
+        """Advances the model by dt seconds."""
+        left = right = 0.0
+        if self.mode == "TURN":
+            error = math.remainder(self.setpoint - self.yaw_deg, 360.0)
+            # In-place rotation: yaw rate = 2 * wheel speed / wheel base
+            max_step = math.degrees(2 * self.speed / self.wheel_base) * dt
+            turn = max(-max_step, min(max_step, error))
+            # Clockwise (positive yaw) turns drive the left wheel forward
+            right = -math.radians(turn) * self.wheel_base / 2
+            left = -right
+            if abs(error) <= max_step:
+                self.mode = "STOP"
+        elif self.mode == "MOVE":
+            error = self.setpoint - self.odometer
+            travel = max(-self.speed * dt, min(self.speed * dt, error))
+            left = right = travel
+            if abs(error) <= self.speed * dt:
+                self.mode = "STOP"
+
+        self.left_wheel += left
+        self.right_wheel += right
+        distance = (left + right) / 2
+        # Midpoint integration of the heading change; theta is counter-clockwise
+        delta_theta = (right - left) / self.wheel_base
+        theta_mid = -math.radians(self.yaw_deg) + delta_theta / 2
+        self.x += distance * math.cos(theta_mid)
+        self.y += distance * math.sin(theta_mid)
+        self.yaw_deg = (self.yaw_deg - math.degrees(delta_theta)) % 360.0
+        self.odometer += distance
+
+    def robot_values(self, ultrasonic_cm: float = 0.0) -> list:
+        """Returns the telemetryPacket fields in RB order."""
+        return [
+            round(self.yaw_deg) % 360, round(self.odometer), int(ultrasonic_cm), 0, 0,
+            round(self.left_wheel * self.ticks_per_cm), round(self.right_wheel * self.ticks_per_cm),
+        ]
+
+
+class Esp32Emulator:
+    """
+    Speaks the ESP32 UDP protocol on behalf of a DifferentialDriveModel.
+
+    Like the firmware, telemetry is only sent once the host is known: either from
+    target_host or from the source address of the first command received. The ToF
+    line is refreshed at tof_rate_hz and re-sent unchanged in between, as the
+    firmware forwards its last sensor line with every datagram.
+    """
+
+    def __init__(self, floor_plan: FloorPlan, model: DifferentialDriveModel = None,
+                 listen_host: str = "0.0.0.0", listen_port: int = 12345,
+                 target_host: str = None, target_port: int = 12346,
+                 rate_hz: float = 100.0, tof_rate_hz: float = 100.0,
+                 max_range_mm: float = 2000.0, tof_noise_mm: float = 0.0,
+                 data_format: str = "text", sequence_header: bool = True,
+                 seed: int = None):
+        """
+        Args:
+            floor_plan: Walls the ToF beams are ray-cast against.
+            model: The robot model. A default DifferentialDriveModel is used if None.
+            listen_host, listen_port: Where commands are received (ESP_LISTEN_PORT).
+            target_host, target_port: Where telemetry is sent (PYTHON_LISTEN_PORT).
+            rate_hz: Telemetry datagrams per second.
+            tof_rate_hz: New ToF readings per second.
+            max_range_mm: ToF range limit; beams without a hit report -1.
+            tof_noise_mm: Standard deviation of the Gaussian range noise.
+            data_format: "text" (MF/RB lines) or "binary" (telemetry_codec frames).
+            sequence_header: Add the SQ header (text) or use v2 frames (binary).
+            seed: Random seed for the range noise.
+        """
+        if data_format not in ("text", "binary"):
+            raise ValueError(f"Unknown data format '{data_format}'.")
+        self.floor_plan = floor_plan
+        self.model = model or DifferentialDriveModel()
+        self.target = (target_host, target_port) if target_host else None
+        self.target_port = target_port
+        self.rate_hz = rate_hz
+        self.tof_interval = 1.0 / tof_rate_hz
+        self.max_range_mm = max_range_mm
+        self.tof_noise_mm = tof_noise_mm
+        self.data_format = data_format
+        self.sequence_header = sequence_header
+        self.rng = np.random.default_rng(seed)
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((listen_host, listen_port))
+        self.sock.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.sock, selectors.EVENT_READ)
+
+        self.seq = 0
+        self.sent = 0
+        self.send_errors = 0
+        self.commands = 0
+        self.tof_mm = np.full(len(TOF_ANGLES_RAD), -1.0)
+        self.ultrasonic_cm = 255.0
+        self._tof_line = ""
+        self.running = False
+
+    def _read_tof(self):
+        theta = -math.radians(self.model.yaw_deg)
+        ranges = self.floor_plan.raycast(self.model.x, self.model.y, theta + TOF_ANGLES_RAD,
+                                         self.max_range_mm / 10) * 10
+        if self.tof_noise_mm > 0:
+            ranges = ranges + self.rng.normal(0.0, self.tof_noise_mm, ranges.shape)
+        self.tof_mm = np.where(np.isfinite(ranges), np.maximum(np.round(ranges), 0), -1)
+        # Forward-facing ultrasonic sensor, reported in whole cm and saturating at 255
+        forward = self.floor_plan.raycast(self.model.x, self.model.y, np.array([theta]), 255.0)[0]
+        self.ultrasonic_cm = min(forward, 255.0)
+        self._tof_line = "MF\t" + "\t".join(str(int(v)) for v in self.tof_mm)
+
+    def _build_datagram(self, now_ms: int) -> bytes:
+        robot = self.model.robot_values(self.ultrasonic_cm)
+        if self.data_format == "binary":
+            seq = self.seq if self.sequence_header else None
+            return telemetry_codec.encode_frame(self.tof_mm, robot, seq=seq, timestamp_ms=now_ms)
+        data = self._tof_line + "\r\nRB\t" + ",".join(str(v) for v in robot)
+        if self.sequence_header:
+            data = f"SQ\t{self.seq}\t{now_ms}\r\n" + data
+        return data.encode()
+
+    def _handle_commands(self):
+        while True:
+            try:
+                data, address = self.sock.recvfrom(255)
+            except (BlockingIOError, InterruptedError):
+                return
+            if self.target is None:
+                self.target = (address[0], self.target_port)
+                logger.info(f"📡 Host known: sending telemetry to {self.target[0]}:{self.target[1]}")
+            command = data.decode("utf-8", errors="replace")
+            if self.model.command(command):
+                self.commands += 1
+                logger.debug("Processed command: %s", command.strip())
+            else:
+                logger.warning(f"⚠️ Invalid command: {command!r}")
+
+    def run(self, duration: float = None, stats_interval: float = 5.0):
+        """
+        Runs the emulator until stop() is called, duration seconds have passed or
+        Ctrl+C is pressed. Datagrams are paced on an absolute schedule, so short
+        stalls are caught up instead of lowering the average rate.
+        """
+        self.running = True
+        period = 1.0 / self.rate_hz
+        start = last_step = last_stats = time.monotonic()
+        next_send = next_tof = start
+        sent_at_stats = self.sent
+        self._read_tof()
+        try:
+            while self.running:
+                now = time.monotonic()
+                if duration is not None and now - start >= duration:
+                    break
+                timeout = max(0.0, next_send - now)
+                if self.selector.select(timeout):
+                    self._handle_commands()
+                now = time.monotonic()
+                if now < next_send:
+                    continue
+
+                self.model.step(now - last_step)
+                last_step = now
+                if now >= next_tof:
+                    self._read_tof()
+                    next_tof += self.tof_interval
+                    if next_tof < now:
+                        next_tof = now + self.tof_interval
+
+                if self.target is not None:
+                    datagram = self._build_datagram(int((now - start) * 1000))
+                    try:
+                        self.sock.sendto(datagram, self.target)
+                        self.sent += 1
+                    except OSError:
+                        # e.g. ENOBUFS/ECONNREFUSED at very high rates, a lost datagram
+                        self.send_errors += 1
+                    self.seq += 1
+                next_send += period
+                if next_send < now - 1.0:
+                    next_send = now  # More than a second behind: don't burst, resync
+
+                if now - last_stats >= stats_interval:
+                    rate = (self.sent - sent_at_stats) / (now - last_stats)
+                    logger.info(
+                        f"📊 {rate:.0f} datagrams/s (target {self.rate_hz:g}), sent={self.sent}, "
+                        f"errors={self.send_errors}, commands={self.commands}, "
+                        f"pose=({self.model.x:.1f}, {self.model.y:.1f}, {self.model.yaw_deg:.1f}°)"
+                    )
+                    last_stats, sent_at_stats = now, self.sent
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.running = False
+
+    def stop(self):
+        self.running = False
+
+    def close(self):
+        self.selector.close()
+        self.sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ESP32 telemetry/command emulator for TeraRanger TwinDrive.")
+    parser.add_argument("--listen-host", default="0.0.0.0", help="Address to receive commands on.")
+    parser.add_argument("--listen-port", type=int, default=12345, help="Command port (ESP_LISTEN_PORT).")
+    parser.add_argument("--target-host", default=None,
+                        help="Host to send telemetry to. Default: the sender of the first command.")
+    parser.add_argument("--target-port", type=int, default=12346, help="Telemetry port (PYTHON_LISTEN_PORT).")
+    parser.add_argument("--rate", type=float, default=100.0, help="Telemetry datagrams per second.")
+    parser.add_argument("--tof-rate", type=float, default=100.0, help="New ToF readings per second.")
+    parser.add_argument("--floor-plan", default=None,
+                        help='JSON file {"walls": [[x1, y1, x2, y2], ...]} in cm. Default: a 300x200 cm room.')
+    parser.add_argument("--max-range", type=float, default=2000.0, help="ToF range limit in mm.")
+    parser.add_argument("--noise", type=float, default=0.0, help="ToF range noise (std. dev.) in mm.")
+    parser.add_argument("--binary", action="store_true", help="Send binary telemetry frames instead of text.")
+    parser.add_argument("--no-sequence-header", action="store_true",
+                        help="Omit the SQ header (text) or send v1 frames (binary).")
+    parser.add_argument("--duration", type=float, default=None, help="Stop after this many seconds.")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for the ToF noise.")
+    args = parser.parse_args()
+
+    logger_config.setup_logging(logging.INFO)
+    floor_plan = FloorPlan.from_file(args.floor_plan) if args.floor_plan else FloorPlan.rectangle()
+    emulator = Esp32Emulator(
+        floor_plan, listen_host=args.listen_host, listen_port=args.listen_port,
+        target_host=args.target_host, target_port=args.target_port,
+        rate_hz=args.rate, tof_rate_hz=args.tof_rate, max_range_mm=args.max_range,
+        tof_noise_mm=args.noise, data_format="binary" if args.binary else "text",
+        sequence_header=not args.no_sequence_header, seed=args.seed,
+    )
+    logger.info(f"🤖 ESP32 emulator listening for commands on {args.listen_host}:{args.listen_port}, "
+                f"telemetry at {args.rate:g} Hz ({'binary' if args.binary else 'text'}).")
+    try:
+        emulator.run(duration=args.duration)
+    finally:
+        emulator.close()
+        logger.info(f"Emulator stopped after {emulator.sent} datagrams.")
+
+
+if __name__ == "__main__":
+    main()
@@ -36,6 +36,12 @@ telemetryPacket teleData;
 unsigned long previousMillis = 0;
 const long interval = 10; // Send data every 10 milliseconds
 
+// --- Telemetry Sequence Header ---
+// Prefixes every datagram with "SQ\t<seq>\t<millis>\r\n" so the Python side can
+// detect packet loss, reordering and timing jitter. Set to false for the plain format.
+const bool SEND_SEQUENCE_HEADER = true;
+unsigned long telemetrySeq = 0;
+
 // --- Debugging ---
 // Assuming DEBUG_COMM and DEBUG_PRINT are defined in comm.hpp or elsewhere
 #ifndef DEBUG_COMM
@@ -166,6 +172,9 @@ void forwardSensorData() {
         previousMillis = currentMillis;
         if (pythonClientIP != IPAddress(0, 0, 0, 0)) { // Only send if Python client IP is known
             String combinedData = lastTofData + "\n" + lastRobotData;
+            if (SEND_SEQUENCE_HEADER) {
+                combinedData = "SQ\t" + String(telemetrySeq++) + "\t" + String(currentMillis) + "\r\n" + combinedData;
+            }
 
             // Send telemetry data
             Udp.beginPacket(pythonClientIP, PYTHON_LISTEN_PORT);
@@ -0,0 +1,337 @@
+"""
+Binary flight recorder for telemetry.
+
+The log is one preallocated, memory-mapped file: a 64 byte file header followed
+by fixed-size chunks. Every chunk starts with a 32 byte chunk header and holds
+back-to-back records. All fields are little-endian.
+
+    file header   8s magic "TRFLIGHT", u16 version, u16 reserved, u32 chunk size,
+                  f64 wall clock time and f64 time.monotonic() at start
+    chunk header  4s magic "CHNK", u32 chunk index, u32 record count,
+                  u32 used bytes (including this header), f64 first and last record time
+    record        u8 kind, u8 reserved, u16 payload length, f64 time.monotonic(), payload
+
+Record payloads are the raw datagram bytes (DATAGRAM), the command string
+(COMMAND) or float64 sample values (TOF_SAMPLE, ROBOT_SAMPLE). The chunk header
+is rewritten after every flush, so a log cut short by a crash is readable up to
+the last flush.
+
+Recording only appends to a deque on the calling thread; packing into the
+mapping, growing the file and syncing happen on the recorder thread.
+
+Offline CSV export:
+
+    python flight_recorder.py export flight.bin sensor_data.csv
+"""
+import argparse
+import collections
+import csv
+import logging
+import mmap
+import struct
+import threading
+import time
+from datetime import datetime
+import numpy as np
+
+MAGIC = b"TRFLIGHT"
+CHUNK_MAGIC = b"CHNK"
+VERSION = 1
+
+# Record kinds
+DATAGRAM, TOF_SAMPLE, ROBOT_SAMPLE, COMMAND = 1, 2, 3, 4
+KIND_NAMES = {DATAGRAM: "datagram", TOF_SAMPLE: "tof", ROBOT_SAMPLE: "robot", COMMAND: "command"}
+
+FILE_HEADER = struct.Struct("<8sHHIdd32x")
+CHUNK_HEADER = struct.Struct("<4sIIIdd")
+RECORD_HEADER = struct.Struct("<BBHd")
+assert FILE_HEADER.size == 64
+
+MAX_PAYLOAD = 0xFFFF
+
+
+class FlightRecorder:
+    """
+    Appends timestamped datagrams, commands and parsed samples to a chunked,
+    memory-mapped binary log from a background thread.
+    """
+
+    def __init__(self, path: str, chunk_size: int = 1 << 20, preallocate_chunks: int = 64,
+                 flush_interval: float = 0.05, sync_interval: float = 1.0, max_pending: int = 1 << 16):
+        """
+        Args:
+            path: Log file to create (an existing file is overwritten).
+            chunk_size: Bytes per chunk, at least 128 KiB.
+            preallocate_chunks: Chunks allocated up front and per growth step.
+            flush_interval: How often the recorder thread packs pending records (s).
+            sync_interval: How often the mapping is flushed to disk (s).
+            max_pending: Records that may wait for the recorder thread before new ones are dropped.
+        """
+        if chunk_size < (1 << 17):
+            raise ValueError("chunk_size must be at least 128 KiB.")
+        self.path = path
+        self.chunk_size = chunk_size
+        self.grow_chunks = preallocate_chunks
+        self.flush_interval = flush_interval
+        self.sync_interval = sync_interval
+        self.max_pending = max_pending
+        self.logger = logging.getLogger(__name__)
+
+        self._pending = collections.deque()
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+
+        self.records = 0
+        self.dropped = 0
+        self.bytes_written = 0
+        self.chunks = 0
+
+        self.start_wall = time.time()
+        self.start_monotonic = time.monotonic()
+        self._file = open(path, "w+b")
+        self._size = FILE_HEADER.size + chunk_size * preallocate_chunks
+        self._file.truncate(self._size)
+        self._mm = mmap.mmap(self._file.fileno(), self._size)
+        FILE_HEADER.pack_into(self._mm, 0, MAGIC, VERSION, 0, chunk_size, self.start_wall, self.start_monotonic)
+        self._new_chunk(0)
+
+    # --- Hot path: called from the receive thread -------------------------------
+
+    def record_datagram(self, t: float, data):
+        """Records one raw datagram (bytes or memoryview, copied)."""
+        if len(self._pending) < self.max_pending:
+            self._pending.append((DATAGRAM, t, bytes(data)))
+        else:
+            self.dropped += 1
+
+    def record_sample(self, kind: int, t: float, values: np.ndarray):
+        """Records parsed sample values (TOF_SAMPLE or ROBOT_SAMPLE). values must not be mutated afterwards."""
+        if len(self._pending) < self.max_pending:
+            self._pending.append((kind, t, values))
+        else:
+            self.dropped += 1
+
+    def record_command(self, t: float, command: str):
+        if len(self._pending) < self.max_pending:
+            self._pending.append((COMMAND, t, command.encode()))
+        else:
+            self.dropped += 1
+
+    # --- Recorder thread ---------------------------------------------------------
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="FlightRecorder", daemon=True)
+            self._thread.start()
+            self.logger.info(f"🔴 Flight recorder writing to '{self.path}'.")
+
+    def stop(self):
+        """Writes all pending records, truncates the preallocated tail and closes the log."""
+        if self._running:
+            self._running = False
+            self._wakeup.set()
+            self._thread.join()
+        if self._mm is None:
+            return
+        self._write_pending()
+        end = self._chunk_offset + self._chunk_used
+        self._mm.flush()
+        self._mm.close()
+        self._mm = None
+        self._file.truncate(end)
+        self._file.close()
+        self.logger.info(f"⏹️ Flight recorder stopped: {self.records} records, {self.bytes_written} bytes, "
+                         f"{self.chunks} chunks, {self.dropped} dropped.")
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "records": self.records,
+            "bytes": self.bytes_written,
+            "chunks": self.chunks,
+            "pending": len(self._pending),
+            "dropped": self.dropped,
+        }
+
+    def _run(self):
+        last_sync = time.monotonic()
+        while self._running:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self._write_pending()
+                now = time.monotonic()
+                if now - last_sync >= self.sync_interval:
+                    self._mm.flush()
+                    last_sync = now
+            except Exception as e:
+                self.logger.error(f"❌ Flight recorder write failed: {e}", exc_info=True)
+                time.sleep(self.flush_interval)
+
+    def _new_chunk(self, index: int):
+        self._chunk_index = index
+        self._chunk_offset = FILE_HEADER.size + index * self.chunk_size
+        self._chunk_used = CHUNK_HEADER.size
+        self._chunk_count = 0
+        self._chunk_first_t = 0.0
+        self._chunk_last_t = 0.0
+        if self._chunk_offset + self.chunk_size > self._size:
+            self._grow()
+        self.chunks += 1
+        self._write_chunk_header()
+
+    def _grow(self):
+        self._size += self.chunk_size * self.grow_chunks
+        self._mm.flush()
+        self._mm.close()
+        self._file.truncate(self._size)
+        self._mm = mmap.mmap(self._file.fileno(), self._size)
+
+    def _write_chunk_header(self):
+        CHUNK_HEADER.pack_into(self._mm, self._chunk_offset, CHUNK_MAGIC, self._chunk_index, self._chunk_count,
+                               self._chunk_used, self._chunk_first_t, self._chunk_last_t)
+
+    def _write_pending(self):
+        pending = self._pending
+        if not pending:
+            return
+        mm = self._mm
+        while pending:
+            kind, t, payload = pending.popleft()
+            if kind in (TOF_SAMPLE, ROBOT_SAMPLE):
+                payload = np.asarray(payload, dtype="<f8").tobytes()
+            length = min(len(payload), MAX_PAYLOAD)
+            size = RECORD_HEADER.size + length
+            if self._chunk_used + size > self.chunk_size:
+                self._write_chunk_header()
+                self._new_chunk(self._chunk_index + 1)
+                mm = self._mm
+            offset = self._chunk_offset + self._chunk_used
+            RECORD_HEADER.pack_into(mm, offset, kind, 0, length, t)
+            mm[offset + RECORD_HEADER.size:offset + size] = payload[:length]
+            if self._chunk_count == 0:
+                self._chunk_first_t = t
+            self._chunk_last_t = t
+            self._chunk_count += 1
+            self._chunk_used += size
+            self.records += 1
+            self.bytes_written += size
+        self._write_chunk_header()
+
+
+class FlightLogReader:
+    """
+    Reads a flight recorder log, including logs of a recording still in progress
+    or cut short.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._data = f.read()
+        if len(self._data) < FILE_HEADER.size:
+            raise ValueError(f"'{path}' is too short to be a flight log.")
+        magic, version, _, self.chunk_size, self.start_wall, self.start_monotonic = FILE_HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"'{path}' is not a flight log.")
+        if version != VERSION:
+            raise ValueError(f"Unsupported flight log version {version}.")
+
+    def wall_time(self, t: float) -> float:
+        """Converts a recorded time.monotonic() value to a Unix timestamp."""
+        return self.start_wall + (t - self.start_monotonic)
+
+    def records(self):
+        """Yields (kind, t, payload) for every record in file order."""
+        data = self._data
+        offset = FILE_HEADER.size
+        while offset + CHUNK_HEADER.size <= len(data):
+            magic, _, count, used, _, _ = CHUNK_HEADER.unpack_from(data, offset)
+            if magic != CHUNK_MAGIC:
+                break
+            pos = offset + CHUNK_HEADER.size
+            for _ in range(count):
+                kind, _, length, t = RECORD_HEADER.unpack_from(data, pos)
+                pos += RECORD_HEADER.size
+                payload = data[pos:pos + length]
+                pos += length
+                if kind in (TOF_SAMPLE, ROBOT_SAMPLE):
+                    payload = np.frombuffer(payload, dtype="<f8")
+                yield kind, t, payload
+            offset += self.chunk_size
+
+    def samples(self, kind: int):
+        """Returns the times and values of all TOF_SAMPLE or ROBOT_SAMPLE records as arrays."""
+        times, values = [], []
+        for k, t, payload in self.records():
+            if k == kind:
+                times.append(t)
+                values.append(payload)
+        if not values:
+            return np.empty(0), np.empty((0, 0))
+        return np.array(times), np.vstack(values)
+
+    def summary(self) -> dict:
+        counts = collections.Counter()
+        first = last = None
+        for kind, t, _ in self.records():
+            counts[KIND_NAMES.get(kind, str(kind))] += 1
+            first = t if first is None else first
+            last = t
+        return {
+            "started": datetime.fromtimestamp(self.start_wall).isoformat(),
+            "duration_s": (last - first) if first is not None else 0.0,
+            "records": dict(counts),
+        }
+
+    def export_csv(self, filename: str) -> int:
+        """
+        Writes one CSV row per robot sample with the latest ToF values, in the
+        column layout of RobotInterface.save_sensor_data_to_csv.
+
+        Returns:
+            The number of rows written.
+        """
+        rows = 0
+        tof = None
+        with open(filename, mode="w", newline="") as file:
+            writer = csv.writer(file)
+            header_written = False
+            for kind, t, payload in self.records():
+                if kind == TOF_SAMPLE:
+                    tof = payload
+                elif kind == ROBOT_SAMPLE:
+                    tof_values = tof if tof is not None else np.full(8, np.nan)
+                    if not header_written:
+                        writer.writerow(['Timestamp'] + [f'ToF_{i}' for i in range(len(tof_values))]
+                                        + [f'Robot_{i}' for i in range(len(payload))])
+                        header_written = True
+                    timestamp = datetime.fromtimestamp(self.wall_time(t)).strftime('%Y-%m-%d %H:%M:%S.%f')
+                    writer.writerow([timestamp] + tof_values.tolist() + payload.tolist())
+                    rows += 1
+        return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or export a flight recorder log.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    info = sub.add_parser("info", help="Print a summary of the log.")
+    info.add_argument("log")
+    export = sub.add_parser("export", help="Export the robot/ToF samples as CSV.")
+    export.add_argument("log")
+    export.add_argument("csv")
+    args = parser.parse_args()
+
+    reader = FlightLogReader(args.log)
+    if args.command == "info":
+        for key, value in reader.summary().items():
+            print(f"{key}: {value}")
+    else:
+        rows = reader.export_csv(args.csv)
+        print(f"💾 Exported {rows} rows to '{args.csv}'.")
+
+
+if __name__ == "__main__":
+    main()
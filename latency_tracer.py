@@ -0,0 +1,138 @@
+import threading
+import time
+import numpy as np
+
+# Trace stages, in pipeline order
+RECEIVED, PARSED, POSE, MAPPED, DRAWN = range(5)
+STAGE_NAMES = ("received", "parsed", "pose", "mapped", "drawn")
+
+
+class LatencyTracer:
+    """
+    Timestamps every received datagram as it passes through the pipeline:
+    socket receipt, parse completion, pose integration, map insertion and the
+    plot redraw that first shows it.
+
+    The receive thread opens one trace per datagram (begin) and marks the parse
+    and pose stages of the current trace. Map insertion and drawing handle many
+    datagrams at once, so they mark every trace up to a watermark (mark_mapped,
+    mark_drawn).
+    Timestamps live in a preallocated ring of the last `capacity` traces; per-stage
+    latencies (time since the previous stage) and the end-to-end latency feed
+    cumulative log-spaced histograms.
+
+    Callers keep the tracer in an attribute that is None while tracing is off, so
+    the disabled cost on the hot path is a single attribute check.
+    """
+
+    # Histogram bin edges in milliseconds: 10 µs to 10 s, 4 bins per decade
+    BIN_EDGES_MS = np.logspace(-2, 4, 25)
+
+    def __init__(self, capacity: int = 1 << 16):
+        self.capacity = capacity
+        self.times = np.full((capacity, len(STAGE_NAMES)), np.nan)
+        self._lock = threading.Lock()
+        self.trace_count = 0  # Number of traces begun; the current trace id is trace_count - 1
+        self._mapped_through = 0  # Traces [0, _mapped_through) have passed map insertion
+        self._drawn_through = 0
+        self.histograms = {name: np.zeros(len(self.BIN_EDGES_MS) + 1, dtype=np.int64)
+                           for name in STAGE_NAMES[1:] + ("end_to_end",)}
+        self.clock = time.perf_counter
+
+    def begin(self) -> int:
+        """Opens a trace for a datagram that was just received and returns its id."""
+        now = self.clock()
+        with self._lock:
+            trace_id = self.trace_count
+            row = self.times[trace_id % self.capacity]
+            row.fill(np.nan)
+            row[RECEIVED] = now
+            self.trace_count = trace_id + 1
+        return trace_id
+
+    def mark(self, stage: int):
+        """Timestamps a stage (PARSED or POSE) of the current trace."""
+        if self.trace_count:
+            self.times[(self.trace_count - 1) % self.capacity, stage] = self.clock()
+
+    def mark_mapped(self, through: int):
+        """Marks all traces with an id below `through` as inserted into the map."""
+        now = self.clock()
+        with self._lock:
+            start = max(self._mapped_through, through - self.capacity, self.trace_count - self.capacity)
+            if through <= start:
+                return
+            rows = np.arange(start, through) % self.capacity
+            self.times[rows, MAPPED] = now
+            self._mapped_through = through
+            block = self.times[rows]
+            for stage in (PARSED, POSE, MAPPED):
+                self._accumulate(STAGE_NAMES[stage], block[:, stage] - self._previous_stage_time(block, stage))
+
+    def mark_drawn(self):
+        """Marks all traces that have been inserted into the map as drawn."""
+        now = self.clock()
+        with self._lock:
+            through = self._mapped_through
+            start = max(self._drawn_through, through - self.capacity, self.trace_count - self.capacity)
+            if through <= start:
+                return
+            rows = np.arange(start, through) % self.capacity
+            self.times[rows, DRAWN] = now
+            self._drawn_through = through
+            block = self.times[rows]
+            self._accumulate("drawn", block[:, DRAWN] - block[:, MAPPED])
+            self._accumulate("end_to_end", block[:, DRAWN] - block[:, RECEIVED])
+
+    @staticmethod
+    def _previous_stage_time(block: np.ndarray, stage: int) -> np.ndarray:
+        """The latest earlier stage timestamp of every trace (stages can be missing, e.g. no RB line)."""
+        earlier = block[:, :stage]
+        return np.where(np.isnan(earlier), -np.inf, earlier).max(axis=1)
+
+    def _accumulate(self, name: str, seconds: np.ndarray):
+        ms = seconds[np.isfinite(seconds)] * 1e3
+        if len(ms):
+            self.histograms[name] += np.bincount(np.searchsorted(self.BIN_EDGES_MS, ms, side="right"),
+                                                 minlength=len(self.BIN_EDGES_MS) + 1)
+
+    def snapshot(self) -> dict:
+        """
+        Returns per-stage latency statistics in milliseconds: count, percentiles
+        estimated from the histogram, and the histogram itself keyed by upper bin edge.
+        """
+        with self._lock:
+            histograms = {name: counts.copy() for name, counts in self.histograms.items()}
+            traces = self.trace_count
+        edges = self.BIN_EDGES_MS
+        labels = [f"<{edges[0]:g}ms"] + [f"<{hi:g}ms" for hi in edges[1:]] + [f">={edges[-1]:g}ms"]
+        stats = {"traces": traces, "stages": {}}
+        for name, counts in histograms.items():
+            total = int(counts.sum())
+            entry = {"count": total, "histogram": dict(zip(labels, counts.tolist()))}
+            if total:
+                cumulative = np.cumsum(counts) / total
+                for p in (50, 90, 99):
+                    # Upper edge of the bin that contains the percentile
+                    index = int(np.searchsorted(cumulative, p / 100))
+                    entry[f"p{p}_ms"] = float(edges[min(index, len(edges) - 1)])
+            stats["stages"][name] = entry
+        return stats
+
+    def dump(self, path: str) -> int:
+        """
+        Writes the traces still held in the ring to a CSV file, one row per trace
+        with the stage timestamps in seconds (time.perf_counter, empty if missing).
+
+        Returns:
+            The number of traces written.
+        """
+        with self._lock:
+            start = max(0, self.trace_count - self.capacity)
+            ids = np.arange(start, self.trace_count)
+            rows = self.times[ids % self.capacity].copy()
+        with open(path, "w") as f:
+            f.write("trace_id," + ",".join(STAGE_NAMES) + "\n")
+            for trace_id, row in zip(ids, rows):
+                f.write(f"{trace_id}," + ",".join("" if np.isnan(v) else f"{v:.9f}" for v in row) + "\n")
+        return len(ids)
@@ -0,0 +1,142 @@
+import bisect
+import threading
+import numpy as np
+
+SEQ_MODULO = 1 << 32  # The firmware sequence counter is an unsigned 32 bit value
+
+
+class LinkMonitor:
+    """
+    Tracks the quality of the sequenced telemetry stream.
+
+    observe() is called for every telemetry frame that carries a sequence number.
+    It counts lost, reordered and duplicate frames, estimates the RFC 3550
+    inter-arrival jitter from the sender timestamps and keeps a histogram of host
+    inter-arrival times relative to the firmware's send interval. Only frames that
+    are newer than everything seen so far are accepted, so late frames never reach
+    odometry.
+    """
+
+    # Histogram bin edges as multiples of the expected interval
+    BIN_FACTORS = (0.0, 0.25, 0.5, 0.75, 0.9, 1.1, 1.25, 1.5, 2.0, 3.0, 5.0, 10.0)
+
+    def __init__(self, expected_interval_ms: float = 10.0, window: int = 1024, restart_gap: int = 10000,
+                 restart_gap_ms: float = 1000.0):
+        """
+        Args:
+            expected_interval_ms: The firmware's telemetry send interval.
+            window: Number of recent sequence numbers remembered for duplicate detection.
+            restart_gap: A frame older than this many sequence numbers is treated as a
+                restart of the sender (e.g. the ESP32 rebooted) instead of a late frame.
+            restart_gap_ms: Likewise for a frame whose sender timestamp is this much older
+                than the newest frame's. A reordered datagram lags by a few send
+                intervals, while a reboot sets millis() back to the boot time, so this
+                also catches reboots within the first restart_gap frames.
+        """
+        self.expected_interval_ms = expected_interval_ms
+        self.window = window
+        self.restart_gap = restart_gap
+        self.restart_gap_ms = restart_gap_ms
+        self.bin_edges_ms = [f * expected_interval_ms for f in self.BIN_FACTORS]
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._highest = None
+            self._seen = np.full(self.window, -1, dtype=np.int64)
+            self._prev_arrival_ms = None
+            self._prev_sender_ms = None
+            self.received = 0
+            self.accepted = 0
+            self.lost = 0
+            self.reordered = 0
+            self.duplicates = 0
+            self.restarts = 0
+            self.jitter_ms = 0.0
+            self.histogram = [0] * len(self.bin_edges_ms)
+
+    def observe(self, seq: int, sender_ms: int, arrival_s: float) -> bool:
+        """
+        Records one received frame.
+
+        Args:
+            seq: Frame sequence number.
+            sender_ms: Sender timestamp (ESP32 millis()).
+            arrival_s: Host receive time in seconds (time.monotonic()).
+
+        Returns:
+            True if the frame is new and in order and should be processed.
+        """
+        arrival_ms = arrival_s * 1e3
+        with self._lock:
+            self.received += 1
+            slot = seq % self.window
+            restarted = False
+            if self._highest is None:
+                diff = 1
+            else:
+                diff = (seq - self._highest) % SEQ_MODULO
+                if diff == 0 or diff >= SEQ_MODULO // 2:
+                    # Not newer: a late or duplicate frame, unless the sequence number or
+                    # the sender clock is so far behind that the sender restarted
+                    sender_age_ms = (self._prev_sender_ms - sender_ms) % SEQ_MODULO
+                    restarted = ((SEQ_MODULO - diff) % SEQ_MODULO > self.restart_gap
+                                 or self.restart_gap_ms < sender_age_ms < SEQ_MODULO // 2)
+
+            if not restarted and (diff == 0 or (diff >= SEQ_MODULO // 2 and self._seen[slot] == seq)):
+                self.duplicates += 1
+                return False
+
+            if diff >= SEQ_MODULO // 2 or restarted:
+                age = (SEQ_MODULO - diff) % SEQ_MODULO
+                if not restarted:
+                    # Late frame: it was counted as lost when the gap was first seen
+                    self.reordered += 1
+                    if age < self.window:
+                        self._seen[slot] = seq
+                        self.lost -= 1
+                    return False
+                # Far behind: the sender restarted its counter
+                self.restarts += 1
+                self._seen.fill(-1)
+                self._prev_arrival_ms = None
+                self._prev_sender_ms = None
+            elif self._highest is not None:
+                self.lost += diff - 1
+
+            self._highest = seq
+            self._seen[slot] = seq
+            self.accepted += 1
+
+            if self._prev_arrival_ms is not None:
+                delta_arrival = arrival_ms - self._prev_arrival_ms
+                delta_sender = (sender_ms - self._prev_sender_ms) % SEQ_MODULO
+                # RFC 3550 interarrival jitter estimator
+                self.jitter_ms += (abs(delta_arrival - delta_sender) - self.jitter_ms) / 16.0
+                self.histogram[bisect.bisect_right(self.bin_edges_ms, delta_arrival) - 1] += 1
+            self._prev_arrival_ms = arrival_ms
+            self._prev_sender_ms = sender_ms
+            return True
+
+    def snapshot(self) -> dict:
+        """Returns the current link statistics."""
+        with self._lock:
+            expected = self.accepted + self.lost
+            return {
+                "received": self.received,
+                "accepted": self.accepted,
+                "lost": self.lost,
+                "loss_rate": self.lost / expected if expected else 0.0,
+                "reordered": self.reordered,
+                "duplicates": self.duplicates,
+                "restarts": self.restarts,
+                "jitter_ms": self.jitter_ms,
+                "expected_interval_ms": self.expected_interval_ms,
+                "inter_arrival_histogram": dict(zip(self._bin_labels(), self.histogram)),
+            }
+
+    def _bin_labels(self) -> list:
+        edges = self.bin_edges_ms
+        labels = [f"{lo:g}-{hi:g}ms" for lo, hi in zip(edges[:-1], edges[1:])]
+        return labels + [f">={edges[-1]:g}ms"]
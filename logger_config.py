@@ -1,5 +1,10 @@
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
+import threading
+import time
 
 # Configure the logger
 def setup_logging(level=logging.WARNING):
@@ -10,4 +15,117 @@ def setup_logging(level=logging.WARNING):
       handlers=[
         logging.StreamHandler(sys.stdout),  # Explicitly use stdout
       ]
-    )
\ No newline at end of file
+    )
+
+
+class RateLimitFilter(logging.Filter):
+  """
+  Token-bucket rate limit per subsystem (logger name).
+
+  Records above the limit are dropped before they are formatted or queued, so a
+  flood of e.g. "ToF value count mismatch" warnings costs the receive thread only
+  this check. The next record that passes reports how many were suppressed.
+  """
+
+  def __init__(self, rate: float = 10.0, burst: int = 20, min_level=logging.DEBUG, limits: dict = None):
+    """
+    Args:
+      rate: Records per second allowed per subsystem.
+      burst: Records a subsystem may emit at once before the rate applies.
+      min_level: Records below this level are not rate limited.
+      limits: Optional {logger name: (rate, burst)} overrides. A name also applies
+        to its child loggers.
+    """
+    super().__init__()
+    self.rate = rate
+    self.burst = burst
+    self.min_level = min_level
+    self.limits = limits or {}
+    self._buckets = {}  # logger name -> [tokens, last refill time, suppressed count]
+    self._lock = threading.Lock()
+
+  def _limit_for(self, name: str):
+    while name:
+      if name in self.limits:
+        return self.limits[name]
+      name = name.rpartition(".")[0]
+    return self.rate, self.burst
+
+  def filter(self, record: logging.LogRecord) -> bool:
+    if record.levelno < self.min_level:
+      return True
+    now = time.monotonic()
+    with self._lock:
+      bucket = self._buckets.get(record.name)
+      rate, burst = self._limit_for(record.name)
+      if bucket is None:
+        bucket = self._buckets[record.name] = [float(burst), now, 0]
+      bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+      bucket[1] = now
+      if bucket[0] < 1.0:
+        bucket[2] += 1
+        return False
+      bucket[0] -= 1.0
+      suppressed, bucket[2] = bucket[2], 0
+    if suppressed:
+      record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+    return True
+
+  def suppressed(self) -> dict:
+    """Returns the number of records currently being suppressed per subsystem."""
+    with self._lock:
+      return {name: bucket[2] for name, bucket in self._buckets.items() if bucket[2]}
+
+
+_listener = None
+
+
+def setup_queue_logging(level=logging.WARNING, rate_limit: RateLimitFilter = None):
+  """
+  Routes all log records through a QueueHandler so that logging threads (e.g. the
+  UDP receive thread) never block on stdout. A QueueListener thread writes them
+  with the handlers configured by setup_logging (which is applied first if no
+  handlers exist yet).
+
+  Args:
+    level: Root logger level.
+    rate_limit: Optional RateLimitFilter applied before records are queued.
+      Defaults to 10 records/s per subsystem with bursts of 20, for warnings and above.
+
+  Returns:
+    The running QueueListener.
+  """
+  global _listener
+  setup_logging(level)
+  root = logging.getLogger()
+  root.setLevel(level)
+  if _listener is not None:
+    return _listener
+
+  handlers = list(root.handlers)
+  log_queue = queue.SimpleQueue()
+  queue_handler = logging.handlers.QueueHandler(log_queue)
+  queue_handler.addFilter(rate_limit or RateLimitFilter(min_level=logging.WARNING))
+  for handler in handlers:
+    root.removeHandler(handler)
+  root.addHandler(queue_handler)
+
+  _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+  _listener.start()
+  atexit.register(stop_queue_logging)
+  return _listener
+
+
+def stop_queue_logging():
+  """Writes all queued records and restores synchronous logging."""
+  global _listener
+  if _listener is None:
+    return
+  listener, _listener = _listener, None
+  listener.stop()
+  root = logging.getLogger()
+  for handler in list(root.handlers):
+    if isinstance(handler, logging.handlers.QueueHandler):
+      root.removeHandler(handler)
+  for handler in listener.handlers:
+    root.addHandler(handler)
@@ -3,9 +3,9 @@ import time
 import threading
 import signal
 import logging
+import argparse
 
 from robot_interface import RobotInterface
-from PyQt5 import QtWidgets
 
 # Initialize a logger for the main script
 main_logger = logging.getLogger(__name__)
@@ -17,8 +17,42 @@ main_logger.setLevel(logging.DEBUG)
 
 
 if __name__ == "__main__":
-    # Initialize the PyQt5 application. This MUST be the first PyQt operation.
-    app = QtWidgets.QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="TeraRanger TwinDrive host application.")
+    parser.add_argument("--headless", action="store_true",
+                        help="Run receiver, mapping and controller without the PyQtGraph window.")
+    parser.add_argument("--robot-host", default="192.168.4.1",
+                        help="Robot (ESP32) address for commands, e.g. 127.0.0.1 for esp32_emulator.py.")
+    parser.add_argument("--record", metavar="PATH", nargs="?", const="",
+                        help="Write a binary flight log of all telemetry (default name: flight_<date>_<time>.bin).")
+    parser.add_argument("--trace", metavar="PATH", nargs="?", const="",
+                        help="Trace per-datagram pipeline latency; with PATH, dump the traces as CSV on exit.")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics on http://127.0.0.1:<port>/metrics.")
+    parser.add_argument("--scan-matching", action="store_true",
+                        help="Correct odometry drift by matching recent ToF scans against the map.")
+    parser.add_argument("--localize", metavar="MAP", default=None,
+                        help="Localize in a map saved by replay.py --save-map instead of starting a new map.")
+    parser.add_argument("--pose-graph", action="store_true",
+                        help="Close loops with a pose graph and correct earlier poses and map points.")
+    parser.add_argument("--straight-moves", action="store_true",
+                        help="Drive straight to clicked targets instead of planning a path around mapped obstacles.")
+    parser.add_argument("--replan", action="store_true",
+                        help="Repair the planned path incrementally (D* Lite) from every new ToF scan while a move is running.")
+    parser.add_argument("--queue-logging", action="store_true",
+                        help="Write log output from a background thread and rate limit warning floods.")
+    args = parser.parse_args()
+
+    if args.queue_logging:
+        import logger_config
+        logger_config.setup_queue_logging(logging.WARNING)
+
+    if not args.headless:
+        # PyQt5/pyqtgraph are only imported when the GUI is used.
+        from PyQt5 import QtWidgets
+        from robot_view import RobotPlotView
+
+        # Initialize the PyQt5 application. This MUST be the first PyQt operation.
+        app = QtWidgets.QApplication(sys.argv)
 
     # Configure graceful exit on Ctrl+C.
     signal.signal(signal.SIGINT, signal.SIG_DFL)
@@ -27,20 +61,39 @@ if __name__ == "__main__":
     # RECEIVE_HOST = '192.168.4.2'  # IP for receiving data from the robot
     RECEIVE_HOST = '0.0.0.0'      # IP for receiving data from the robot using UDP
     RECEIVE_PORT = 12346
-    SEND_HOST = '192.168.4.1'     # Robot's IP for sending commands
+    SEND_HOST = args.robot_host   # Robot's IP for sending commands (default 192.168.4.1)
     SEND_PORT = 12345
 
-    # Instantiate the RobotInterface. It manages its own plotting and data reception.
-    robot = RobotInterface(RECEIVE_HOST, RECEIVE_PORT, SEND_HOST, SEND_PORT)
+    # Instantiate the RobotInterface. It manages data reception, mapping and control.
+    robot = RobotInterface(RECEIVE_HOST, RECEIVE_PORT, SEND_HOST, SEND_PORT,
+                           ingest_mode="batched", recv_buffer_size=1 << 20)
     robot.set_logging_level(logging.INFO) # Set logging level for detailed feedback from RobotInterface
+    if args.record is not None:
+        robot.start_flight_recording(args.record or None)
+    if args.trace is not None:
+        robot.enable_tracing(args.trace or None)
+    if args.scan_matching:
+        robot.enable_scan_matching()
+    if args.localize:
+        robot.enable_localization(args.localize)
+    if args.pose_graph:
+        robot.enable_pose_graph()
+    if args.replan:
+        from path_planner import IncrementalPlanner
+        robot.path_planner = IncrementalPlanner(robot.occupancy_grid)
+    if args.straight_moves:
+        robot.path_planner = None
+    if args.metrics_port is not None:
+        robot.start_metrics_server(args.metrics_port)
     robot.start_receiving()
     robot.send_command_to_esp("STOP,0,0") # Send an initial command to set the ESP32's pythonClientIP
     time.sleep(1)  # Wait for action completion
 
-    # Display the real-time plot window.
-    robot.plot_widget.show()
-    robot.plot_widget.setFocus()
-    main_logger.info("✨ PyQtGraph plot window is now open. ✨")
+    if not args.headless:
+        # Display the real-time plot window.
+        view = RobotPlotView(robot)
+        view.show()
+        main_logger.info("✨ PyQtGraph plot window is now open. ✨")
     
 
     # Define and start the robot's autonomous control loop in a separate thread.
@@ -91,10 +144,23 @@ if __name__ == "__main__":
     robot_control_thread = threading.Thread(target=run_robot_control_logic, daemon=True)
     robot_control_thread.start()
 
+    if args.headless:
+        # No event loop needed: keep the main thread alive until Ctrl+C.
+        main_logger.info("🤖 Running headless. Press Ctrl+C to exit.")
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            robot.close()
+            sys.exit(0)
+
     # Start the PyQt5 application's event loop. This blocks the main thread
     # until the GUI window is closed, keeping the application responsive.
     main_logger.info("📈 Application running. Close the plot window to exit. 📉")
-    sys.exit(app.exec_())
+    exit_code = app.exec_()
 
     # This code executes only after the PyQtGraph window is closed.
-    main_logger.info("Application shutdown complete.")
\ No newline at end of file
+    robot.close()
+    main_logger.info("Application shutdown complete.")
+    sys.exit(exit_code)
\ No newline at end of file
@@ -0,0 +1,201 @@
+import logging
+import threading
+import time
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from motion_controller import MotionController
+
+PREFIX = "teraranger"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value) -> str:
+    """Counters stay exact integers, everything else uses the shortest float repr."""
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class MetricsServer:
+    """
+    Serves RobotInterface health metrics in the Prometheus text exposition format
+    on http://<host>:<port>/metrics.
+
+    Metrics are collected from the robot's existing counters when a scrape
+    arrives, so serving them costs nothing on the receive path. Rates such as
+    packets/s are computed between consecutive scrapes; Prometheus can also
+    derive them from the *_total counters with rate().
+    """
+
+    def __init__(self, robot, host: str = "127.0.0.1", port: int = 9100):
+        """
+        Args:
+            robot: The RobotInterface to report on.
+            host: Address to listen on. The default only accepts local scrapes.
+            port: TCP port (0 picks a free port, see self.port).
+        """
+        self.robot = robot
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._last_scrape = None  # (time, datagrams_received) of the previous scrape
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                try:
+                    body = server.render().encode()
+                except Exception as e:
+                    server.logger.error(f"❌ Failed to collect metrics: {e}", exc_info=True)
+                    self.send_error(500)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                server.logger.debug("Metrics request: " + format, *args)
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self.host, self.port = self._httpd.server_address[:2]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="MetricsServer", daemon=True)
+        self._thread.start()
+        self.logger.info(f"📊 Metrics available at http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+
+    def render(self) -> str:
+        """Collects all metrics and returns them in the Prometheus text format."""
+        robot = self.robot
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            """samples: list of (labels dict, value)."""
+            full = f"{PREFIX}_{name}"
+            lines.append(f"# HELP {full} {help_text}")
+            lines.append(f"# TYPE {full} {kind}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"{full}{{{label_text}}} {_format_value(value)}" if label_text
+                             else f"{full} {_format_value(value)}")
+
+        # Ingest
+        now = time.monotonic()
+        received = robot.datagrams_received
+        with self._lock:
+            previous = self._last_scrape
+            self._last_scrape = (now, received)
+        rate = None
+        if previous is not None and now > previous[0]:
+            rate = (received - previous[1]) / (now - previous[0])
+        metric("datagrams_received_total", "counter", "Telemetry datagrams received.", [({}, received)])
+        metric("datagrams_per_second", "gauge", "Telemetry datagrams received per second since the previous scrape.",
+               [({}, rate)])
+
+        failures = dict(robot.parse_failures)
+        failures["invalid_utf8"] = robot.decode_errors
+        failures["binary"] = robot.binary_decode_errors
+        metric("parse_failures_total", "counter", "Rejected telemetry by failure type.",
+               [({"type": kind}, count) for kind, count in sorted(failures.items())])
+        metric("stale_tof_frames_total", "counter", "ToF lines re-sent without a new reading.",
+               [({}, robot.stale_tof_frames)])
+
+        ingest = robot.get_ingest_stats()
+        metric("socket_kernel_drops_total", "counter", "Datagrams dropped by the kernel receive buffer (batched ingest).",
+               [({}, ingest.get("kernel_drops"))])
+        metric("ingest_pool_full_total", "counter", "Receive batches that filled the buffer pool.",
+               [({}, ingest.get("pool_full"))])
+        link = robot.get_link_stats()
+        metric("link_lost_total", "counter", "Sequenced frames lost on the link.", [({}, link["lost"])])
+        metric("link_reordered_total", "counter", "Sequenced frames that arrived out of order.",
+               [({}, link["reordered"])])
+        metric("link_duplicates_total", "counter", "Duplicate sequenced frames.", [({}, link["duplicates"])])
+        metric("link_jitter_seconds", "gauge", "RFC 3550 inter-arrival jitter.", [({}, link["jitter_ms"] / 1e3)])
+
+        # Commands
+        commands = robot.get_command_stats()
+        metric("command_queue_depth", "gauge", "Commands waiting to be sent.", [({}, commands["queue_depth"])])
+        metric("commands_sent_total", "counter", "Commands sent to the robot.", [({}, commands["sent"])])
+        metric("command_send_errors_total", "counter", "Commands that failed to send.", [({}, commands["send_errors"])])
+
+        # Map and pose
+        metric("map_points", "gauge", "ToF endpoint cells in the point map.", [({}, len(robot.end_points))])
+        metric("occupancy_grid_bytes", "gauge", "Memory used by the occupancy grid.",
+               [({}, robot.occupancy_grid.memory_bytes)])
+        metric("occupancy_grid_scans_total", "counter", "Scans integrated into the occupancy grid.",
+               [({}, robot.occupancy_grid.scan_count)])
+        metric("odometry_samples_total", "counter", "Robot samples integrated by odometry.",
+               [({}, robot.odometry.sample_count)])
+        _, _, _, _, covariance = robot.pose_estimator.snapshot()
+        metric("pose_position_stddev_cm", "gauge", "Position uncertainty of the filtered pose (1 sigma).",
+               [({}, float(np.sqrt(max(covariance[0, 0] + covariance[1, 1], 0.0))))])
+        metric("pose_heading_stddev_degrees", "gauge", "Heading uncertainty of the filtered pose (1 sigma).",
+               [({}, float(np.degrees(np.sqrt(max(covariance[2, 2], 0.0)))))])
+
+        matcher = robot.scan_matcher
+        if matcher is not None:
+            metric("scan_matches_total", "counter", "Scan matches by outcome.",
+                   [({"result": "accepted"}, matcher.matches_accepted),
+                    ({"result": "rejected"}, matcher.matches_rejected)])
+            metric("scan_match_last_seconds", "gauge", "Duration of the most recent scan match.",
+                   [({}, matcher.last_duration)])
+
+        localizer = robot.localizer
+        if localizer is not None:
+            metric("localization_converged", "gauge", "1 while localized in the saved map.",
+                   [({}, 1 if localizer.converged else 0)])
+            metric("localization_updates_total", "counter", "Particle filter updates.",
+                   [({}, localizer.filter.updates)])
+            metric("localization_update_last_seconds", "gauge", "Duration of the most recent particle filter update.",
+                   [({}, localizer.last_duration)])
+
+        graph = robot.pose_graph
+        if graph is not None:
+            stats = graph.stats()
+            metric("pose_graph_keyframes", "gauge", "Keyframes in the pose graph.", [({}, stats["keyframes"])])
+            metric("pose_graph_loop_closures_total", "counter", "Loop closure matches by outcome.",
+                   [({"result": "accepted"}, stats["loop_closures"]),
+                    ({"result": "rejected"}, stats["loops_rejected"])])
+            metric("pose_graph_optimize_last_seconds", "gauge",
+                   "Duration of the most recent optimization including map re-projection.",
+                   [({}, stats["last_duration_s"])])
+
+        planner = robot.path_planner
+        if planner is not None:
+            metric("path_planner_last_seconds", "gauge", "Duration of the most recent path plan or repair.",
+                   [({}, planner.last_duration)])
+            if planner.incremental:
+                metric("path_planner_repairs_total", "counter", "Incremental path searches after map updates.",
+                       [({}, planner.repairs)])
+
+        # Rendering (reported by the view, zero when headless)
+        metric("render_frame_seconds", "summary", "Plot redraw time.", [])
+        lines.append(f"{PREFIX}_render_frame_seconds_sum {_format_value(robot.frame_time_sum)}")
+        lines.append(f"{PREFIX}_render_frame_seconds_count {_format_value(robot.frames_rendered)}")
+        metric("render_last_frame_seconds", "gauge", "Duration of the most recent plot redraw.",
+               [({}, robot.last_frame_time)])
+
+        # Motion controller: one series per state, 1 for the current one
+        state = robot.motion_controller.state
+        metric("motion_controller_state", "gauge", "Current move-to-target controller state.",
+               [({"state": s}, 1 if s == state else 0)
+                for s in (MotionController.IDLE, MotionController.PLANNING, MotionController.TURNING,
+                          MotionController.MOVING, MotionController.FINAL_TURN)])
+
+        return "\n".join(lines) + "\n"
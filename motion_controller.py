@@ -0,0 +1,351 @@
+import logging
+import threading
+import time
+import numpy as np
+
+
+def normalize_angle_deg(angle: float) -> float:
+    """Normalizes an angle to [0, 360)."""
+    return (angle % 360 + 360) % 360
+
+
+def angle_difference_deg(target: float, current: float) -> float:
+    """Returns the signed shortest turn from current to target, in (-180, 180]."""
+    diff = normalize_angle_deg(target) - normalize_angle_deg(current)
+    if diff > 180:
+        diff -= 360
+    elif diff < -180:
+        diff += 360
+    return diff
+
+
+class MotionController:
+    """
+    Event-driven move-to-target controller.
+
+    All moves run on one controller thread. Instead of polling the sensor values,
+    each phase (turn, move, final turn) waits on a condition that the robot core
+    notifies for every parsed RB sample (notify_sample), so a phase boundary is
+    detected within one telemetry period. Submitting a new target preempts the
+    move in progress. With an incremental path planner every map update
+    (notify_map_update) also wakes a driving leg, which repairs the path and
+    switches to the new legs without stopping first if the path changed.
+    """
+
+    # Controller states, also reported through RobotInterface metrics
+    IDLE, PLANNING, TURNING, MOVING, FINAL_TURN = "idle", "planning", "turning", "moving", "final_turn"
+
+    def __init__(self, robot):
+        """
+        Args:
+            robot: The RobotInterface providing sensor values, pose and the command link.
+        """
+        self.robot = robot
+        self.logger = logging.getLogger(__name__)
+
+        # Tolerances for movement and turning
+        self.ANGLE_TOLERANCE_DEG = 2.0  # Degrees
+        self.DISTANCE_TOLERANCE_MM = 5.0 # Millimeters
+        self.TURN_TIMEOUT_S = 10.0
+
+        self.state = self.IDLE
+        self._cond = threading.Condition()
+        self._goal = None  # Pending (target_x, target_y, target_angle, speed)
+        self._preempted = False  # Set when the move in progress must be abandoned
+        self._map_updated = False  # Set when a scan changed the map since the last path repair
+        self._path = []  # Waypoints after the one the robot is heading to
+        self._running = True
+        self.sample_count = 0
+
+        self._thread = threading.Thread(target=self._run, name="MotionController", daemon=True)
+        self._thread.start()
+
+    def notify_sample(self):
+        """Wakes the controller; called by the robot core after every RB sample."""
+        with self._cond:
+            self.sample_count += 1
+            self._cond.notify_all()
+
+    def notify_map_update(self):
+        """Wakes a driving leg to repair its path; called by the robot core after every integrated scan."""
+        with self._cond:
+            self._map_updated = True
+            self._cond.notify_all()
+
+    def submit(self, target_x: float, target_y: float, target_angle: float, speed: float):
+        """Queues a new target, preempting the move in progress (if any)."""
+        with self._cond:
+            if self.state != self.IDLE:
+                self.logger.warning("🛑 New move request received. Cancelling current robot movement...")
+                # Stop the old MOVE/TURN right away. Sent with the lock held, so the STOP is
+                # queued before the controller thread can send the first command of the new move.
+                self.robot.send_command_to_esp("STOP,0,0")
+                self._preempted = True
+            self._goal = (target_x, target_y, normalize_angle_deg(target_angle), speed)
+            self._cond.notify_all()
+
+    def cancel(self):
+        """Abandons the current and pending moves and stops the robot."""
+        with self._cond:
+            self._goal = None
+            if self.state != self.IDLE:
+                self._preempted = True
+            self._cond.notify_all()
+        self.robot.send_command_to_esp("STOP,0,0")
+
+    def close(self, timeout: float = 1.0):
+        with self._cond:
+            self._running = False
+            self._preempted = True
+            self._cond.notify_all()
+        self._thread.join(timeout=timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and self._goal is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                goal = self._goal
+                self._goal = None
+                self._preempted = False
+                # Not IDLE from here on, so a target submitted while planning preempts this one
+                self.state = self.PLANNING
+            try:
+                self._move_to_target(*goal)
+            except Exception as e:
+                self.logger.error(f"❌ Error while moving to target: {e}", exc_info=True)
+            finally:
+                with self._cond:
+                    self.state = self.IDLE
+
+    def _wait_for(self, condition, timeout: float, wake_on_map_update: bool = False) -> str:
+        """
+        Blocks until condition() is true, re-checking it on every new sample.
+
+        Args:
+            condition: Checked with the controller lock held, so it must be quick.
+            timeout: Maximum wait in seconds.
+            wake_on_map_update: Also return when a scan updated the map.
+
+        Returns:
+            "done", "timeout", "map_updated", or "preempted" if a new target or
+            cancel arrived.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._preempted or not self._running:
+                    return "preempted"
+                if condition():
+                    return "done"
+                if wake_on_map_update and self._map_updated:
+                    self._map_updated = False
+                    return "map_updated"
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return "timeout"
+                self._cond.wait(remaining)
+
+    def _turn_to(self, heading_deg: float, speed: float, label: str) -> bool:
+        """
+        Turns to an absolute heading and waits until it is reached.
+        Returns False if the move was preempted.
+        """
+        robot = self.robot
+        robot.send_command_to_esp(f"TURN,{heading_deg},{speed}")
+
+        def heading_reached():
+            current = robot.get_robot_sensor_value(0)
+            return current is not None and abs(angle_difference_deg(heading_deg, current)) <= self.ANGLE_TOLERANCE_DEG
+
+        result = self._wait_for(heading_reached, self.TURN_TIMEOUT_S)
+        current_angle = normalize_angle_deg(robot.get_robot_sensor_value(0, default=0.0))
+        if result == "preempted":
+            self.logger.info(f"Movement cancelled during {label}.")
+            return False
+        if result == "done":
+            self.logger.info(f"✅ Robot reached {label} angle within tolerance ({self.ANGLE_TOLERANCE_DEG}°). Current: {current_angle:.2f}° (Target: {heading_deg:.2f}°)")
+        else:
+            self.logger.warning(f"❌ Robot did not reach {label} angle {heading_deg:.2f}° within {self.TURN_TIMEOUT_S}s. Current: {current_angle:.2f}°")
+            robot.send_command_to_esp("STOP,0,0") # Attempt to stop the robot
+        return True
+
+    def _drive(self, distance: float, speed: float, waypoint: tuple = None) -> bool:
+        """
+        Drives straight ahead by a distance and waits until the odometer reaches it.
+        With an incremental path planner, the path to the waypoint the leg drives
+        to is repaired after every map update; the leg ends early, without a STOP,
+        if the repaired path leaves it.
+        Returns False if the move was preempted or the target became unreachable.
+        """
+        robot = self.robot
+        initial_robot_distance_in_mm = robot.get_robot_sensor_value(1) # Assuming index 1 is distance
+        if initial_robot_distance_in_mm is None:
+            self.logger.error("Current robot distance not available for move command.")
+            return False
+
+        # The MOVE command uses the *current* distance sensor reading as a baseline
+        # and adds the desired incremental movement.
+        target_distance_value_in_mm = initial_robot_distance_in_mm + distance
+        self.logger.info(f"Moving to target position. Distance needed: {distance:.2f}mm. Target distance value: {target_distance_value_in_mm:.2f}")
+        robot.send_command_to_esp(f"MOVE,{target_distance_value_in_mm},{speed}")
+
+        def distance_reached():
+            current = robot.get_robot_sensor_value(1)
+            if current is None:
+                return False
+            # Close to or past the target distance value
+            if abs(target_distance_value_in_mm - current) <= self.DISTANCE_TOLERANCE_MM or current >= target_distance_value_in_mm:
+                return True
+            return False
+
+        timeout = distance / speed * 2.0 if speed > 0 else 10.0 # Double estimated time as timeout
+        timeout = max(timeout, 5.0) # Ensure a minimum timeout
+        planner = robot.path_planner
+        repair = waypoint is not None and planner is not None and planner.incremental
+        deadline = time.monotonic() + timeout
+        while True:
+            result = self._wait_for(distance_reached, deadline - time.monotonic(), wake_on_map_update=repair)
+            if result != "map_updated":
+                break
+            repaired = self._repair_path(waypoint)
+            if repaired == "blocked":
+                self.logger.error("❌ The target became unreachable around newly mapped obstacles. Stopping.")
+                robot.send_command_to_esp("STOP,0,0")
+                return False
+            if repaired == "rerouted":
+                # The next MOVE or TURN replaces the current one, the robot is not stopped in between
+                return True
+        current_distance_in_mm = robot.get_robot_sensor_value(1, default=float("nan"))
+        if result == "preempted":
+            self.logger.info("Movement cancelled while driving.")
+            return False
+        if result == "done":
+            if current_distance_in_mm > target_distance_value_in_mm + self.DISTANCE_TOLERANCE_MM * 5: # Overshot by more than 5x tolerance
+                self.logger.warning(f"⚠️ Robot significantly overshot target distance. Current: {current_distance_in_mm:.2f}mm, Target: {target_distance_value_in_mm:.2f}mm")
+            else:
+                self.logger.info(f"✅ Robot reached target distance within tolerance ({self.DISTANCE_TOLERANCE_MM}mm) or passed. Current: {current_distance_in_mm:.2f}mm")
+        else:
+            self.logger.warning(f"❌ Robot did not reach target distance {target_distance_value_in_mm:.2f}mm within {timeout:.1f}s. Current: {current_distance_in_mm:.2f}mm")
+            robot.send_command_to_esp("STOP,0,0")
+        return True
+
+    def _move_to_target(self, target_x: float, target_y: float, target_angle: float, speed: float):
+        """
+        Moves the robot from its current position and angle to the specified
+        target coordinates and angle: plan a path around the mapped obstacles,
+        turn towards and drive to each waypoint in turn, then turn to the final
+        angle. Without a path planner the robot drives straight to the target.
+        Runs on the controller thread.
+
+        Args:
+            target_x: The target X coordinate in mm.
+            target_y: The target Y coordinate in mm.
+            target_angle: The target angle in degrees (0-360).
+            speed: The speed for movement and turning.
+        """
+        robot = self.robot
+        self.logger.info(f"Initiating movement to Target: X={target_x:.2f}mm, Y={target_y:.2f}mm, Angle={target_angle:.2f}° at speed {speed}")
+
+        waypoints = [(target_x, target_y)]
+        planner = robot.path_planner
+        if planner is not None:
+            current_x, current_y, _, _ = robot.pose_estimator.latest_pose()
+            waypoints = planner.plan(current_x, current_y, target_x, target_y)
+            if waypoints is None:
+                self.logger.error(f"❌ No path to target ({target_x:.2f}, {target_y:.2f}) around the mapped obstacles.")
+                return
+            legs = planner.to_legs(current_x, current_y, waypoints)
+            self.logger.info(f"🧭 Planned {len(waypoints)} waypoint(s) in {planner.last_duration * 1e3:.1f} ms: "
+                             + ", ".join(f"{kind} {value:.1f}" for kind, value in legs))
+        with self._cond:
+            if self._preempted:
+                self.logger.info("⏹️ Target replaced while planning, path discarded.")
+                return
+
+        # 1. + 2. Turn towards each waypoint and drive to it. Path repairs while
+        # driving may replace the remaining waypoints (see _repair_path).
+        self._path = list(waypoints)
+        while self._path:
+            waypoint_x, waypoint_y = self._path.pop(0)
+            if not self._go_to_point(waypoint_x, waypoint_y, speed):
+                return
+
+        # 3. Final turn to the target angle
+        current_angle = robot.get_robot_sensor_value(0) # Re-read current angle
+        if current_angle is None:
+            self.logger.error("Current robot angle not available for final turn.")
+            return
+        target_angle = normalize_angle_deg(robot.pose_estimator.robot_yaw_deg(target_angle))
+        angle_diff_final_turn = angle_difference_deg(target_angle, current_angle)
+        if abs(angle_diff_final_turn) > self.ANGLE_TOLERANCE_DEG: # Only turn if significant angle
+            self.logger.info(f"Performing final turn to target angle: {target_angle:.2f}°. Required turn: {angle_diff_final_turn:.2f}°")
+            self.state = self.FINAL_TURN
+            if not self._turn_to(target_angle, speed, "final target"):
+                return
+
+        self.logger.info("✅ Robot reached target position and angle.")
+
+    def _go_to_point(self, target_x: float, target_y: float, speed: float) -> bool:
+        """
+        Turns towards a point and drives straight to it, starting from the live pose
+        so errors of earlier legs are not carried over.
+        Returns False if the move was preempted or the pose is not available.
+        """
+        robot = self.robot
+        current_x, current_y, _, _ = robot.pose_estimator.latest_pose()
+        current_angle = robot.get_robot_sensor_value(0) # Assuming index 0 is gyro angle
+        if current_angle is None:
+            self.logger.error("Cannot move to target: current robot angle not available.")
+            return False
+
+        # Turn to face the target position. The robot's yaw is clockwise positive,
+        # hence the negated plot angle.
+        delta_x = target_x - current_x
+        delta_y = target_y - current_y
+        # Headings in the map frame are converted to the yaw frame of the mobile base.
+        target_heading_for_move = normalize_angle_deg(
+            robot.pose_estimator.robot_yaw_deg(np.degrees(-np.arctan2(delta_y, delta_x))))
+        angle_diff_to_face_target = angle_difference_deg(target_heading_for_move, current_angle)
+
+        distance_to_target_in_mm = float(np.hypot(delta_x, delta_y))
+        if distance_to_target_in_mm <= self.DISTANCE_TOLERANCE_MM: # Already there, no turn needed
+            return True
+
+        if abs(angle_diff_to_face_target) > self.ANGLE_TOLERANCE_DEG:
+            self.logger.info(f"Turning from {normalize_angle_deg(current_angle):.2f}° to face target point ({target_x:.2f}, {target_y:.2f}). Required turn: {angle_diff_to_face_target:.2f}°")
+            self.state = self.TURNING
+            if not self._turn_to(target_heading_for_move, speed, "initial turn"):
+                return False
+
+        # Move to the target position
+        self.state = self.MOVING
+        return self._drive(distance_to_target_in_mm, speed, (target_x, target_y))
+
+    def _repair_path(self, waypoint: tuple) -> str:
+        """
+        Repairs the planned path from the live pose after a map update, while the
+        robot keeps driving towards a waypoint.
+
+        Returns:
+            "kept" if the path still leads to the waypoint (the later waypoints
+            are updated), "rerouted" if the remaining waypoints were replaced
+            and the current leg must end, or "blocked" if there is no path.
+        """
+        robot = self.robot
+        planner = robot.path_planner
+        current_x, current_y, _, _ = robot.pose_estimator.latest_pose()
+        waypoints = planner.replan(current_x, current_y)
+        if waypoints is None:
+            return "blocked"
+        next_x, next_y = waypoints[0]
+        if np.hypot(next_x - waypoint[0], next_y - waypoint[1]) <= planner.cost_map.resolution:
+            self._path = list(waypoints[1:])
+            return "kept"
+        self._path = list(waypoints)
+        legs = planner.to_legs(current_x, current_y, waypoints)
+        self.logger.info(f"🧭 Path repaired in {planner.last_duration * 1e3:.1f} ms: "
+                         + ", ".join(f"{kind} {value:.1f}" for kind, value in legs))
+        return "rerouted"
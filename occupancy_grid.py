@@ -0,0 +1,284 @@
+import collections
+import threading
+import numpy as np
+
+
+class OccupancyGrid:
+    """
+    Log-odds occupancy grid built from ToF scans.
+
+    The grid has a fixed cell resolution and only covers the explored area: it
+    starts empty and grows in whole tiles whenever a scan reaches outside the
+    current bounds. Cells are stored as log_odds[ix, iy] relative to origin_cell.
+
+    Every update bumps revision and journals the cells whose state changed
+    between free, unknown and occupied (the sign of the log-odds), so consumers
+    such as the path planner can follow the map without diffing all of it
+    (see changes_since).
+    """
+
+    def __init__(self, resolution: float = 2.0, tile_size: int = 64, max_range: float = 200.0,
+                 l_occ: float = 0.85, l_free: float = -0.4, l_min: float = -4.0, l_max: float = 4.0,
+                 journal_length: int = 1024):
+        """
+        Args:
+            resolution: Cell edge length, in map units (same unit as the plot).
+            tile_size: Number of cells per tile edge; the grid grows tile by tile.
+            max_range: Readings beyond this range only clear free space, no hit is marked.
+            l_occ: Log-odds increment applied to a cell containing a beam endpoint.
+            l_free: Log-odds increment applied to cells traversed by a beam.
+            l_min: Lower clamp for the log-odds value of a cell.
+            l_max: Upper clamp for the log-odds value of a cell.
+            journal_length: Number of updates whose state changes are kept for changes_since().
+        """
+        self.resolution = resolution
+        self.tile_size = tile_size
+        self.max_range = max_range
+        self.l_occ = l_occ
+        self.l_free = l_free
+        self.l_min = l_min
+        self.l_max = l_max
+
+        self.log_odds = np.zeros((0, 0), dtype=np.float32)
+        self.origin_cell = (0, 0)  # Cell index (ix, iy) of log_odds[0, 0]
+        self.scan_count = 0
+        self.revision = 0  # Incremented by every update
+        self._journal = collections.deque(maxlen=journal_length)  # (revision, ix, iy) of changed cells
+        self._journal_floor = 0  # Changes up to this revision are no longer journaled
+        self._lock = threading.Lock()
+
+    def world_to_cell(self, x, y):
+        """Converts world coordinates (scalars or arrays) to integer cell indices."""
+        ix = np.floor(np.asarray(x) / self.resolution).astype(np.int64)
+        iy = np.floor(np.asarray(y) / self.resolution).astype(np.int64)
+        return ix, iy
+
+    def cell_to_world(self, ix, iy):
+        """Returns the world coordinates of the centers of the given cells."""
+        return (np.asarray(ix) + 0.5) * self.resolution, (np.asarray(iy) + 0.5) * self.resolution
+
+    def _ensure_contains(self, ix_min: int, ix_max: int, iy_min: int, iy_max: int):
+        """Grows the grid (in whole tiles) so that the given cell range is covered."""
+        ox, oy = self.origin_cell
+        nx, ny = self.log_odds.shape
+        if nx and ix_min >= ox and iy_min >= oy and ix_max < ox + nx and iy_max < oy + ny:
+            return
+
+        t = self.tile_size
+        if nx:
+            ix_min, iy_min = min(ix_min, ox), min(iy_min, oy)
+            ix_max, iy_max = max(ix_max, ox + nx - 1), max(iy_max, oy + ny - 1)
+        new_ox = (ix_min // t) * t
+        new_oy = (iy_min // t) * t
+        new_nx = (ix_max // t + 1) * t - new_ox
+        new_ny = (iy_max // t + 1) * t - new_oy
+
+        grown = np.zeros((new_nx, new_ny), dtype=np.float32)
+        if nx:
+            grown[ox - new_ox:ox - new_ox + nx, oy - new_oy:oy - new_oy + ny] = self.log_odds
+        self.log_odds = grown
+        self.origin_cell = (new_ox, new_oy)
+
+    def integrate_scan(self, origin_x: float, origin_y: float, angles_rad, distances, weight: float = 1.0) -> int:
+        """
+        Ray-casts one scan into the grid in a single vectorized step.
+
+        Every beam clears the cells it traverses and marks its endpoint as occupied
+        (unless the reading is beyond max_range). Negative or non-finite readings
+        are ignored. Each cell is updated at most once per scan.
+
+        Args:
+            origin_x: Sensor origin X in map units.
+            origin_y: Sensor origin Y in map units.
+            angles_rad: Absolute beam angles in radians.
+            distances: Beam ranges in map units.
+            weight: Multiplier for the log-odds updates (-1.0 removes a previously integrated scan).
+
+        Returns:
+            The number of cells that were updated.
+        """
+        angles_rad = np.asarray(angles_rad, dtype=np.float64)
+        distances = np.asarray(distances, dtype=np.float64)
+        valid = np.isfinite(distances) & (distances >= 0)
+        if not np.any(valid):
+            return 0
+        angles_rad = angles_rad[valid]
+        distances = distances[valid]
+
+        hit = distances <= self.max_range
+        lengths = np.minimum(distances, self.max_range)
+        cos_a = np.cos(angles_rad)
+        sin_a = np.sin(angles_rad)
+
+        # Sample all beams at half-cell steps at once: shape (beams, steps).
+        step = 0.5 * self.resolution
+        n_steps = int(np.ceil(lengths.max() / step)) + 1
+        t = np.arange(n_steps) * step
+        along = t[np.newaxis, :] < (lengths[:, np.newaxis] - step)
+        sample_x = origin_x + t[np.newaxis, :] * cos_a[:, np.newaxis]
+        sample_y = origin_y + t[np.newaxis, :] * sin_a[:, np.newaxis]
+        free_ix, free_iy = self.world_to_cell(sample_x[along], sample_y[along])
+
+        hit_ix, hit_iy = self.world_to_cell(origin_x + lengths[hit] * cos_a[hit],
+                                            origin_y + lengths[hit] * sin_a[hit])
+        end_ix, end_iy = self.world_to_cell(origin_x + lengths * cos_a, origin_y + lengths * sin_a)
+
+        all_ix = np.concatenate((free_ix, end_ix))
+        all_iy = np.concatenate((free_iy, end_iy))
+
+        with self._lock:
+            self._ensure_contains(int(all_ix.min()), int(all_ix.max()), int(all_iy.min()), int(all_iy.max()))
+            ox, oy = self.origin_cell
+            ny = self.log_odds.shape[1]
+            flat = self.log_odds.reshape(-1)
+
+            hit_cells = np.unique((hit_ix - ox) * ny + (hit_iy - oy))
+            free_cells = np.setdiff1d((free_ix - ox) * ny + (free_iy - oy), hit_cells)
+
+            updated = np.concatenate((free_cells, hit_cells))
+            before = np.sign(flat[updated])
+            flat[free_cells] += weight * self.l_free
+            flat[hit_cells] += weight * self.l_occ
+            flat[updated] = np.clip(flat[updated], self.l_min, self.l_max)
+            self._record_changes(updated, before)
+            self.scan_count += 1
+        return len(updated)
+
+    def integrate_scans(self, origins_x, origins_y, angles_rad, distances, weight: float = 1.0,
+                        chunk_size: int = 256) -> int:
+        """
+        Ray-casts many scans at once, e.g. to re-project scans after a pose
+        correction. Equivalent to calling integrate_scan() for each scan in turn,
+        except that the log-odds clamp is applied once per chunk of scans.
+
+        Args:
+            origins_x: Sensor origin X of each scan, shape (n,).
+            origins_y: Sensor origin Y of each scan, shape (n,).
+            angles_rad: Absolute beam angles, shape (n, beams).
+            distances: Beam ranges in map units, shape (n, beams).
+            weight: Multiplier for the log-odds updates (-1.0 removes previously integrated scans).
+            chunk_size: Number of scans ray-cast together, bounds the temporary memory.
+
+        Returns:
+            The number of cell updates.
+        """
+        origins_x = np.asarray(origins_x, dtype=np.float64)
+        origins_y = np.asarray(origins_y, dtype=np.float64)
+        angles_rad = np.asarray(angles_rad, dtype=np.float64)
+        distances = np.asarray(distances, dtype=np.float64)
+        updates = 0
+        for start in range(0, len(distances), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            beams = distances[chunk].shape[1]
+            scan = np.repeat(np.arange(len(distances[chunk])), beams)
+            origin_x = np.repeat(origins_x[chunk], beams)
+            origin_y = np.repeat(origins_y[chunk], beams)
+            angles = angles_rad[chunk].ravel()
+            lengths = distances[chunk].ravel()
+            valid = np.isfinite(lengths) & (lengths >= 0)
+            if not np.any(valid):
+                continue
+            scan, origin_x, origin_y, angles, lengths = (a[valid] for a in (scan, origin_x, origin_y, angles, lengths))
+
+            hit = lengths <= self.max_range
+            lengths = np.minimum(lengths, self.max_range)
+            cos_a = np.cos(angles)
+            sin_a = np.sin(angles)
+
+            # Same half-cell sampling as integrate_scan, with one origin per beam
+            step = 0.5 * self.resolution
+            n_steps = int(np.ceil(lengths.max() / step)) + 1
+            t = np.arange(n_steps) * step
+            along = t[np.newaxis, :] < (lengths[:, np.newaxis] - step)
+            beam_index, step_index = np.nonzero(along)
+            free_ix, free_iy = self.world_to_cell(origin_x[beam_index] + t[step_index] * cos_a[beam_index],
+                                                  origin_y[beam_index] + t[step_index] * sin_a[beam_index])
+            hit_ix, hit_iy = self.world_to_cell(origin_x[hit] + lengths[hit] * cos_a[hit],
+                                                origin_y[hit] + lengths[hit] * sin_a[hit])
+            end_ix, end_iy = self.world_to_cell(origin_x + lengths * cos_a, origin_y + lengths * sin_a)
+
+            all_ix = np.concatenate((free_ix, end_ix))
+            all_iy = np.concatenate((free_iy, end_iy))
+
+            with self._lock:
+                self._ensure_contains(int(all_ix.min()), int(all_ix.max()), int(all_iy.min()), int(all_iy.max()))
+                ox, oy = self.origin_cell
+                ny = self.log_odds.shape[1]
+                size = self.log_odds.size
+                flat = self.log_odds.reshape(-1)
+
+                # Keys of (scan, cell) pairs, so each cell is updated at most once per scan
+                hit_keys = np.unique(scan[hit] * size + (hit_ix - ox) * ny + (hit_iy - oy))
+                free_keys = scan[beam_index] * size + (free_ix - ox) * ny + (free_iy - oy)
+                # Samples are half a cell apart, so drop repeats along each beam before the set operation
+                repeated = np.zeros(len(free_keys), dtype=bool)
+                repeated[1:] = free_keys[1:] == free_keys[:-1]
+                free_keys = np.setdiff1d(free_keys[~repeated], hit_keys)
+
+                free_cells, free_counts = np.unique(free_keys % size, return_counts=True)
+                hit_cells, hit_counts = np.unique(hit_keys % size, return_counts=True)
+                updated = np.union1d(free_cells, hit_cells)
+                before = np.sign(flat[updated])
+                flat[free_cells] += weight * self.l_free * free_counts
+                flat[hit_cells] += weight * self.l_occ * hit_counts
+                flat[updated] = np.clip(flat[updated], self.l_min, self.l_max)
+                self._record_changes(updated, before)
+                self.scan_count += len(distances[chunk])
+            updates += len(free_keys) + len(hit_keys)
+        return updates
+
+    def _record_changes(self, updated: np.ndarray, before: np.ndarray):
+        """Journals the updated cells whose log-odds sign changed. Caller must hold the lock."""
+        self.revision += 1
+        flat = self.log_odds.reshape(-1)
+        changed = updated[np.sign(flat[updated]) != before]
+        if len(changed) == 0:
+            return
+        if len(self._journal) == self._journal.maxlen:
+            self._journal_floor = self._journal[0][0]
+        ny = self.log_odds.shape[1]
+        self._journal.append((self.revision, changed // ny + self.origin_cell[0], changed % ny + self.origin_cell[1]))
+
+    def changes_since(self, revision: int):
+        """
+        Returns the cells whose state changed after the given revision.
+
+        Returns:
+            (ix, iy, state, revision): absolute cell indices (cells may repeat), their
+            current state (-1 free, 0 unknown, 1 occupied) and the current revision;
+            None if the journal does not reach back to the given revision.
+        """
+        with self._lock:
+            return self._changes_since(revision)
+
+    def _changes_since(self, revision: int):
+        """changes_since() for callers that already hold the lock."""
+        if revision < self._journal_floor:
+            return None
+        entries = [(ix, iy) for entry_revision, ix, iy in self._journal if entry_revision > revision]
+        ix = np.concatenate([e[0] for e in entries]) if entries else np.zeros(0, dtype=np.int64)
+        iy = np.concatenate([e[1] for e in entries]) if entries else np.zeros(0, dtype=np.int64)
+        ox, oy = self.origin_cell
+        state = np.sign(self.log_odds[ix - ox, iy - oy]).astype(np.int8)
+        return ix, iy, state, self.revision
+
+    def probabilities(self) -> np.ndarray:
+        """Returns the occupancy probability of every cell."""
+        with self._lock:
+            return 1.0 - 1.0 / (1.0 + np.exp(self.log_odds))
+
+    def occupied_mask(self, threshold: float = 0.0) -> np.ndarray:
+        """Returns a boolean array of cells whose log-odds exceed the threshold."""
+        with self._lock:
+            return self.log_odds > threshold
+
+    def extent(self) -> tuple:
+        """Returns the covered area as (x_min, y_min, width, height) in map units."""
+        ox, oy = self.origin_cell
+        nx, ny = self.log_odds.shape
+        r = self.resolution
+        return ox * r, oy * r, nx * r, ny * r
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.log_odds.nbytes
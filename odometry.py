@@ -0,0 +1,300 @@
+import math
+import threading
+import time
+import numpy as np
+from ring_buffer import RingBuffer
+
+# Pose history columns
+T, X, Y, THETA = range(4)
+
+
+class OdometryEngine:
+    """
+    Dead-reckoning pose integrator driven by robot telemetry samples.
+
+    It is fed from the receive path for every parsed RB sample, so the pose
+    does not depend on how often (or whether) the plot is redrawn. Timestamped
+    poses are kept in a preallocated history that readers only copy from.
+    """
+
+    def __init__(self, capacity: int = 10000):
+        self.capacity = capacity
+
+        # Preallocated pose history: timestamp, x, y, heading (rad)
+        self.history = RingBuffer(capacity, columns=4)
+
+        self._lock = threading.Lock()  # Protects pose state and history
+        self.reset()
+
+    def reset(self, timestamp: float = None):
+        """Clears the history and puts the robot back at the origin."""
+        with self._lock:
+            self.history.clear()
+            self._x_pos = 0.0
+            self._y_pos = 0.0
+            self._theta_rad = 0.0
+            self._prev_distance = None
+            self.sample_count = 0
+            self._append(time.monotonic() if timestamp is None else timestamp)
+
+    def _append(self, timestamp: float):
+        """Stores the current pose in the history. Caller must hold the lock."""
+        self.history.append(timestamp, self._x_pos, self._y_pos, self._theta_rad)
+
+    def update(self, gyro_angle_deg: float, distance: float, timestamp: float = None):
+        """
+        Integrates one telemetry sample.
+
+        Args:
+            gyro_angle_deg: Robot yaw as reported by the mobile base (RB[0]).
+            distance: Total travelled distance odometer (RB[1]).
+            timestamp: Sample time in seconds, defaults to time.monotonic().
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        distance = float(distance)
+
+        with self._lock:
+            # The first sample only initializes the odometer baseline.
+            if self._prev_distance is None:
+                self._prev_distance = distance
+
+            incremental_distance = distance - self._prev_distance
+            self._prev_distance = distance
+
+            # Mobile base yaw is clockwise positive, plot heading is counter-clockwise.
+            self._theta_rad = math.radians(-gyro_angle_deg)
+            self._x_pos += incremental_distance * math.cos(self._theta_rad)
+            self._y_pos += incremental_distance * math.sin(self._theta_rad)
+            self.sample_count += 1
+            self._append(timestamp)
+
+    def latest_pose(self) -> tuple:
+        """Returns the most recent pose as (x, y, theta_rad, timestamp)."""
+        with self._lock:
+            return self._x_pos, self._y_pos, self._theta_rad, float(self.history.latest()[T])
+
+    def pose_at(self, timestamp: float) -> tuple:
+        """
+        Returns the pose (x, y, theta_rad) at the given time, linearly interpolated
+        between the two surrounding history entries and clamped to the recorded span.
+        """
+        with self._lock:
+            t = self.history.column(T)
+            i = int(np.searchsorted(t, timestamp))
+            if i >= len(t):
+                return self._x_pos, self._y_pos, self._theta_rad
+            if i == 0 or t[i] == t[i - 1]:
+                return tuple(float(v) for v in self.history.view()[X:, i])
+            a = (timestamp - t[i - 1]) / (t[i] - t[i - 1])
+            rows = self.history.view()
+            x0, y0, th0 = rows[X:, i - 1]
+            x1, y1, th1 = rows[X:, i]
+            d_theta = math.remainder(th1 - th0, math.tau)
+            return float(x0 + a * (x1 - x0)), float(y0 + a * (y1 - y0)), float(th0 + a * d_theta)
+
+    def path(self) -> tuple:
+        """
+        Returns the recorded path as (x_array, y_array), oldest first.
+        The plot keeps the arrays it is given by reference, so they come from
+        history.snapshot(), which later samples never overwrite.
+        """
+        with self._lock:
+            rows = self.history.snapshot()
+            return rows[X], rows[Y]
+
+    def __len__(self):
+        return len(self.history)
+
+
+def _first_order_recurrence(a: float, u: np.ndarray, y0: float) -> np.ndarray:
+    """
+    Evaluates y[k] = a * y[k-1] + u[k] for all k without a Python loop.
+
+    Uses the closed form y[k] = a^k * (y0 + sum_j u[j] / a^j) on blocks short enough
+    that a^-j stays within six orders of magnitude, so no precision is lost.
+    """
+    if a == 0.0:
+        return u.copy()
+    if a == 1.0:
+        return y0 + np.cumsum(u)
+    block = max(1, int(math.log(1e6) / -math.log(a)))
+    y = np.empty_like(u)
+    for start in range(0, len(u), block):
+        chunk = u[start:start + block]
+        powers = a ** np.arange(1, len(chunk) + 1)
+        y[start:start + len(chunk)] = powers * (y0 + np.cumsum(chunk / powers))
+        y0 = y[start + len(chunk) - 1]
+    return y
+
+
+def _arc_displacement(distance, theta0, theta1):
+    """
+    Displacement (dx, dy) along a circular arc of the given length from heading
+    theta0 to theta1. Near-straight segments use the midpoint heading, which is
+    the limit of the arc formula and avoids dividing by a vanishing angle.
+    """
+    d_theta = theta1 - theta0
+    straight = np.abs(d_theta) < 1e-6
+    safe = np.where(straight, 1.0, d_theta)
+    radius = distance / safe
+    mid = theta0 + d_theta / 2
+    dx = np.where(straight, distance * np.cos(mid), radius * (np.sin(theta1) - np.sin(theta0)))
+    dy = np.where(straight, distance * np.sin(mid), radius * (np.cos(theta0) - np.cos(theta1)))
+    return dx, dy
+
+
+class DifferentialDriveOdometry(OdometryEngine):
+    """
+    Pose integrator for the two-wheeled base that uses the wheel encoders
+    (RB[5] leftMotorEncoderValue, RB[6] rightMotorEncoderValue) instead of
+    stepping the odometer straight along the gyro heading.
+
+    Each sample moves the robot along the arc driven by the two wheels. The
+    heading is propagated with the encoder heading change and pulled towards the
+    gyro yaw by a complementary filter: the encoders resolve fast, sub-degree
+    heading changes in turns, the gyro keeps wheel slip from accumulating.
+    Samples without encoder values fall back to the odometer model.
+    """
+
+    # Batches shorter than this are integrated row by row: for a few samples the
+    # NumPy setup of the vectorized path costs more than it saves
+    MIN_VECTORIZED_BATCH = 8
+
+    def __init__(self, capacity: int = 10000, wheel_base: float = 15.0, ticks_per_cm: float = 20.0,
+                 gyro_gain: float = 0.05):
+        """
+        Args:
+            capacity: Number of poses kept in the history.
+            wheel_base: Distance between the wheel contact points in cm (map units).
+            ticks_per_cm: Encoder ticks per cm of wheel travel.
+            gyro_gain: Fraction of the gyro/encoder heading difference corrected per
+                sample, in [0, 1]. 1 uses the gyro heading only, 0 the encoders only.
+        """
+        self.wheel_base = wheel_base
+        self.ticks_per_cm = ticks_per_cm
+        self.gyro_gain = gyro_gain
+        super().__init__(capacity)
+
+    def reset(self, timestamp: float = None):
+        """Clears the history and puts the robot back at the origin."""
+        self._prev_ticks = None  # (left, right) encoder counts of the previous sample
+        self._gyro_theta = 0.0  # Continuous (unwrapped) gyro heading in rad
+        self._prev_gyro = 0.0  # Last raw gyro heading in rad
+        super().reset(timestamp)
+
+    def update(self, gyro_angle_deg: float, distance: float, timestamp: float = None,
+               left_ticks: float = None, right_ticks: float = None):
+        """
+        Integrates one telemetry sample.
+
+        Args:
+            gyro_angle_deg: Robot yaw as reported by the mobile base (RB[0]).
+            distance: Total travelled distance odometer (RB[1]).
+            timestamp: Sample time in seconds, defaults to time.monotonic().
+            left_ticks: Left wheel encoder count (RB[5]).
+            right_ticks: Right wheel encoder count (RB[6]).
+        """
+        if left_ticks is None or right_ticks is None:
+            super().update(gyro_angle_deg, distance, timestamp)
+            with self._lock:
+                # Restart the encoder baseline from the odometer pose
+                self._prev_ticks = None
+            return
+        if timestamp is None:
+            timestamp = time.monotonic()
+        left_ticks, right_ticks = float(left_ticks), float(right_ticks)
+        # Mobile base yaw is clockwise positive, plot heading is counter-clockwise.
+        gyro = math.radians(-gyro_angle_deg)
+
+        with self._lock:
+            self._prev_distance = float(distance)
+            if self._prev_ticks is None:
+                # The first sample only initializes the encoder and gyro baselines.
+                self._prev_ticks = (left_ticks, right_ticks)
+                self._theta_rad = self._gyro_theta = self._prev_gyro = gyro
+                self.sample_count += 1
+                self._append(timestamp)
+                return
+
+            d_left = (left_ticks - self._prev_ticks[0]) / self.ticks_per_cm
+            d_right = (right_ticks - self._prev_ticks[1]) / self.ticks_per_cm
+            self._prev_ticks = (left_ticks, right_ticks)
+            self._gyro_theta += math.remainder(gyro - self._prev_gyro, math.tau)
+            self._prev_gyro = gyro
+
+            theta0 = self._theta_rad
+            theta1 = theta0 + (d_right - d_left) / self.wheel_base
+            theta1 += self.gyro_gain * (self._gyro_theta - theta1)
+            step = (d_left + d_right) / 2
+            d_theta = theta1 - theta0
+            if abs(d_theta) < 1e-6:
+                mid = theta0 + d_theta / 2
+                self._x_pos += step * math.cos(mid)
+                self._y_pos += step * math.sin(mid)
+            else:
+                radius = step / d_theta
+                self._x_pos += radius * (math.sin(theta1) - math.sin(theta0))
+                self._y_pos += radius * (math.cos(theta0) - math.cos(theta1))
+            self._theta_rad = theta1
+            self.sample_count += 1
+            self._append(timestamp)
+
+    def update_batch(self, values: np.ndarray, timestamps):
+        """
+        Integrates a batch of telemetry samples at once, with the same result as
+        calling update() for every row. Intended for bursts of binary frames and
+        for reprocessing recorded samples.
+
+        Args:
+            values: Robot samples of shape (n, 7) in RB order.
+            timestamps: Sample times, a scalar or an array of length n.
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(-1, values.shape[-1])
+        n = len(values)
+        if n == 0:
+            return
+        timestamps = np.broadcast_to(np.asarray(timestamps, dtype=np.float64), (n,))
+        if values.shape[1] < 7:
+            for row, t in zip(values, timestamps):
+                self.update(row[0], row[1], t)
+            return
+        if n < self.MIN_VECTORIZED_BATCH:
+            for row, t in zip(values.tolist(), timestamps.tolist()):
+                self.update(row[0], row[1], t, row[5], row[6])
+            return
+
+        gyro = np.radians(-values[:, 0])
+        ticks = values[:, 5:7]
+        with self._lock:
+            self._prev_distance = float(values[-1, 1])
+            start = 0
+            if self._prev_ticks is None:
+                self._prev_ticks = (ticks[0, 0], ticks[0, 1])
+                self._theta_rad = self._gyro_theta = self._prev_gyro = gyro[0]
+                self.sample_count += 1
+                self._append(timestamps[0])
+                start = 1
+                if n == 1:
+                    return
+
+            gyro, ticks, timestamps = gyro[start:], ticks[start:], timestamps[start:]
+            steps = np.diff(ticks, axis=0, prepend=[self._prev_ticks]) / self.ticks_per_cm
+            d_left, d_right = steps[:, 0], steps[:, 1]
+            gyro_steps = np.remainder(np.diff(gyro, prepend=self._prev_gyro) + math.pi, math.tau) - math.pi
+            gyro_theta = self._gyro_theta + np.cumsum(gyro_steps)
+
+            # theta[k] = (1 - g) * (theta[k-1] + encoder step[k]) + g * gyro[k]
+            g = self.gyro_gain
+            theta = _first_order_recurrence(
+                1.0 - g, (1.0 - g) * (d_right - d_left) / self.wheel_base + g * gyro_theta, self._theta_rad)
+            theta0 = np.concatenate(([self._theta_rad], theta[:-1]))
+            dx, dy = _arc_displacement((d_left + d_right) / 2, theta0, theta)
+            x = self._x_pos + np.cumsum(dx)
+            y = self._y_pos + np.cumsum(dy)
+
+            self.history.extend(np.column_stack((timestamps, x, y, theta)))
+            self._x_pos, self._y_pos, self._theta_rad = float(x[-1]), float(y[-1]), float(theta[-1])
+            self._prev_ticks = (ticks[-1, 0], ticks[-1, 1])
+            self._gyro_theta, self._prev_gyro = float(gyro_theta[-1]), float(gyro[-1])
+            self.sample_count += len(theta)
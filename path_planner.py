@@ -0,0 +1,782 @@
+import heapq
+import logging
+import math
+import threading
+import time
+import numpy as np
+
+from localization import chamfer_distance
+
+SQRT2 = math.sqrt(2.0)
+LETHAL = math.inf
+
+
+class CostMap:
+    """
+    Inflated traversal cost of an OccupancyGrid, for path planning.
+
+    A planning cell closer than robot_radius to an occupied cell is lethal;
+    between robot_radius and inflation_radius the cost falls linearly from
+    1 + cost_scale to 1, so paths keep clear of walls where there is room. Cells
+    never observed cost an extra unknown_cost. The map covers the grid plus a
+    margin of unknown cells, and is extended to the start and goal of a plan,
+    so targets in unexplored space can be planned to.
+
+    Planning cells are downsample x downsample grid cells. Obstacle distances are
+    computed at grid resolution and a planning cell takes the smallest distance
+    inside it, so coarsening never lets a path closer to an obstacle.
+
+    The costs are cached as a flat list (row-major, with a lethal border) that
+    the planner indexes directly. update() reads the cells the grid changed
+    since the last update and only recomputes the windows around them
+    (obstacle distances are capped at inflation_radius, so a change has no
+    effect further away); a full rebuild is only needed when the grid grows.
+    """
+
+    TILE_SIZE = 32  # Grid cells per tile edge when grouping changes
+    MAX_TILES = 16  # More changed tiles than this are recomputed as one window
+
+    def __init__(self, robot_radius: float = 12.0, inflation_radius: float = 30.0, cost_scale: float = 4.0,
+                 unknown_cost: float = 0.2, occupied_threshold: float = 0.0, downsample: int = 4, margin: int = 12):
+        """
+        Args:
+            robot_radius: Minimum clearance between the robot center and an obstacle (map units).
+            inflation_radius: Distance from obstacles up to which cells cost extra (map units).
+            cost_scale: Extra cost per cell right at robot_radius.
+            unknown_cost: Extra cost per cell that was never observed.
+            occupied_threshold: Grid cells above this log-odds are obstacles.
+            downsample: Grid cells per planning cell edge.
+            margin: Planning cells of unknown space added around the grid on every side.
+        """
+        self.robot_radius = robot_radius
+        self.inflation_radius = inflation_radius
+        self.cost_scale = cost_scale
+        self.unknown_cost = unknown_cost
+        self.occupied_threshold = occupied_threshold
+        self.downsample = downsample
+        self.margin = margin
+
+        self.resolution = None  # Planning cell edge length
+        self.origin_cell = (0, 0)  # Planning cell index (ix, iy) of the first non-border cell
+        self.shape = (0, 0)  # Planning cells covered, without the border
+        self.width = 2  # Row length of the flat layout, including the border
+        self.costs = []  # Flat cost per planning cell, LETHAL for obstacles and the border
+        self.distance = np.zeros((0, 0), dtype=np.float32)  # Obstacle distance per planning cell
+        self._fine_distance = np.zeros((0, 0), dtype=np.float32)
+        self._occupied = np.zeros((0, 0), dtype=bool)
+        self._unknown = np.zeros((0, 0), dtype=bool)
+        self._grid_key = None  # (origin_cell, shape, resolution) of the grid the cache was built from
+        self._fine_origin = (0, 0)  # Grid cell index of the first covered grid cell
+        self._fine_shape = (0, 0)  # Grid cells covered, a multiple of downsample
+        self._revision = 0  # Grid revision the costs are up to date with
+        self.rebuilds = 0
+        self.partial_updates = 0
+        self._lock = threading.Lock()
+
+    def _pool(self, array: np.ndarray, reduce) -> np.ndarray:
+        """Reduces every downsample x downsample block of a grid-resolution array."""
+        f = self.downsample
+        nx, ny = array.shape
+        return reduce(array.reshape(nx // f, f, ny // f, f), axis=(1, 3))
+
+    def _cell_costs(self, distance: np.ndarray, unknown: np.ndarray) -> np.ndarray:
+        """Returns the traversal cost of planning cells from their obstacle distance and unknown fraction."""
+        band = max(self.inflation_radius - self.robot_radius, 1e-9)
+        closeness = np.clip((self.inflation_radius - distance) / band, 0.0, 1.0)
+        cost = 1.0 + self.cost_scale * closeness + self.unknown_cost * unknown
+        cost[distance < self.robot_radius] = LETHAL
+        return cost
+
+    def update(self, grid, points=()):
+        """
+        Brings the cached costs up to date with the grid.
+
+        Only the cells the grid journaled as changed since the last update are
+        read (see OccupancyGrid.changes_since); the whole grid is diffed when the
+        journal does not reach back far enough or the threshold is not 0.
+
+        Args:
+            grid: The OccupancyGrid.
+            points: (x, y) points that must be covered, e.g. the start and goal of a plan.
+
+        Returns:
+            Flat indices of the planning cells whose cost changed, or None if all
+            costs were rebuilt (the layout changed, so earlier indices are invalid).
+        """
+        resolution = grid.resolution
+        cells = [(math.floor(x / resolution), math.floor(y / resolution)) for x, y in points]
+        with self._lock:
+            with grid._lock:
+                (ox, oy), (nx, ny) = grid.origin_cell, grid.log_odds.shape
+                if nx:
+                    cells += [(ox, oy), (ox + nx - 1, oy + ny - 1)]
+                if not cells:
+                    return []
+                low = (min(c[0] for c in cells), min(c[1] for c in cells))
+                high = (max(c[0] for c in cells) + 1, max(c[1] for c in cells) + 1)
+                key = ((ox, oy), (nx, ny), resolution)
+                if key != self._grid_key or not self._covers(low, high):
+                    self._layout(low, high, key)
+                changes = None
+                if self._occupied.size and self.occupied_threshold == 0.0:
+                    changes = grid._changes_since(self._revision)
+                if changes is None:
+                    log_odds = grid.log_odds.copy()
+                self._revision = grid.revision
+
+            fx, fy = self._fine_origin
+            if changes is None:
+                occupied = np.zeros(self._fine_shape, dtype=bool)
+                unknown = np.ones(self._fine_shape, dtype=bool)
+                occupied[ox - fx:ox - fx + nx, oy - fy:oy - fy + ny] = log_odds > self.occupied_threshold
+                unknown[ox - fx:ox - fx + nx, oy - fy:oy - fy + ny] = log_odds == 0
+                if self._occupied.shape != occupied.shape:
+                    self._rebuild(occupied, unknown)
+                    return None
+                ix, iy = np.nonzero((occupied != self._occupied) | (unknown != self._unknown))
+                was_occupied, now_occupied = self._occupied[ix, iy], occupied[ix, iy]
+                self._occupied = occupied
+                self._unknown = unknown
+            else:
+                ix, iy, state = changes[0] - fx, changes[1] - fy, changes[2]
+                changed = (self._occupied[ix, iy] != (state > 0)) | (self._unknown[ix, iy] != (state == 0))
+                ix, iy, state = ix[changed], iy[changed], state[changed]
+                was_occupied, now_occupied = self._occupied[ix, iy], state > 0
+                self._occupied[ix, iy] = now_occupied
+                self._unknown[ix, iy] = state == 0
+            if len(ix) == 0:
+                return []
+            self.partial_updates += 1
+            return self._update_tiles(ix, iy, was_occupied, now_occupied)
+
+    def _update_tiles(self, ix: np.ndarray, iy: np.ndarray, was_occupied: np.ndarray,
+                      now_occupied: np.ndarray) -> list:
+        """
+        Recomputes the costs around changed grid cells, one window per tile of
+        changes, so distant changes do not merge into one large window. Caller
+        must hold the lock. Returns the flat indices of planning cells whose cost changed.
+        """
+        tile = self.TILE_SIZE
+        tiles, inverse = np.unique(np.column_stack((ix // tile, iy // tile)), axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        if len(tiles) > self.MAX_TILES:
+            # Changes all over the map: one window is cheaper than many
+            return self._update_window(int(ix.min()), int(ix.max()) + 1, int(iy.min()), int(iy.max()) + 1)
+        changed = []
+        for t in range(len(tiles)):
+            in_tile = inverse == t
+            box = (int(ix[in_tile].min()), int(ix[in_tile].max()) + 1, int(iy[in_tile].min()), int(iy[in_tile].max()) + 1)
+            added = in_tile & now_occupied & ~was_occupied
+            if np.any(in_tile & was_occupied & ~now_occupied):
+                changed += self._update_window(*box)
+            elif np.any(added):
+                changed += self._update_window(*box, added=(ix[added], iy[added]))
+            else:
+                # Only cells that became known: distances are unchanged
+                changed += self._update_window(*box, distances=False)
+        return changed
+
+    def _covers(self, low: tuple, high: tuple) -> bool:
+        """True if the grid cell range [low, high) lies inside the current layout."""
+        fx, fy = self._fine_origin
+        sx, sy = self._fine_shape
+        return fx <= low[0] and fy <= low[1] and high[0] <= fx + sx and high[1] <= fy + sy
+
+    def _layout(self, low: tuple, high: tuple, key):
+        """Places the planning cells over the grid cell range [low, high) plus the margin. Caller must hold the lock."""
+        f = self.downsample
+        pad = self.margin * f
+        # Planning cells are aligned to multiples of downsample in grid cell indices
+        first_x, first_y = (low[0] - pad) // f, (low[1] - pad) // f
+        last_x, last_y = -(-(high[0] + pad) // f), -(-(high[1] + pad) // f)
+        self.origin_cell = (first_x, first_y)
+        self.resolution = key[2] * f
+        self._fine_origin = (first_x * f, first_y * f)
+        self._fine_shape = ((last_x - first_x) * f, (last_y - first_y) * f)
+        self._grid_key = key
+        self._occupied = np.zeros((0, 0), dtype=bool)
+
+    def _rebuild(self, occupied: np.ndarray, unknown: np.ndarray):
+        """Recomputes every cell. Caller must hold the lock."""
+        self._occupied = occupied
+        self._unknown = unknown
+        self._fine_distance = chamfer_distance(occupied, self.resolution / self.downsample, self.inflation_radius)
+        self.distance = self._pool(self._fine_distance, np.min)
+        self.shape = self.distance.shape
+        self.width = self.shape[1] + 2
+        padded = np.full((self.shape[0] + 2, self.width), LETHAL)
+        padded[1:-1, 1:-1] = self._cell_costs(self.distance, self._pool(unknown, np.mean))
+        self.costs = padded.ravel().tolist()
+        self.rebuilds += 1
+
+    def _update_window(self, x0: int, x1: int, y0: int, y1: int, added: tuple = None, distances: bool = True) -> list:
+        """
+        Recomputes the cells within inflation_radius of a box of changed grid cells.
+        Caller must hold the lock.
+
+        Args:
+            x0, x1, y0, y1: The box of changed grid cells, end exclusive.
+            added: (ix, iy) of the new obstacles, if obstacles were only added in the box.
+                Distances then only shrink to the octile distance to the new cells,
+                which is what the chamfer transform computes, without a full transform.
+            distances: False if no obstacle changed, so only the unknown cost is updated.
+
+        Returns:
+            The flat indices of planning cells whose cost changed.
+        """
+        f = self.downsample
+        fine_resolution = self.resolution / f
+        reach = int(math.ceil(self.inflation_radius / fine_resolution)) + 1 if distances else 0
+        nx, ny = self._occupied.shape
+        # Grid cells affected by the change (whole planning cells), and the sources their distances can come from
+        ax0, ay0 = max(x0 - reach, 0) // f * f, max(y0 - reach, 0) // f * f
+        ax1, ay1 = min(-(-(x1 + reach) // f) * f, nx), min(-(-(y1 + reach) // f) * f, ny)
+        if added is not None:
+            dx = np.abs(np.arange(ax0, ax1)[:, None, None] - added[0][None, None, :])
+            dy = np.abs(np.arange(ay0, ay1)[None, :, None] - added[1][None, None, :])
+            octile = fine_resolution * (np.maximum(dx, dy) + (SQRT2 - 1.0) * np.minimum(dx, dy))
+            np.minimum(self._fine_distance[ax0:ax1, ay0:ay1], octile.min(axis=2),
+                       out=self._fine_distance[ax0:ax1, ay0:ay1])
+        elif distances:
+            sx0, sx1, sy0, sy1 = max(ax0 - reach, 0), min(ax1 + reach, nx), max(ay0 - reach, 0), min(ay1 + reach, ny)
+            distance = chamfer_distance(self._occupied[sx0:sx1, sy0:sy1], fine_resolution, self.inflation_radius)
+            self._fine_distance[ax0:ax1, ay0:ay1] = distance[ax0 - sx0:ax1 - sx0, ay0 - sy0:ay1 - sy0]
+
+        cx0, cx1, cy0, cy1 = ax0 // f, ax1 // f, ay0 // f, ay1 // f
+        pooled = self._pool(self._fine_distance[ax0:ax1, ay0:ay1], np.min)
+        self.distance[cx0:cx1, cy0:cy1] = pooled
+        cost = self._cell_costs(pooled, self._pool(self._unknown[ax0:ax1, ay0:ay1], np.mean))
+        width = self.width
+        changed = []
+        for row, ix in enumerate(range(cx0, cx1)):
+            start = (ix + 1) * width + cy0 + 1
+            new_row = cost[row].tolist()
+            old_row = self.costs[start:start + (cy1 - cy0)]
+            if new_row != old_row:
+                changed += [start + k for k, (old, new) in enumerate(zip(old_row, new_row)) if old != new]
+                self.costs[start:start + (cy1 - cy0)] = new_row
+        return changed
+
+    def world_to_index(self, x: float, y: float) -> int:
+        """Returns the flat index of the planning cell containing (x, y), or -1 outside the map."""
+        ix = math.floor(x / self.resolution) - self.origin_cell[0]
+        iy = math.floor(y / self.resolution) - self.origin_cell[1]
+        if 0 <= ix < self.shape[0] and 0 <= iy < self.shape[1]:
+            return (ix + 1) * self.width + iy + 1
+        return -1
+
+    def index_to_world(self, index: int) -> tuple:
+        """Returns the center (x, y) of the planning cell with the given flat index."""
+        ix, iy = divmod(index, self.width)
+        return ((ix - 1 + self.origin_cell[0] + 0.5) * self.resolution,
+                (iy - 1 + self.origin_cell[1] + 0.5) * self.resolution)
+
+
+class GridPlanner:
+    """
+    A* path planner on the inflated cost map of the occupancy grid.
+
+    The search runs over the flat cost list with 8-connected moves and an
+    octile-distance heuristic (admissible, as every cell costs at least 1;
+    it is weighted by default to expand fewer cells). All
+    per-cell search state (g value, parent, closed flag) lives in lists that
+    are allocated once per map size and validated by a generation stamp, and
+    the open-list heap is reused, so a new search costs nothing to set up.
+
+    The resulting cell path is reduced to a few waypoints: a straight shortcut
+    is only taken if it costs no more than the stretch of path it replaces, so
+    it never leads the robot closer to obstacles than the A* path did. Each
+    waypoint becomes one TURN and one MOVE leg for the motion controller.
+    """
+
+    incremental = False  # See IncrementalPlanner
+
+    def __init__(self, occupancy_grid, cost_map: CostMap = None, heuristic_weight: float = 1.5,
+                 shortcut_lookahead: int = 3):
+        """
+        Args:
+            occupancy_grid: The OccupancyGrid built from the ToF scans.
+            cost_map: The inflated cost map; a default CostMap if None.
+            heuristic_weight: Multiplier of the octile heuristic. 1.0 gives
+                optimal paths; larger values expand fewer cells and return paths
+                at most that factor (in practice about 1%) costlier.
+            shortcut_lookahead: Corners tried past the first one that cannot be
+                reached in a straight line, when simplifying the path.
+        """
+        self.occupancy_grid = occupancy_grid
+        self.cost_map = cost_map or CostMap()
+        self.heuristic_weight = heuristic_weight
+        self.shortcut_lookahead = shortcut_lookahead
+        self.logger = logging.getLogger(__name__)
+
+        self._size = 0
+        self._g = []
+        self._parent = []
+        self._seen = []  # Generation in which g/parent were last written
+        self._closed = []  # Generation in which the cell was expanded
+        self._generation = 0
+        self._open = []
+        self._lock = threading.Lock()
+        self.last_expansions = 0
+        self.last_duration = 0.0
+
+    def _ensure_buffers(self, size: int):
+        """(Re)allocates the per-cell search state for a map of the given size."""
+        if size != self._size:
+            self._g = [0.0] * size
+            self._parent = [-1] * size
+            self._seen = [0] * size
+            self._closed = [0] * size
+            self._generation = 0
+            self._size = size
+
+    def plan(self, start_x: float, start_y: float, goal_x: float, goal_y: float) -> list:
+        """
+        Plans a path between two points in map units.
+
+        Returns:
+            The simplified waypoints [(x, y), ...] from start (excluded) to the
+            goal (the exact goal point), or None if the goal is unreachable.
+        """
+        started = time.perf_counter()
+        with self._lock:
+            cost_map = self.cost_map
+            cost_map.update(self.occupancy_grid, ((start_x, start_y), (goal_x, goal_y)))
+            with cost_map._lock:
+                start, goal = self._endpoints(cost_map, start_x, start_y, goal_x, goal_y)
+                if goal < 0:
+                    return None
+                # A robot standing inside the inflation band must be able to drive out of it.
+                escape = self._escape_cells(cost_map, start)
+                for cell in escape:
+                    cost_map.costs[cell] = 1.0 + cost_map.cost_scale
+                try:
+                    cells = self._search(cost_map.costs, cost_map.width, start, goal)
+                    waypoints = None if cells is None else self._simplify(cost_map, cells)
+                finally:
+                    for cell, cost in escape.items():
+                        cost_map.costs[cell] = cost
+            self.last_duration = time.perf_counter() - started
+        if waypoints is None:
+            self.logger.warning("⚠️ No path to (%.1f, %.1f) found (%d cells expanded).",
+                                goal_x, goal_y, self.last_expansions)
+            return None
+        waypoints[-1] = (goal_x, goal_y)
+        self.logger.debug("🧭 Planned %d waypoints in %.1f ms (%d cells expanded).",
+                          len(waypoints), self.last_duration * 1e3, self.last_expansions)
+        return waypoints
+
+    def _endpoints(self, cost_map: CostMap, start_x: float, start_y: float, goal_x: float, goal_y: float) -> tuple:
+        """Returns the (start, goal) cells of a plan; goal is -1 (with a warning) if the goal cannot be planned to."""
+        start = cost_map.world_to_index(start_x, start_y)
+        goal = cost_map.world_to_index(goal_x, goal_y)
+        if start < 0 or goal < 0:
+            self.logger.warning("⚠️ Target (%.1f, %.1f) is outside the planning area.", goal_x, goal_y)
+            return start, -1
+        if cost_map.costs[goal] == LETHAL:
+            self.logger.warning("⚠️ Target (%.1f, %.1f) is too close to an obstacle.", goal_x, goal_y)
+            return start, -1
+        return start, goal
+
+    @staticmethod
+    def _neighbors(width: int) -> tuple:
+        """(offset, length) of the 8 neighbors of a cell in the flat layout."""
+        return ((1, 1.0), (-1, 1.0), (width, 1.0), (-width, 1.0),
+                (width + 1, SQRT2), (width - 1, SQRT2), (-width + 1, SQRT2), (-width - 1, SQRT2))
+
+    def _search(self, costs: list, width: int, start: int, goal: int) -> list:
+        """A* from start to goal over the flat cost list. Returns the cell path or None."""
+        self._ensure_buffers(len(costs))
+        self._generation += 1
+        generation = self._generation
+        g, parent, seen, closed = self._g, self._parent, self._seen, self._closed
+        open_list = self._open
+        open_list.clear()
+        push, pop = heapq.heappush, heapq.heappop
+
+        gx, gy = divmod(goal, width)
+        # A slightly inflated heuristic breaks ties towards the goal
+        weight = self.heuristic_weight * (1.0 + 1e-3)
+        diagonal = SQRT2 - 2.0
+        neighbors = self._neighbors(width)
+
+        g[start] = 0.0
+        parent[start] = -1
+        seen[start] = generation
+        push(open_list, (0.0, start))
+        expansions = 0
+        found = False
+        while open_list:
+            _, node = pop(open_list)
+            if closed[node] == generation:
+                continue
+            closed[node] = generation
+            expansions += 1
+            if node == goal:
+                found = True
+                break
+            g_node = g[node]
+            for offset, length in neighbors:
+                neighbor = node + offset
+                cost = costs[neighbor]
+                if cost == LETHAL or closed[neighbor] == generation:
+                    continue
+                g_new = g_node + length * cost
+                if seen[neighbor] != generation or g_new < g[neighbor]:
+                    seen[neighbor] = generation
+                    g[neighbor] = g_new
+                    parent[neighbor] = node
+                    nx, ny = divmod(neighbor, width)
+                    dx = abs(nx - gx)
+                    dy = abs(ny - gy)
+                    h = dx + dy + diagonal * (dx if dx < dy else dy)
+                    push(open_list, (g_new + weight * h, neighbor))
+        self.last_expansions = expansions
+        if not found:
+            return None
+        path = [goal]
+        while path[-1] != start:
+            path.append(parent[path[-1]])
+        path.reverse()
+        return path
+
+    @staticmethod
+    def _escape_cells(cost_map: CostMap, start: int) -> dict:
+        """Returns the lethal cells without obstacles within robot_radius of start, with their costs."""
+        reach = int(math.ceil(cost_map.robot_radius / cost_map.resolution))
+        width = cost_map.width
+        sx, sy = divmod(start, width)
+        costs, distance = cost_map.costs, cost_map.distance
+        nx, ny = distance.shape
+        escape = {}
+        for ix in range(max(sx - reach, 1), min(sx + reach, nx) + 1):
+            for iy in range(max(sy - reach, 1), min(sy + reach, ny) + 1):
+                cell = ix * width + iy
+                if costs[cell] == LETHAL and distance[ix - 1, iy - 1] > 0:
+                    escape[cell] = costs[cell]
+        return escape
+
+    def _simplify(self, cost_map: CostMap, cells: list) -> list:
+        """
+        Reduces a cell path to waypoints: from each waypoint, skips ahead to the
+        farthest corner of the path that a straight segment reaches at no more
+        cost than the part of the path it replaces.
+        """
+        width = cost_map.width
+        costs = cost_map.costs
+        cells = np.asarray(cells)
+        ix, iy = np.divmod(cells, width)
+        # Cost of the path from its start to every cell
+        steps = np.where((np.diff(ix) != 0) & (np.diff(iy) != 0), SQRT2, 1.0)
+        path_g = np.concatenate(([0.0], np.cumsum(steps * np.array([costs[cell] for cell in cells[1:].tolist()]))))
+        # Only cells where the direction changes can be useful waypoints
+        direction = (np.diff(ix) + 1) * 3 + np.diff(iy)
+        corners = np.flatnonzero(np.diff(direction)) + 1
+        candidates = np.concatenate(([0], corners, [len(cells) - 1])).tolist()
+
+        waypoints = []
+        anchor = 0
+        k = 1
+        while anchor < len(cells) - 1:
+            best = candidates[k]
+            misses = 0
+            for j in candidates[k + 1:]:
+                if self._segment_cost(costs, width, ix[anchor], iy[anchor], ix[j], iy[j]) \
+                        <= path_g[j] - path_g[anchor] + 1e-9:
+                    best = j
+                    misses = 0
+                else:
+                    misses += 1
+                    if misses > self.shortcut_lookahead:
+                        break
+            waypoints.append(cost_map.index_to_world(int(cells[best])))
+            anchor = best
+            k = candidates.index(best) + 1
+        return waypoints
+
+    @staticmethod
+    def _segment_cost(costs: list, width: int, x0: int, y0: int, x1: int, y1: int) -> float:
+        """Traversal cost of the straight segment between two cells (LETHAL if it touches an obstacle)."""
+        steps = 2 * max(abs(x1 - x0), abs(y1 - y0))
+        t = (np.arange(steps) + 0.5) / steps
+        xs = np.floor(x0 + 0.5 + t * (x1 - x0)).astype(np.int64)
+        ys = np.floor(y0 + 0.5 + t * (y1 - y0)).astype(np.int64)
+        total = sum(costs[cell] for cell in (xs * width + ys).tolist())
+        return total * math.hypot(x1 - x0, y1 - y0) / steps
+
+    @staticmethod
+    def to_legs(start_x: float, start_y: float, waypoints: list) -> list:
+        """
+        Converts waypoints into motion legs [("TURN", heading_deg), ("MOVE", distance), ...].
+        Headings are plot-frame degrees (counter-clockwise); consecutive collinear
+        waypoints need no TURN in between.
+        """
+        legs = []
+        x, y = start_x, start_y
+        heading = None
+        for wx, wy in waypoints:
+            distance = math.hypot(wx - x, wy - y)
+            if distance < 1e-9:
+                continue
+            new_heading = math.degrees(math.atan2(wy - y, wx - x))
+            if heading is None or abs(math.remainder(new_heading - heading, 360.0)) > 1e-6:
+                legs.append(("TURN", new_heading))
+            legs.append(("MOVE", distance))
+            heading = new_heading
+            x, y = wx, wy
+        return legs
+
+
+class IncrementalPlanner(GridPlanner):
+    """
+    D* Lite variant of GridPlanner that repairs its path while the map changes.
+
+    The search runs backwards from the goal, so g[cell] is the cost from a cell
+    to the goal and stays valid when the robot moves (only the heuristic offset
+    km grows). replan() takes the planning cells whose cost changed since the
+    last call (from CostMap.update, which in turn only reads the grid cells the
+    scans changed), updates the cells next to them and re-expands only the part
+    of the search their costs affect. Without cost changes and while the robot
+    stays in the same planning cell it returns the previous path without
+    searching at all, so replanning on every scan keeps the CPU load flat.
+    """
+
+    incremental = True
+
+    def __init__(self, occupancy_grid, cost_map: CostMap = None, shortcut_lookahead: int = 3):
+        """
+        Args:
+            occupancy_grid: The OccupancyGrid built from the ToF scans.
+            cost_map: The inflated cost map; a default CostMap if None.
+            shortcut_lookahead: Corners tried past the first one that cannot be
+                reached in a straight line, when simplifying the path.
+        """
+        # D* Lite needs a consistent heuristic, so it is not weighted
+        super().__init__(occupancy_grid, cost_map, heuristic_weight=1.0, shortcut_lookahead=shortcut_lookahead)
+        self.goal = None  # (x, y) of the current goal, None without one
+        self.waypoints = None  # The most recent path (see plan/replan)
+        self._rhs = []
+        self._queued = []  # Key under which each cell is in the open list, None if it is not
+        self._km = 0.0
+        self._start = -1
+        self._goal = -1
+        self._width = 0
+        self._escape = {}  # Cells around the start made passable, with their true costs
+        self.repairs = 0
+        self.last_changed_cells = 0
+
+    def plan(self, start_x: float, start_y: float, goal_x: float, goal_y: float) -> list:
+        """
+        Plans a path to a new goal from scratch; later replan() calls repair it.
+
+        Returns:
+            The simplified waypoints [(x, y), ...] from start (excluded) to the
+            goal (the exact goal point), or None if the goal is unreachable.
+        """
+        with self._lock:
+            self.goal = (goal_x, goal_y)
+            self._start = -1  # Forces a new search
+            return self._replan(start_x, start_y)
+
+    def replan(self, x: float, y: float) -> list:
+        """
+        Brings the path to the current goal up to date with the map, from the
+        robot position (x, y).
+
+        Returns:
+            The simplified waypoints from (x, y), or None if there is no goal or
+            the goal became unreachable.
+        """
+        with self._lock:
+            if self.goal is None:
+                return None
+            return self._replan(x, y)
+
+    def clear(self):
+        """Forgets the goal and the search state."""
+        with self._lock:
+            self._restore_escape()
+            self.goal = None
+            self.waypoints = None
+            self._start = -1
+
+    def _restore_escape(self):
+        """Gives the cells made passable around the start their true cost back."""
+        with self.cost_map._lock:
+            costs = self.cost_map.costs
+            for cell, cost in self._escape.items():
+                costs[cell] = cost
+        self._escape = {}
+
+    def _replan(self, x: float, y: float) -> list:
+        """plan()/replan() with the lock held."""
+        started = time.perf_counter()
+        cost_map = self.cost_map
+        goal_x, goal_y = self.goal
+        escape = self._escape
+        self._restore_escape()
+        changed = cost_map.update(self.occupancy_grid, ((x, y), self.goal))
+        with cost_map._lock:
+            costs, width = cost_map.costs, cost_map.width
+            start, goal = self._endpoints(cost_map, x, y, goal_x, goal_y)
+            if goal < 0:
+                self.waypoints = None
+                return None
+            self._escape = self._escape_cells(cost_map, start)
+            for cell in self._escape:
+                costs[cell] = 1.0 + cost_map.cost_scale
+
+            if changed is None or self._start < 0 or goal != self._goal or width != self._width:
+                self._initialize(costs, width, start, goal)
+            else:
+                # Cells whose cost changed, including cells that stopped or started being escape cells
+                changed = set(changed).union(escape.keys() ^ self._escape.keys())
+                if not changed and start == self._start and self.waypoints is not None:
+                    return self.waypoints
+                self._km += self._heuristic(self._start, start)
+                self._start = start
+                self._apply_changes(costs, changed)
+            self.last_changed_cells = len(changed or ())
+
+            expansions = self._compute_shortest_path(costs)
+            cells = self._extract_path(costs)
+            waypoints = None if cells is None else self._simplify(cost_map, cells)
+        self.repairs += 1
+        self.last_expansions = expansions
+        self.last_duration = time.perf_counter() - started
+        if waypoints is None:
+            self.logger.warning("⚠️ No path to (%.1f, %.1f) found (%d cells expanded).", goal_x, goal_y, expansions)
+        else:
+            waypoints[-1] = (goal_x, goal_y)
+            self.logger.debug("🧭 Repaired path: %d waypoints in %.1f ms (%d cells changed, %d expanded).",
+                              len(waypoints), self.last_duration * 1e3, self.last_changed_cells, expansions)
+        self.waypoints = waypoints
+        return waypoints
+
+    def _heuristic(self, a: int, b: int) -> float:
+        """Octile distance between two cells, in cells."""
+        ax, ay = divmod(a, self._width)
+        bx, by = divmod(b, self._width)
+        dx, dy = abs(ax - bx), abs(ay - by)
+        return dx + dy + (SQRT2 - 2.0) * (dx if dx < dy else dy)
+
+    def _key(self, cell: int) -> tuple:
+        g_rhs = min(self._g[cell], self._rhs[cell])
+        # Cells along one optimal path have the same first key; rounding it keeps
+        # float noise in the summed costs from breaking those ties the wrong way
+        return round(g_rhs + self._heuristic(self._start, cell) + self._km, 6), g_rhs
+
+    def _update_vertex(self, cell: int):
+        """Queues the cell if it is inconsistent (g != rhs), otherwise drops it from the open list."""
+        if self._g[cell] != self._rhs[cell]:
+            key = self._key(cell)
+            self._queued[cell] = key
+            heapq.heappush(self._open, (key[0], key[1], cell))
+        else:
+            self._queued[cell] = None
+
+    def _best_successor(self, costs: list, cell: int) -> tuple:
+        """Returns (cost to goal via the best neighbor, that neighbor) of a cell."""
+        g = self._g
+        best, best_cell = LETHAL, -1
+        for offset, length in self._neighbor_offsets:
+            neighbor = cell + offset
+            value = length * costs[neighbor] + g[neighbor]
+            if value < best:
+                best, best_cell = value, neighbor
+        return best, best_cell
+
+    def _initialize(self, costs: list, width: int, start: int, goal: int):
+        """Starts a new backward search from the goal."""
+        size = len(costs)
+        self._width = width
+        self._neighbor_offsets = self._neighbors(width)
+        self._g = [LETHAL] * size
+        self._rhs = [LETHAL] * size
+        self._queued = [None] * size
+        self._open.clear()
+        self._km = 0.0
+        self._start = start
+        self._goal = goal
+        self._rhs[goal] = 0.0
+        self._update_vertex(goal)
+
+    def _apply_changes(self, costs: list, changed: set):
+        """Updates the cells whose outgoing edge costs changed: the neighbors of cells whose cost changed."""
+        g, rhs, queued = self._g, self._rhs, self._queued
+        start, goal = self._start, self._goal
+        affected = set(changed)
+        for cell in changed:
+            affected.update(cell + offset for offset, _ in self._neighbor_offsets)
+        for cell in affected:
+            if cell == goal:
+                continue
+            if costs[cell] == LETHAL and cell != start:
+                # Never entered; also covers the lethal border, whose neighbors are out of range
+                g[cell] = rhs[cell] = LETHAL
+                queued[cell] = None
+                continue
+            rhs[cell] = self._best_successor(costs, cell)[0]
+            self._update_vertex(cell)
+        if start != goal and start not in affected:
+            rhs[start] = self._best_successor(costs, start)[0]
+            self._update_vertex(start)
+
+    def _compute_shortest_path(self, costs: list) -> int:
+        """Expands inconsistent cells until the start is consistent. Returns the number of expansions."""
+        g, rhs, queued, open_list = self._g, self._rhs, self._queued, self._open
+        neighbors = self._neighbor_offsets
+        start, goal = self._start, self._goal
+        pop = heapq.heappop
+        expansions = 0
+        while open_list:
+            k1, k2, cell = open_list[0]
+            if queued[cell] != (k1, k2):
+                pop(open_list)  # Stale entry of a cell that was re-queued or became consistent
+                continue
+            if (k1, k2) >= self._key(start) and rhs[start] <= g[start]:
+                break
+            pop(open_list)
+            expansions += 1
+            key = self._key(cell)
+            if (k1, k2) < key:
+                queued[cell] = key
+                heapq.heappush(open_list, (key[0], key[1], cell))
+            elif g[cell] > rhs[cell]:
+                # Overconsistent: the cost to goal dropped, pass it on to the neighbors
+                g[cell] = rhs[cell]
+                queued[cell] = None
+                g_cell = g[cell]
+                cost = costs[cell]
+                for offset, length in neighbors:
+                    neighbor = cell + offset
+                    if neighbor == goal or (costs[neighbor] == LETHAL and neighbor != start):
+                        continue
+                    value = length * cost + g_cell
+                    if value < rhs[neighbor]:
+                        rhs[neighbor] = value
+                        self._update_vertex(neighbor)
+            else:
+                # Underconsistent: the cost to goal rose, neighbors that relied on it look for another way
+                g_old = g[cell]
+                g[cell] = LETHAL
+                cost = costs[cell]
+                for offset, length in neighbors + ((0, 0.0),):
+                    neighbor = cell + offset
+                    if neighbor == goal or (costs[neighbor] == LETHAL and neighbor != start):
+                        continue
+                    if neighbor == cell or rhs[neighbor] == length * cost + g_old:
+                        rhs[neighbor] = self._best_successor(costs, neighbor)[0]
+                    self._update_vertex(neighbor)
+        return expansions
+
+    def _extract_path(self, costs: list) -> list:
+        """Follows the best successors from the start to the goal. Returns the cell path or None."""
+        cell, goal = self._start, self._goal
+        path = [cell]
+        while cell != goal:
+            value, cell = self._best_successor(costs, cell)
+            if value == LETHAL or len(path) > len(costs):
+                return None
+            path.append(cell)
+        return path
@@ -0,0 +1,164 @@
+import threading
+import numpy as np
+
+
+class SpatialHashPointMap:
+    """
+    Downsampled ToF endpoint cloud backed by a spatial hash.
+
+    Points are quantized to (x, y) cells of cell_size map units. Each occupied cell
+    stores one representative point (the running mean of the points that fell into
+    it) and a hit count, so re-observing a wall only bumps counts. Storage therefore
+    grows with the mapped area and not with session length.
+
+    The per-cell data lives in contiguous NumPy arrays (slot order = insertion order,
+    until remove_points() deletes a cell), which the plot can read directly through
+    arrays(). Slots are never moved or reused in storage that arrays() handed out.
+    """
+
+    def __init__(self, cell_size: float = 1.0, initial_capacity: int = 4096):
+        self.cell_size = cell_size
+        self._slots = {}  # Packed cell key -> slot index in the arrays below
+        self._keys = np.empty(initial_capacity, dtype=np.int64)
+        self._x = np.empty(initial_capacity, dtype=np.float64)
+        self._y = np.empty(initial_capacity, dtype=np.float64)
+        self._counts = np.zeros(initial_capacity, dtype=np.int64)
+        self._size = 0
+        self.total_hits = 0
+        self._shared = False  # arrays() handed out views of the current storage
+        self._lock = threading.Lock()
+
+    def cell_keys(self, xs, ys) -> np.ndarray:
+        """Returns the packed int64 cell keys of the given points."""
+        ix = np.floor(np.asarray(xs) / self.cell_size).astype(np.int64)
+        iy = np.floor(np.asarray(ys) / self.cell_size).astype(np.int64)
+        return (ix << 32) | (iy & 0xFFFFFFFF)
+
+    def _reallocate(self, capacity: int):
+        """Moves the slot arrays to new storage of the given capacity. Caller must hold the lock."""
+        for name in ("_keys", "_x", "_y", "_counts"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+        self._shared = False
+
+    def _grow(self, min_capacity: int):
+        """Reallocates the slot arrays to at least min_capacity. Caller must hold the lock."""
+        self._reallocate(max(min_capacity, 2 * len(self._keys)))
+
+    def add_points(self, xs, ys) -> int:
+        """
+        Inserts a batch of points.
+
+        Returns:
+            The number of new cells created by this batch.
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        if xs.size == 0:
+            return 0
+
+        # Merge duplicates within the batch first, then resolve each distinct cell once.
+        keys, inverse, batch_counts = np.unique(self.cell_keys(xs, ys), return_inverse=True, return_counts=True)
+        sum_x = np.bincount(inverse, weights=xs, minlength=len(keys))
+        sum_y = np.bincount(inverse, weights=ys, minlength=len(keys))
+
+        with self._lock:
+            slots = np.empty(len(keys), dtype=np.int64)
+            new_cells = 0
+            for i, key in enumerate(keys.tolist()):
+                slot = self._slots.get(key)
+                if slot is None:
+                    slot = self._size + new_cells
+                    self._slots[key] = slot
+                    new_cells += 1
+                slots[i] = slot
+
+            if new_cells:
+                if self._size + new_cells > len(self._keys):
+                    self._grow(self._size + new_cells)
+                fresh = slots >= self._size
+                self._keys[slots[fresh]] = keys[fresh]
+                self._x[slots[fresh]] = 0.0
+                self._y[slots[fresh]] = 0.0
+                self._counts[slots[fresh]] = 0
+                self._size += new_cells
+
+            # Incremental mean: mean += (batch_sum - batch_count * mean) / new_count
+            counts = self._counts[slots] + batch_counts
+            self._x[slots] += (sum_x - batch_counts * self._x[slots]) / counts
+            self._y[slots] += (sum_y - batch_counts * self._y[slots]) / counts
+            self._counts[slots] = counts
+            self.total_hits += len(xs)
+        return new_cells
+
+    def remove_points(self, xs, ys) -> int:
+        """
+        Takes back a batch of points that was inserted earlier, e.g. to re-project a
+        scan from a corrected pose. Cell means are rolled back; a cell whose count
+        drops to zero is deleted by moving the last slot into its place.
+
+        Returns:
+            The number of cells deleted by this batch.
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        if xs.size == 0:
+            return 0
+
+        keys, inverse, batch_counts = np.unique(self.cell_keys(xs, ys), return_inverse=True, return_counts=True)
+        sum_x = np.bincount(inverse, weights=xs, minlength=len(keys))
+        sum_y = np.bincount(inverse, weights=ys, minlength=len(keys))
+
+        with self._lock:
+            slots = np.array([self._slots.get(key, -1) for key in keys.tolist()], dtype=np.int64)
+            known = slots >= 0
+            slots, batch_counts = slots[known], batch_counts[known]
+            sum_x, sum_y = sum_x[known], sum_y[known]
+            previous = self._counts[slots]
+            counts = previous - batch_counts
+            alive = counts > 0
+            if self._shared and not alive.all():
+                # Deleting moves slots around; views from arrays() keep the old storage
+                self._reallocate(len(self._keys))
+            # Inverse of the incremental mean: mean -= (batch_sum - batch_count * mean) / remaining
+            live = slots[alive]
+            self._x[live] -= (sum_x[alive] - batch_counts[alive] * self._x[live]) / counts[alive]
+            self._y[live] -= (sum_y[alive] - batch_counts[alive] * self._y[live]) / counts[alive]
+            self._counts[slots] = np.maximum(counts, 0)
+            self.total_hits -= int(np.minimum(batch_counts, previous).sum())
+
+            # Delete emptied cells from the highest slot down, so moved slots stay valid.
+            for slot in np.sort(slots[~alive])[::-1].tolist():
+                last = self._size - 1
+                del self._slots[int(self._keys[slot])]
+                if slot != last:
+                    for name in ("_keys", "_x", "_y", "_counts"):
+                        array = getattr(self, name)
+                        array[slot] = array[last]
+                    self._slots[int(self._keys[slot])] = slot
+                self._size = last
+        return int((~alive).sum())
+
+    def arrays(self) -> tuple:
+        """
+        Returns (x, y, hit_counts) of all occupied cells as contiguous array views.
+        The views are not copies: later inserts refine the means and counts of the
+        cells they show, but a slot in them never changes to a different cell.
+        """
+        with self._lock:
+            n = self._size
+            self._shared = True
+            return self._x[:n], self._y[:n], self._counts[:n]
+
+    def clear(self):
+        with self._lock:
+            self._slots.clear()
+            self._size = 0
+            self.total_hits = 0
+            if self._shared:
+                self._reallocate(len(self._keys))
+
+    def __len__(self):
+        return self._size
@@ -0,0 +1,216 @@
+import math
+import time
+import numpy as np
+from odometry import OdometryEngine
+
+# State vector indices: position (cm), heading (rad, counter-clockwise) and the
+# travelled path length that the distance odometer (RB[1]) measures.
+X, Y, THETA, S = range(4)
+
+
+class PoseEKF(OdometryEngine):
+    """
+    Extended Kalman filter over the robot pose, run once per telemetry sample.
+
+    The wheel encoders drive the prediction (differential-drive motion model with
+    slip noise proportional to the wheel travel). The gyro yaw then corrects the
+    heading and the distance odometer corrects the travelled path length, which
+    through the state covariance also pulls the position. Both corrections are
+    scalar, so an update needs no matrix inversion and stays in the tens of
+    microseconds.
+
+    Filtered poses are kept in the same history as OdometryEngine, so pose_at()
+    and path() return the filtered estimate. snapshot() additionally returns the
+    covariance. Samples without encoder values predict from the odometer step
+    along the gyro heading change instead.
+    """
+
+    def __init__(self, capacity: int = 10000, wheel_base: float = 15.0, ticks_per_cm: float = 20.0,
+                 slip_std: float = 0.05, gyro_std_deg: float = 1.0, odometer_std: float = 1.0):
+        """
+        Args:
+            capacity: Number of poses kept in the history.
+            wheel_base: Distance between the wheel contact points in cm (map units).
+            ticks_per_cm: Encoder ticks per cm of wheel travel.
+            slip_std: Wheel travel noise in cm per sqrt(cm) travelled.
+            gyro_std_deg: Standard deviation of the reported yaw (it is an integer in degrees).
+            odometer_std: Standard deviation of the distance odometer in cm.
+        """
+        self.wheel_base = wheel_base
+        self.ticks_per_cm = ticks_per_cm
+        self.slip_var = slip_std ** 2
+        self.gyro_var = math.radians(gyro_std_deg) ** 2
+        self.odometer_var = odometer_std ** 2
+        # Preallocated Jacobians, only the pose-dependent entries change per sample
+        self._F = np.eye(4)
+        self._G = np.zeros((4, 2))
+        self._G[S] = 0.5
+        self._G[THETA] = (-1.0 / wheel_base, 1.0 / wheel_base)
+        super().__init__(capacity)
+
+    def reset(self, timestamp: float = None):
+        """Clears the history and puts the robot back at the origin with zero uncertainty."""
+        self._mean = np.zeros(4)
+        self._P = np.zeros((4, 4))
+        self._prev_ticks = None  # (left, right) encoder counts of the previous sample
+        self._prev_gyro = None  # Last raw gyro heading in rad
+        self._gyro_offset = 0.0  # Heading of the estimate frame minus gyro heading, see correct_pose
+        super().reset(timestamp)
+
+    def update(self, gyro_angle_deg: float, distance: float, timestamp: float = None,
+               left_ticks: float = None, right_ticks: float = None):
+        """
+        Runs one predict/correct cycle for a telemetry sample.
+
+        Args:
+            gyro_angle_deg: Robot yaw as reported by the mobile base (RB[0]).
+            distance: Total travelled distance odometer (RB[1]).
+            timestamp: Sample time in seconds, defaults to time.monotonic().
+            left_ticks: Left wheel encoder count (RB[5]).
+            right_ticks: Right wheel encoder count (RB[6]).
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        distance = float(distance)
+        # Mobile base yaw is clockwise positive, plot heading is counter-clockwise.
+        gyro = math.radians(-gyro_angle_deg)
+        encoders = left_ticks is not None and right_ticks is not None
+
+        with self._lock:
+            mean = self._mean
+            if self._prev_gyro is None:
+                # The first sample only initializes the baselines; the start pose is exact.
+                mean[THETA] = gyro
+                mean[S] = distance
+            elif encoders and self._prev_ticks is not None:
+                d_left = (float(left_ticks) - self._prev_ticks[0]) / self.ticks_per_cm
+                d_right = (float(right_ticks) - self._prev_ticks[1]) / self.ticks_per_cm
+                self._predict(d_left, d_right)
+                self._correct(THETA, math.remainder(gyro + self._gyro_offset - mean[THETA], math.tau),
+                              self.gyro_var)
+                self._correct(S, distance - mean[S], self.odometer_var)
+            else:
+                # No encoder step: the odometer increment along the gyro heading change
+                step = distance - self._prev_distance
+                d_theta = math.remainder(gyro - self._prev_gyro, math.tau)
+                half_track = d_theta * self.wheel_base / 2
+                self._predict(step - half_track, step + half_track)
+                self._correct(THETA, math.remainder(gyro + self._gyro_offset - mean[THETA], math.tau),
+                              self.gyro_var)
+
+            self._prev_gyro = gyro
+            self._prev_distance = distance
+            self._prev_ticks = (float(left_ticks), float(right_ticks)) if encoders else None
+            self._x_pos, self._y_pos, self._theta_rad = float(mean[X]), float(mean[Y]), float(mean[THETA])
+            self.sample_count += 1
+            self._append(timestamp)
+
+    def update_batch(self, values: np.ndarray, timestamps):
+        """
+        Filters a batch of telemetry samples in order.
+
+        Args:
+            values: Robot samples of shape (n, 7) in RB order.
+            timestamps: Sample times, a scalar or an array of length n.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        timestamps = np.broadcast_to(np.asarray(timestamps, dtype=np.float64), (len(values),))
+        encoders = values.shape[1] >= 7
+        for row, t in zip(values.tolist(), timestamps.tolist()):
+            if encoders:
+                self.update(row[0], row[1], t, row[5], row[6])
+            else:
+                self.update(row[0], row[1], t)
+
+    def _predict(self, d_left: float, d_right: float):
+        """Propagates mean and covariance by one wheel step. Caller must hold the lock."""
+        x, y, theta, path_length = self._mean.tolist()
+        step = (d_left + d_right) / 2
+        d_theta = (d_right - d_left) / self.wheel_base
+        mid = theta + d_theta / 2
+        c, s = math.cos(mid), math.sin(mid)
+        self._mean[:] = (x + step * c, y + step * s, theta + d_theta, path_length + step)
+
+        F = self._F
+        F[X, THETA] = -step * s
+        F[Y, THETA] = step * c
+        G = self._G
+        k = step / (2 * self.wheel_base)
+        G[X] = (0.5 * c + k * s, 0.5 * c - k * s)
+        G[Y] = (0.5 * s - k * c, 0.5 * s + k * c)
+        # Wheel slip grows with the travel of each wheel
+        q = self.slip_var * np.array((abs(d_left), abs(d_right)))
+        self._P = F @ self._P @ F.T + np.dot(G * q, G.T)
+
+    def _correct(self, index: int, innovation: float, variance: float):
+        """Applies a scalar measurement of one state component. Caller must hold the lock."""
+        P = self._P
+        column = P[:, index]
+        gain = column / (column[index] + variance)
+        self._mean += gain * innovation
+        P -= gain[:, None] * P[index]
+
+    def correct_pose(self, x: float, y: float, theta: float, position_var: float, heading_var: float):
+        """
+        Applies an absolute pose measurement, e.g. from scan matching. The corrected
+        pose is used from the next sample on; the history is not rewritten.
+        The gyro is re-referenced by the applied heading change, so later yaw
+        readings do not pull the heading back.
+
+        Args:
+            x, y: Measured position in map units.
+            theta: Measured heading in rad (counter-clockwise).
+            position_var: Variance of x and y.
+            heading_var: Variance of theta.
+        """
+        with self._lock:
+            mean = self._mean
+            # A pose fix says nothing about the travelled path length: decouple it, so
+            # neither this correction nor the next odometer reading drags the other.
+            self._P[S, :S] = 0.0
+            self._P[:S, S] = 0.0
+            # The position corrections also move the heading through the covariance,
+            # so the offset covers the heading change of all three corrections
+            heading = float(mean[THETA])
+            self._correct(X, x - mean[X], position_var)
+            self._correct(Y, y - mean[Y], position_var)
+            self._correct(THETA, math.remainder(theta - mean[THETA], math.tau), heading_var)
+            mean[THETA] = math.remainder(mean[THETA], math.tau)
+            self._gyro_offset = math.remainder(self._gyro_offset + mean[THETA] - heading, math.tau)
+            self._x_pos, self._y_pos, self._theta_rad = float(mean[X]), float(mean[Y]), float(mean[THETA])
+
+    def set_pose(self, x: float, y: float, theta: float):
+        """
+        Moves the estimate to a pose, e.g. one optimized by the pose graph. Unlike
+        correct_pose() the pose is applied exactly, however small the covariance
+        already is; the covariance is kept. The gyro is re-referenced by the heading
+        change as in correct_pose().
+
+        Args:
+            x, y: New position in map units.
+            theta: New heading in rad (counter-clockwise).
+        """
+        with self._lock:
+            mean = self._mean
+            d_theta = math.remainder(theta - mean[THETA], math.tau)
+            mean[X], mean[Y] = x, y
+            mean[THETA] = math.remainder(theta, math.tau)
+            self._gyro_offset = math.remainder(self._gyro_offset + d_theta, math.tau)
+            self._x_pos, self._y_pos, self._theta_rad = float(mean[X]), float(mean[Y]), float(mean[THETA])
+
+    def robot_yaw_deg(self, yaw_deg: float) -> float:
+        """
+        Converts a yaw (clockwise degrees) in the frame of this estimate to the yaw the
+        mobile base reports, which differs once correct_pose() or set_pose() re-referenced the gyro.
+        """
+        return yaw_deg + math.degrees(self._gyro_offset)
+
+    def snapshot(self) -> tuple:
+        """
+        Returns a consistent copy of the current estimate as
+        (x, y, theta_rad, timestamp, covariance), where covariance is the 3x3
+        matrix of (x, y, theta).
+        """
+        with self._lock:
+            return (self._x_pos, self._y_pos, self._theta_rad, float(self.history.latest()[0]),
+                    self._P[:3, :3].copy())
@@ -0,0 +1,600 @@
+import logging
+import math
+import threading
+import time
+import numpy as np
+
+from point_map import SpatialHashPointMap
+from scan_matcher import GridNeighborIndex, icp
+
+
+class _RowBuffer:
+    """
+    Growable 2D array with amortized O(1) appends. The rows live in one contiguous
+    NumPy array; data is a view of the filled part.
+    """
+
+    def __init__(self, width: int, dtype=np.float64, capacity: int = 256):
+        self._array = np.zeros((capacity, width), dtype=dtype)
+        self._size = 0
+
+    def append(self, row) -> int:
+        """Appends one row and returns its index."""
+        if self._size == len(self._array):
+            grown = np.zeros((2 * len(self._array), self._array.shape[1]), dtype=self._array.dtype)
+            grown[:self._size] = self._array[:self._size]
+            self._array = grown
+        self._array[self._size] = row
+        self._size += 1
+        return self._size - 1
+
+    @property
+    def data(self) -> np.ndarray:
+        return self._array[:self._size]
+
+    def __len__(self):
+        return self._size
+
+
+def _wrap(angles):
+    """Wraps angles (rad) to [-pi, pi)."""
+    return (np.asarray(angles) + np.pi) % (2 * np.pi) - np.pi
+
+
+def compose(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Returns the poses a (+) b for (n, 3) arrays of (x, y, theta): b expressed in the frame of a."""
+    c, s = np.cos(a[..., 2]), np.sin(a[..., 2])
+    return np.stack((a[..., 0] + c * b[..., 0] - s * b[..., 1],
+                     a[..., 1] + s * b[..., 0] + c * b[..., 1],
+                     a[..., 2] + b[..., 2]), axis=-1)
+
+
+def between(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Returns the relative poses a^-1 (+) b, i.e. b in the frame of a."""
+    c, s = np.cos(a[..., 2]), np.sin(a[..., 2])
+    dx, dy = b[..., 0] - a[..., 0], b[..., 1] - a[..., 1]
+    return np.stack((c * dx + s * dy, -s * dx + c * dy, _wrap(b[..., 2] - a[..., 2])), axis=-1)
+
+
+def _edge_linearization(poses: np.ndarray, i: np.ndarray, j: np.ndarray, z: np.ndarray) -> tuple:
+    """
+    Evaluates the residuals e = z^-1 (+) (x_i^-1 (+) x_j) of all edges and their
+    Jacobians A = de/dx_i and B = de/dx_j, each of shape (E, 3, 3).
+    """
+    xi, xj = poses[i], poses[j]
+    c, s = np.cos(xi[:, 2]), np.sin(xi[:, 2])
+    cz, sz = np.cos(z[:, 2]), np.sin(z[:, 2])
+    dx, dy = xj[:, 0] - xi[:, 0], xj[:, 1] - xi[:, 1]
+    # Relative translation in the frame of x_i, then the residual in the frame of z
+    rx, ry = c * dx + s * dy, -s * dx + c * dy
+    ux, uy = rx - z[:, 0], ry - z[:, 1]
+    residual = np.stack((cz * ux + sz * uy, -sz * ux + cz * uy, _wrap(xj[:, 2] - xi[:, 2] - z[:, 2])), axis=-1)
+
+    # R_z^T R_i^T, and R_z^T times the derivative of R_i^T (x_j - x_i) by theta_i
+    m00, m01 = cz * c - sz * s, cz * s + sz * c
+    m10, m11 = -sz * c - cz * s, -sz * s + cz * c
+    drx, dry = ry, -rx
+    B = np.zeros((len(i), 3, 3))
+    B[:, 0, 0], B[:, 0, 1], B[:, 1, 0], B[:, 1, 1], B[:, 2, 2] = m00, m01, m10, m11, 1.0
+    A = -B
+    A[:, 0, 2] = cz * drx + sz * dry
+    A[:, 1, 2] = -sz * drx + cz * dry
+    return residual, A, B
+
+
+def _scatter_add(n: int, i: np.ndarray, values_i: np.ndarray, j: np.ndarray, values_j: np.ndarray) -> np.ndarray:
+    """Sums per-edge (E, 3) rows into (n, 3) per-node rows at nodes i and j."""
+    out = np.empty((n, 3))
+    for k in range(3):
+        out[:, k] = (np.bincount(i, weights=values_i[:, k], minlength=n)
+                     + np.bincount(j, weights=values_j[:, k], minlength=n))
+    return out
+
+
+def _chain_edges(n: int, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """Returns, for every node k < n - 1, the index of an edge (k, k + 1)."""
+    candidates = np.flatnonzero(j == i + 1)
+    nodes, first = np.unique(i[candidates], return_index=True)
+    if len(nodes) != n - 1:
+        raise ValueError("The pose graph must link every pair of consecutive nodes (odometry edges).")
+    return candidates[first]
+
+
+def _chain_solver(A: np.ndarray, B: np.ndarray, information: np.ndarray):
+    """
+    Returns a function solving H_c v = r exactly, where H_c is the Hessian of the
+    odometry chain alone (edge k links nodes k and k + 1, node 0 is fixed).
+
+    H_c = L^T Omega L with L block-bidiagonal. Every B_k is a rotation plus an
+    identity heading row and A_k = -B_k plus a heading column, so both triangular
+    solves reduce to cumulative sums and need no loop over the nodes.
+    """
+    rotation = B[:, :2, :2]
+    # b_k = B_k^-1 (A_k + B_k) e_theta, the heading column in the frame of node k + 1
+    b = np.einsum("eba,eb->ea", rotation, A[:, :2, 2])
+    covariance = np.linalg.inv(information)
+
+    def solve(r):
+        # L^T u = r from the last node backwards, in terms of w_k = B_k^T u_k
+        w = np.empty((len(b), 3))
+        w[:, :2] = np.cumsum(r[:0:-1, :2], axis=0)[::-1]
+        heading = r[1:, 2].copy()
+        heading[:-1] -= np.einsum("ea,ea->e", b[1:], w[1:, :2])
+        w[:, 2] = np.cumsum(heading[::-1])[::-1]
+        u = w.copy()
+        u[:, :2] = np.einsum("eab,eb->ea", rotation, w[:, :2])
+        s = np.einsum("eab,eb->ea", covariance, u)
+        # L v = s from node 0 forwards
+        v = np.zeros((len(b) + 1, 3))
+        v[1:, 2] = np.cumsum(s[:, 2])
+        steps = np.einsum("eba,eb->ea", rotation, s[:, :2]) - b * v[:-1, 2:3]
+        v[1:, :2] = np.cumsum(steps, axis=0)
+        return v
+
+    return solve
+
+
+def optimize_pose_graph(poses: np.ndarray, i: np.ndarray, j: np.ndarray, z: np.ndarray, information: np.ndarray,
+                        max_iterations: int = 10, tolerance: float = 1e-3,
+                        cg_iterations: int = 100, cg_tolerance: float = 1e-10) -> tuple:
+    """
+    Sparse Gauss-Newton over a 2D pose graph. Node 0 is held in place.
+
+    Each iteration solves the normal equations H dx = -g with preconditioned
+    conjugate gradients. H is never assembled: its product with a vector is
+    evaluated edge by edge (J^T Omega J v), so memory and time per CG step are
+    linear in the number of edges. The preconditioner solves the odometry chain
+    exactly (_chain_solver), so CG only has to resolve the loop edges and needs
+    a few iterations per loop closure rather than per node. The solve starts
+    from the given poses, so after a new constraint only a few Gauss-Newton
+    iterations are needed.
+
+    Args:
+        poses: (K, 3) initial poses (x, y, theta).
+        i, j: Node indices of each edge. Every pair (k, k + 1) must be linked.
+        z: (E, 3) measured relative poses x_i^-1 (+) x_j.
+        information: (E, 3, 3) information matrices of the measurements.
+        max_iterations: Gauss-Newton iteration limit.
+        tolerance: Stop once no pose moves by more than this (map units / rad).
+        cg_iterations: Conjugate gradient iteration limit per Gauss-Newton step.
+        cg_tolerance: Relative squared residual at which conjugate gradients stop.
+
+    Returns:
+        The optimized (K, 3) poses and a dict with the Gauss-Newton and CG
+        iterations run and the initial and final weighted squared error.
+    """
+    poses = np.array(poses, dtype=np.float64)
+    n = len(poses)
+    i, j = np.asarray(i), np.asarray(j)
+    stats = {"iterations": 0, "cg_iterations": 0, "initial_error": None, "final_error": None}
+    if n < 2 or len(i) == 0:
+        return poses, stats
+    chain = _chain_edges(n, i, j)
+
+    for iteration in range(1, max_iterations + 1):
+        residual, A, B = _edge_linearization(poses, i, j, z)
+        weighted = np.einsum("eab,eb->ea", information, residual)
+        error = float(np.einsum("ea,ea->", residual, weighted))
+        if stats["initial_error"] is None:
+            stats["initial_error"] = error
+        stats["iterations"] = iteration
+
+        At = A.transpose(0, 2, 1)
+        Bt = B.transpose(0, 2, 1)
+        OA = information @ A
+        OB = information @ B
+        precondition = _chain_solver(A[chain], B[chain], information[chain])
+
+        def hessian_product(v):
+            w = np.einsum("eab,eb->ea", OA, v[i]) + np.einsum("eab,eb->ea", OB, v[j])
+            out = _scatter_add(n, i, np.einsum("eab,eb->ea", At, w), j, np.einsum("eab,eb->ea", Bt, w))
+            out[0] = 0.0
+            return out
+
+        # Conjugate gradients on H dx = -g with node 0 pinned to zero
+        rhs = -_scatter_add(n, i, np.einsum("eab,eb->ea", At, weighted), j, np.einsum("eab,eb->ea", Bt, weighted))
+        rhs[0] = 0.0
+        step = np.zeros((n, 3))
+        r = rhs
+        p = precondition(r)
+        rz = float(np.vdot(r, p))
+        threshold = cg_tolerance * max(float(np.vdot(rhs, rhs)), 1e-30)
+        for _ in range(cg_iterations):
+            stats["cg_iterations"] += 1
+            Hp = hessian_product(p)
+            curvature = float(np.vdot(p, Hp))
+            if curvature <= 0:
+                break
+            alpha = rz / curvature
+            step += alpha * p
+            r = r - alpha * Hp
+            if float(np.vdot(r, r)) <= threshold:
+                break
+            zr = precondition(r)
+            rz, rz_old = float(np.vdot(r, zr)), rz
+            p = zr + (rz / rz_old) * p
+
+        poses += step
+        poses[:, 2] = _wrap(poses[:, 2])
+        if np.abs(step).max() < tolerance:
+            break
+
+    residual, _, _ = _edge_linearization(poses, i, j, z)
+    stats["final_error"] = float(np.einsum("ea,eab,eb->", residual, information, residual))
+    return poses, stats
+
+
+class PoseGraph:
+    """
+    Pose-graph back end: keyframes, loop closures and map re-projection.
+
+    Every projected scan is stored with the keyframe it belongs to: a new keyframe
+    starts whenever the robot moved or turned far enough from the last one. Scans
+    are kept as compact arrays (the pose they were projected from plus the raw
+    ToF ranges), so the exact map contribution of any keyframe can be taken back
+    and re-projected when its pose changes. Consecutive keyframes are linked by
+    odometry edges.
+
+    Each closed keyframe is looked up in a spatial hash over keyframe positions.
+    Nearby keyframes that are old enough are loop-closure candidates; their scans
+    are matched with ICP, and an accepted match adds a loop edge. The graph is
+    then optimized (optimize_pose_graph, warm-started from the current poses),
+    the filtered pose is moved along with the newest keyframe, and only the
+    keyframes whose pose changed are re-projected into the point map and the
+    occupancy grid (their old contribution is removed, the new one added).
+    Occupancy removal is exact unless a cell hit its log-odds clamp.
+    """
+
+    def __init__(self, pose_estimator, point_map: SpatialHashPointMap, occupancy_grid, relative_angles,
+                 keyframe_distance: float = 20.0, keyframe_angle_deg: float = 20.0,
+                 odometry_std: tuple = (0.3, 0.03, math.radians(0.25), 0.02),
+                 loop_radius: float = 40.0, loop_min_gap: int = 15, loop_interval: int = 5, loop_neighbors: int = 2,
+                 loop_correspondence: float = 15.0, loop_max_rms: float = 3.0, loop_min_matches: int = 40,
+                 loop_max_shift: float = 30.0, loop_max_rotation_deg: float = 5.0,
+                 loop_std: tuple = (2.0, math.radians(1.0)), reproject_distance: float = 0.5,
+                 reproject_angle_deg: float = 0.2):
+        """
+        Args:
+            pose_estimator: The PoseEKF providing poses and receiving corrections.
+            point_map: The endpoint map that affected keyframes are re-projected into.
+            occupancy_grid: The OccupancyGrid that affected keyframes are re-projected into.
+            relative_angles: ToF beam angles relative to the robot heading in rad.
+            keyframe_distance: Travel in map units that starts a new keyframe.
+            keyframe_angle_deg: Rotation that starts a new keyframe.
+            odometry_std: Odometry edge uncertainty as (position floor, position per
+                unit travelled, heading floor in rad, heading per rad turned).
+            loop_radius: Maximum distance between a keyframe and a loop candidate.
+            loop_min_gap: Minimum number of keyframes between a loop candidate and
+                the keyframe being closed, so recent neighbours are not "loops".
+            loop_interval: Minimum number of keyframes between two loop closures;
+                every closure adds a constraint, a few per pass are enough.
+            loop_neighbors: Keyframes on either side that are matched along with a
+                keyframe, so the matched submaps contain enough structure.
+            loop_correspondence: Pairing distance of the coarse ICP pass.
+            loop_max_rms: Maximum RMS residual of an accepted loop match.
+            loop_min_matches: Minimum number of paired points of an accepted loop match.
+            loop_max_shift: Largest accepted loop correction in map units.
+            loop_max_rotation_deg: Largest accepted loop correction in degrees; the gyro
+                keeps heading drift small, so larger rotations are false matches.
+            loop_std: Loop edge uncertainty as (position, heading in rad).
+            reproject_distance: Position change above which a keyframe is re-projected
+                after an optimization.
+            reproject_angle_deg: Heading change above which a keyframe is re-projected.
+        """
+        self.pose_estimator = pose_estimator
+        self.point_map = point_map
+        self.occupancy_grid = occupancy_grid
+        self.relative_angles = np.asarray(relative_angles, dtype=np.float64)
+        self.keyframe_distance = keyframe_distance
+        self.keyframe_angle = math.radians(keyframe_angle_deg)
+        self.odometry_std = odometry_std
+        self.loop_radius = loop_radius
+        self.loop_min_gap = loop_min_gap
+        self.loop_interval = loop_interval
+        self.loop_neighbors = loop_neighbors
+        self.loop_correspondence = loop_correspondence
+        self.loop_max_rms = loop_max_rms
+        self.loop_min_matches = loop_min_matches
+        self.loop_max_shift = loop_max_shift
+        self.loop_max_rotation = math.radians(loop_max_rotation_deg)
+        self.loop_information = np.diag((loop_std[0] ** -2, loop_std[0] ** -2, loop_std[1] ** -2))
+        self.reproject_distance = reproject_distance
+        self.reproject_angle = math.radians(reproject_angle_deg)
+        self.logger = logging.getLogger(__name__)
+
+        beams = len(self.relative_angles)
+        self._keyframes = _RowBuffer(3)  # Keyframe poses (x, y, theta)
+        self._keyframe_first_scan = _RowBuffer(1, dtype=np.int64)  # Index of the first scan of each keyframe
+        self._scan_poses = _RowBuffer(3)  # World pose each scan is currently projected from
+        self._scan_ranges = _RowBuffer(beams)  # Raw ranges in map units, as projected
+        self._edges = _RowBuffer(2, dtype=np.int64)  # (i, j) node indices
+        self._edge_measurements = _RowBuffer(3)  # Relative pose x_i^-1 (+) x_j
+        self._edge_information = _RowBuffer(9)  # Row-major 3x3 information matrices
+        self._cells = {}  # Keyframe position cell -> keyframe indices (spatial index)
+        self._pending = []  # Closed keyframes waiting for loop detection
+        self._last_loop = -loop_interval  # Keyframe of the most recent loop closure
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+        self.loop_closures = 0
+        self.loops_rejected = 0
+        self.optimizations = 0
+        self.last_reprojected = 0
+        self.last_duration = 0.0
+
+    def _cell(self, x: float, y: float) -> tuple:
+        return math.floor(x / self.loop_radius), math.floor(y / self.loop_radius)
+
+    def add_scan(self, x: float, y: float, theta: float, ranges):
+        """
+        Stores a scan that was just projected into the maps from pose (x, y, theta).
+        Called from the processing thread; starts a keyframe when due.
+
+        Args:
+            x, y, theta: The pose the scan was projected from.
+            ranges: All beam ranges in map units as passed to the maps (negative = invalid).
+        """
+        pose = np.array((x, y, theta))
+        with self._lock:
+            count = len(self._keyframes)
+            if count:
+                last = self._keyframes.data[count - 1]
+                relative = between(last, pose)
+                distance = math.hypot(relative[0], relative[1])
+            if not count or distance >= self.keyframe_distance or abs(relative[2]) >= self.keyframe_angle:
+                index = self._keyframes.append(pose)
+                self._keyframe_first_scan.append(len(self._scan_poses))
+                self._cells.setdefault(self._cell(x, y), []).append(index)
+                if count:
+                    self._add_odometry_edge(index - 1, index, relative, distance)
+                    self._pending.append(index - 1)
+                    self._wakeup.set()
+            self._scan_poses.append(pose)
+            self._scan_ranges.append(ranges)
+
+    def _add_odometry_edge(self, i: int, j: int, relative: np.ndarray, distance: float):
+        """Links consecutive keyframes by their odometry motion. Caller must hold the lock."""
+        position_floor, position_rate, heading_floor, heading_rate = self.odometry_std
+        position_var = (position_floor + position_rate * distance) ** 2
+        heading_var = (heading_floor + heading_rate * abs(relative[2])) ** 2
+        self._add_edge(i, j, relative, np.diag((1 / position_var, 1 / position_var, 1 / heading_var)))
+
+    def _add_edge(self, i: int, j: int, measurement, information: np.ndarray):
+        self._edges.append((i, j))
+        self._edge_measurements.append(measurement)
+        self._edge_information.append(information.ravel())
+
+    def _scan_range(self, keyframe: int) -> tuple:
+        """Returns the slice bounds of a keyframe's scans. Caller must hold the lock."""
+        first = self._keyframe_first_scan.data[:, 0]
+        stop = first[keyframe + 1] if keyframe + 1 < len(first) else len(self._scan_poses)
+        return int(first[keyframe]), int(stop)
+
+    def _scan_indices(self, keyframes) -> tuple:
+        """
+        Returns the indices of all scans of the given keyframes and, for each scan,
+        the position of its keyframe in `keyframes`. Caller must hold the lock.
+        """
+        bounds = [self._scan_range(keyframe) for keyframe in keyframes]
+        lengths = np.array([stop - start for start, stop in bounds], dtype=np.int64)
+        if not lengths.sum():
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        indices = np.concatenate([np.arange(start, stop) for start, stop in bounds])
+        return indices, np.repeat(np.arange(len(bounds)), lengths)
+
+    def _endpoints(self, scan_poses: np.ndarray, ranges: np.ndarray) -> np.ndarray:
+        """Returns the (n, 2) world endpoints of the valid beams of the given scans."""
+        angles = scan_poses[:, 2:3] + self.relative_angles
+        valid = ranges >= 0
+        xs = scan_poses[:, 0:1] + ranges * np.cos(angles)
+        ys = scan_poses[:, 1:2] + ranges * np.sin(angles)
+        return np.column_stack((xs[valid], ys[valid]))
+
+    def _submap(self, keyframe: int) -> np.ndarray:
+        """Returns the world points of a keyframe and its neighbours. Caller must hold the lock."""
+        count = len(self._keyframes)
+        keyframes = range(max(0, keyframe - self.loop_neighbors), min(count, keyframe + self.loop_neighbors + 1))
+        scans, _ = self._scan_indices(keyframes)
+        return self._endpoints(self._scan_poses.data[scans], self._scan_ranges.data[scans])
+
+    def step(self) -> bool:
+        """
+        Runs loop detection for the keyframes closed since the last call and, if a
+        loop was closed, optimizes the graph and re-projects the affected keyframes.
+        Can be called directly instead of start() for synchronous processing.
+
+        Returns:
+            True if the graph was optimized.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        closed = 0
+        for keyframe in pending:
+            if self._close_loop(keyframe):
+                closed += 1
+        if closed:
+            self.optimize()
+        return bool(closed)
+
+    def _loop_candidates(self, keyframe: int) -> list:
+        """Returns old keyframes within loop_radius, nearest first. Caller must hold the lock."""
+        poses = self._keyframes.data
+        x, y, _ = poses[keyframe]
+        cx, cy = self._cell(x, y)
+        candidates = [index for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                      for index in self._cells.get((cx + dx, cy + dy), ())
+                      if index <= keyframe - self.loop_min_gap]
+        if not candidates:
+            return []
+        candidates = np.array(candidates)
+        distances = np.hypot(poses[candidates, 0] - x, poses[candidates, 1] - y)
+        order = np.argsort(distances)
+        return candidates[order][distances[order] <= self.loop_radius].tolist()
+
+    def _close_loop(self, keyframe: int) -> bool:
+        """Matches a closed keyframe against its best loop candidate and adds a loop edge."""
+        if keyframe - self._last_loop < self.loop_interval:
+            return False
+        with self._lock:
+            candidates = self._loop_candidates(keyframe)
+            if not candidates:
+                return False
+            candidate = candidates[0]
+            source = self._submap(keyframe)
+            target = self._submap(candidate)
+            keyframe_pose = self._keyframes.data[keyframe].copy()
+            candidate_pose = self._keyframes.data[candidate].copy()
+        if len(source) < self.loop_min_matches or len(target) < self.loop_min_matches:
+            return False
+
+        # Coarse point-to-point pass on a sparser copy of the target to pull in the
+        # drift, then point-to-line refinement on the full-resolution target
+        coarse_map = SpatialHashPointMap(cell_size=self.loop_correspondence / 3)
+        coarse_map.add_points(target[:, 0], target[:, 1])
+        coarse = icp(source, GridNeighborIndex(coarse_map, self.loop_correspondence), self.loop_correspondence,
+                     30, self.loop_min_matches, method="point_to_point")
+        if coarse["theta"] is None:
+            self.loops_rejected += 1
+            return False
+        rotation = np.array(((math.cos(coarse["theta"]), -math.sin(coarse["theta"])),
+                             (math.sin(coarse["theta"]), math.cos(coarse["theta"]))))
+        moved = source @ rotation.T + (coarse["tx"], coarse["ty"])
+        reference = SpatialHashPointMap(cell_size=2.0)
+        reference.add_points(target[:, 0], target[:, 1])
+        fine = icp(moved, GridNeighborIndex(reference, 6.0), 6.0, 20, self.loop_min_matches)
+        if fine["theta"] is None or fine["rms"] > self.loop_max_rms:
+            self.loops_rejected += 1
+            self.logger.debug("🔁 Loop %d -> %d rejected: %s", keyframe, candidate, fine)
+            return False
+
+        # Total world-frame correction of the keyframe's submap, applied to its pose
+        correction = compose(np.array((fine["tx"], fine["ty"], fine["theta"])),
+                             np.array((coarse["tx"], coarse["ty"], coarse["theta"])))
+        if (math.hypot(correction[0], correction[1]) > self.loop_max_shift
+                or abs(correction[2]) > self.loop_max_rotation):
+            self.loops_rejected += 1
+            self.logger.debug("🔁 Loop %d -> %d rejected, correction too large: %s", keyframe, candidate, correction)
+            return False
+        corrected = compose(correction, keyframe_pose)
+        measurement = between(candidate_pose, corrected)
+        with self._lock:
+            self._add_edge(candidate, keyframe, measurement, self.loop_information)
+        self.loop_closures += 1
+        self._last_loop = keyframe
+        self.logger.info("🔁 Loop closed: keyframe %d -> %d (correction %.1f cm, %.1f°, rms %.2f)",
+                         keyframe, candidate, math.hypot(correction[0], correction[1]),
+                         math.degrees(correction[2]), fine["rms"])
+        return True
+
+    def optimize(self) -> dict:
+        """
+        Optimizes all keyframe poses, moves the filtered pose along with the newest
+        keyframe and re-projects the keyframes whose pose changed.
+
+        Returns:
+            The optimizer statistics with the number of re-projected keyframes.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            count = len(self._keyframes)
+            initial = self._keyframes.data.copy()
+            edges = self._edges.data.copy()
+            measurements = self._edge_measurements.data.copy()
+            information = self._edge_information.data.reshape(-1, 3, 3).copy()
+        optimized, stats = optimize_pose_graph(initial, edges[:, 0], edges[:, 1], measurements, information)
+
+        with self._lock:
+            current = self._keyframes.data.copy()
+            updated = current.copy()
+            updated[:count] = optimized
+            # Keyframes added during the solve move rigidly with the last optimized one.
+            updated[count:] = compose(optimized[count - 1], between(current[count - 1], current[count:]))
+            change = between(current, updated)
+            moved = np.flatnonzero((np.hypot(change[:, 0], change[:, 1]) > self.reproject_distance)
+                                   | (np.abs(change[:, 2]) > self.reproject_angle))
+            self._keyframes.data[:] = updated
+            self._cells.clear()
+            for index, (x, y, _) in enumerate(updated.tolist()):
+                self._cells.setdefault(self._cell(x, y), []).append(index)
+            self._move_live_pose(current[-1], updated[-1])
+            # Scans keep their pose relative to their keyframe
+            scans, owner = self._scan_indices(moved)
+            old_poses = self._scan_poses.data[scans]
+            new_poses = compose(updated[moved][owner], between(current[moved][owner], old_poses))
+            self._scan_poses.data[scans] = new_poses
+            ranges = self._scan_ranges.data[scans]
+        self._reproject(old_poses, new_poses, ranges)
+
+        self.optimizations += 1
+        self.last_reprojected = len(moved)
+        self.last_duration = time.perf_counter() - start
+        stats["reprojected"] = len(moved)
+        self.logger.info("🗺️ Pose graph optimized: %d keyframes, %d edges, %d re-projected in %.0f ms",
+                         len(optimized), len(edges), len(moved), self.last_duration * 1e3)
+        return stats
+
+    def _move_live_pose(self, before: np.ndarray, after: np.ndarray):
+        """
+        Applies the rigid motion of the newest keyframe to the filtered pose, so new
+        scans line up with the optimized map. Caller must hold the lock.
+        """
+        x, y, theta, _ = self.pose_estimator.latest_pose()
+        corrected = compose(after, between(before, np.array((x, y, theta))))
+        self.pose_estimator.set_pose(float(corrected[0]), float(corrected[1]), float(corrected[2]))
+
+    def _reproject(self, old_poses: np.ndarray, new_poses: np.ndarray, ranges: np.ndarray):
+        """Replaces the map contribution of scans at their old poses by the one at their new poses."""
+        old_points = self._endpoints(old_poses, ranges)
+        new_points = self._endpoints(new_poses, ranges)
+        self.point_map.remove_points(old_points[:, 0], old_points[:, 1])
+        self.point_map.add_points(new_points[:, 0], new_points[:, 1])
+        grid = self.occupancy_grid
+        grid.integrate_scans(old_poses[:, 0], old_poses[:, 1], old_poses[:, 2:3] + self.relative_angles, ranges,
+                             weight=-1.0)
+        grid.integrate_scans(new_poses[:, 0], new_poses[:, 1], new_poses[:, 2:3] + self.relative_angles, ranges)
+
+    def keyframe_poses(self) -> np.ndarray:
+        """Returns a copy of the (K, 3) keyframe poses."""
+        with self._lock:
+            return self._keyframes.data.copy()
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="PoseGraph", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _run(self):
+        while self._running:
+            if not self._wakeup.wait(timeout=0.5):
+                continue
+            self._wakeup.clear()
+            if not self._running:
+                break
+            try:
+                self.step()
+            except Exception as e:
+                self.logger.error(f"❌ Pose graph update failed: {e}", exc_info=True)
+
+    def stats(self) -> dict:
+        """Returns graph sizes, loop closure counters and the last optimization time."""
+        with self._lock:
+            keyframes, scans, edges = len(self._keyframes), len(self._scan_poses), len(self._edges)
+        return {
+            "keyframes": keyframes,
+            "scans": scans,
+            "edges": edges,
+            "loop_closures": self.loop_closures,
+            "loops_rejected": self.loops_rejected,
+            "optimizations": self.optimizations,
+            "last_reprojected": self.last_reprojected,
+            "last_duration_s": self.last_duration,
+        }
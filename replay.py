@@ -0,0 +1,164 @@
+"""
+Deterministic replay of flight recorder logs through RobotInterface.
+
+Every recorded datagram is fed to the same parse → odometry → map pipeline as
+live telemetry, with the robot's clock set to the recorded arrival time. Each
+datagram is processed to completion before the next one, so a log always builds
+the same map, whatever the replay speed:
+
+    python replay.py flight.bin                  # as fast as possible
+    python replay.py flight.bin --speed 1        # real time
+    python replay.py logs/*.bin --save-map maps  # batch-process a day of logs
+"""
+import argparse
+import logging
+import os
+import time
+import numpy as np
+
+import logger_config
+from flight_recorder import FlightLogReader, DATAGRAM
+from robot_interface import RobotInterface
+
+logger = logging.getLogger(__name__)
+
+
+class SimulatedClock:
+    """
+    A monotonic clock that only moves when it is set. Pass it as the clock of a
+    RobotInterface to timestamp replayed data with the recorded times.
+    """
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def set(self, t: float):
+        """Moves the clock to t; it never goes backwards."""
+        if t > self.now:
+            self.now = t
+
+
+class ReplayEngine:
+    """
+    Feeds the datagrams of a flight log into a RobotInterface.
+
+    The robot is not receiving from a socket: datagrams go straight to
+    _handle_datagram and process_pending runs synchronously after each one,
+    so subscribers (e.g. a RobotPlotView) are notified as during live operation.
+    """
+
+    def __init__(self, log, robot: RobotInterface = None, speed: float = None):
+        """
+        Args:
+            log: Path of a flight log or a FlightLogReader.
+            robot: The RobotInterface to feed. Its clock is replaced by the replay clock.
+                A new, unconnected RobotInterface is created if None.
+            speed: Replay speed relative to real time (1.0 = real time, 10.0 = 10x).
+                None or 0 replays as fast as possible.
+        """
+        self.reader = log if isinstance(log, FlightLogReader) else FlightLogReader(log)
+        self.clock = SimulatedClock()
+        if robot is None:
+            # Commands are never sent during replay; the send address is a placeholder.
+            robot = RobotInterface('127.0.0.1', 0, '127.0.0.1', 12345)
+        robot.clock = self.clock
+        self.robot = robot
+        self.speed = speed or None
+        self.datagrams = 0
+        self.wall_time = 0.0
+        self.log_duration = 0.0
+        self._stopped = False
+
+    def stop(self):
+        """Stops a running replay after the current datagram."""
+        self._stopped = True
+
+    def run(self) -> dict:
+        """
+        Replays the whole log (blocking).
+
+        Returns:
+            Replay statistics, see stats().
+        """
+        robot = self.robot
+        clock = self.clock
+        speed = self.speed
+        self._stopped = False
+        first_t = None
+        wall_start = time.perf_counter()
+        for kind, t, payload in self.reader.records():
+            if kind != DATAGRAM:
+                continue
+            if first_t is None:
+                first_t = t
+                clock.now = t
+            if speed is not None:
+                # Pace against the wall clock, relative to the first datagram
+                delay = (t - first_t) / speed - (time.perf_counter() - wall_start)
+                if delay > 0:
+                    time.sleep(delay)
+            clock.set(t)
+            robot._handle_datagram(payload)
+            robot.process_pending()
+            self.datagrams += 1
+            self.log_duration = t - first_t
+            if self._stopped:
+                logger.info("⏹️ Replay stopped.")
+                break
+        self.wall_time = time.perf_counter() - wall_start
+        return self.stats()
+
+    def stats(self) -> dict:
+        """Returns the number of replayed datagrams, log and wall time and the resulting speed-up."""
+        return {
+            "datagrams": self.datagrams,
+            "log_duration_s": self.log_duration,
+            "wall_time_s": self.wall_time,
+            "speedup": self.log_duration / self.wall_time if self.wall_time > 0 else 0.0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay flight recorder logs through the mapping pipeline.")
+    parser.add_argument("logs", nargs="+", help="Flight log files, replayed one after the other.")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="Replay speed relative to real time, 0 for as fast as possible.")
+    parser.add_argument("--save-map", metavar="DIR", default=None,
+                        help="Save each resulting map as <DIR>/<log name>.npz.")
+    args = parser.parse_args()
+
+    logger_config.setup_logging(logging.INFO)
+    logger.setLevel(logging.INFO)
+    if args.save_map:
+        os.makedirs(args.save_map, exist_ok=True)
+
+    for path in args.logs:
+        engine = ReplayEngine(path, speed=args.speed)
+        stats = engine.run()
+        robot = engine.robot
+        x, y, theta, _ = robot.pose_estimator.latest_pose()
+        logger.info(
+            f"▶️ {path}: {stats['datagrams']} datagrams, {stats['log_duration_s']:.1f}s of telemetry in "
+            f"{stats['wall_time_s']:.2f}s ({stats['speedup']:.1f}x). Final pose: ({x:.1f}, {y:.1f}, "
+            f"{np.degrees(theta):.1f}°), {len(robot.end_points)} map points, "
+            f"{int(robot.occupancy_grid.occupied_mask().sum())} occupied cells."
+        )
+        if args.save_map:
+            map_x, map_y, counts = robot.end_points.arrays()
+            path_x, path_y = robot.pose_estimator.path()
+            out = os.path.join(args.save_map, os.path.splitext(os.path.basename(path))[0] + ".npz")
+            np.savez_compressed(
+                out, end_x=map_x, end_y=map_y, end_counts=counts, path_x=path_x, path_y=path_y,
+                log_odds=robot.occupancy_grid.log_odds,
+                origin_cell=np.asarray(robot.occupancy_grid.origin_cell),
+                resolution=robot.occupancy_grid.resolution,
+            )
+            logger.info(f"💾 Map saved to '{out}'.")
+        robot.close()
+
+
+if __name__ == "__main__":
+    main()
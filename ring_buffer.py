@@ -0,0 +1,110 @@
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Fixed-capacity, array-backed ring buffer of float columns.
+
+    Each column is stored in a mirrored array of twice the capacity: a row is
+    written both at slot i and at slot i + capacity. The last len(self) rows are
+    therefore always a single contiguous slice, so view() and column() return
+    zero-copy NumPy views in insertion order, also after the buffer has wrapped.
+    Appending costs O(new rows) regardless of the history length. Readers that keep
+    the arrays they are given use snapshot() instead, whose rows are never overwritten.
+
+    The buffer itself is not locked; owners serialize writers and readers.
+    """
+
+    def __init__(self, capacity: int, columns: int = 1, dtype=np.float64):
+        self.capacity = capacity
+        self.columns = columns
+        self._data = np.zeros((columns, 2 * capacity), dtype=dtype)
+        self._head = 0  # Next slot to be written, in [0, capacity)
+        self._count = 0
+        self._appended = 0  # Rows appended since the last clear()
+        self._snapshot = None  # Append-only copy of the rows handed out by snapshot()
+        self._snapshot_end = 0  # End of the rows in self._snapshot
+        self._snapshot_appended = 0  # self._appended when self._snapshot was last brought up to date
+
+    def append(self, *values):
+        """Appends one row; expects one value per column."""
+        i = self._head
+        data = self._data
+        j = i + self.capacity
+        for c, value in enumerate(values):
+            data[c, i] = value
+            data[c, j] = value
+        self._head = (i + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+        self._appended += 1
+
+    def extend(self, rows):
+        """Appends a batch of rows given as an array of shape (n, columns)."""
+        rows = np.asarray(rows, dtype=self._data.dtype).reshape(-1, self.columns)
+        self._appended += len(rows)
+        if len(rows) > self.capacity:
+            rows = rows[-self.capacity:]
+        n = len(rows)
+        if n == 0:
+            return
+        slots = (self._head + np.arange(n)) % self.capacity
+        self._data[:, slots] = rows.T
+        self._data[:, slots + self.capacity] = rows.T
+        self._head = (self._head + n) % self.capacity
+        self._count = min(self._count + n, self.capacity)
+
+    def _span(self) -> tuple:
+        """Start and end of the contiguous slice holding the rows, oldest first."""
+        end = self._head if self._head >= self._count else self._head + self.capacity
+        return end - self._count, end
+
+    def view(self) -> np.ndarray:
+        """Returns all rows as a zero-copy (columns, n) view, oldest first."""
+        start, end = self._span()
+        return self._data[:, start:end]
+
+    def column(self, c: int) -> np.ndarray:
+        """Returns a zero-copy contiguous view of one column, oldest first."""
+        start, end = self._span()
+        return self._data[c, start:end]
+
+    def snapshot(self) -> np.ndarray:
+        """
+        Returns all rows as a (columns, n) array, oldest first, that later appends never modify.
+
+        Once the buffer is full, every append overwrites the oldest row of view(). Here new
+        rows are copied to the end of a separate array of twice the capacity instead, and
+        the result is a view of its last n rows, so a call costs O(new rows). When that
+        array is full it is replaced rather than overwritten (O(capacity), once per
+        capacity rows), which leaves the arrays returned earlier intact.
+        """
+        new = self._appended - self._snapshot_appended
+        rows = self._snapshot
+        if rows is None or new > self._count or self._snapshot_end + new > rows.shape[1]:
+            rows = self._snapshot = np.empty_like(self._data)
+            rows[:, :self._count] = self.view()
+            self._snapshot_end = self._count
+        elif new:
+            end = self._snapshot_end
+            rows[:, end:end + new] = self.view()[:, self._count - new:]
+            self._snapshot_end = end + new
+        self._snapshot_appended = self._appended
+        end = self._snapshot_end
+        return rows[:, end - self._count:end]
+
+    def latest(self) -> np.ndarray:
+        """Returns the newest row as a (columns,) view."""
+        if self._count == 0:
+            raise IndexError("RingBuffer is empty")
+        i = (self._head - 1) % self.capacity
+        return self._data[:, i]
+
+    def clear(self):
+        self._head = 0
+        self._count = 0
+        self._appended = 0
+        self._snapshot = None  # Arrays handed out before keep the old rows
+
+    def __len__(self):
+        return self._count
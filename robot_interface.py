@@ -7,94 +7,121 @@ import os
 from datetime import datetime
 import time
 import numpy as np
-import pyqtgraph as pg
-from PyQt5 import QtWidgets, QtCore, QtGui
 import collections
+from odometry import DifferentialDriveOdometry
+from pose_estimator import PoseEKF
+from occupancy_grid import OccupancyGrid
+from point_map import SpatialHashPointMap
+from udp_ingest import BatchedUdpReceiver
+from command_channel import CommandChannel
+import telemetry_codec
+from telemetry_codec import TelemetryDecodeError
+from link_monitor import LinkMonitor
+from motion_controller import MotionController
+import flight_recorder
+from flight_recorder import FlightRecorder
+import latency_tracer
+from latency_tracer import LatencyTracer
+from metrics_server import MetricsServer
+from scan_matcher import ScanMatcher
+from localization import LikelihoodField, MapLocalizer
+from pose_graph import PoseGraph
+from path_planner import GridPlanner
 
 # Configure logging
 logger_config.setup_logging()
 
 
-class CustomPlotWidget(pg.PlotWidget):
-    """
-    A pg.PlotWidget subclass that handles keyboard events for robot control
-    and mouse click events for target navigation.
-    It passes key and mouse events to its associated RobotInterface instance.
-    """
-
-    def __init__(self, robot_interface, parent=None):
-        super().__init__(parent)
-        self.robot_interface = robot_interface  # Store reference to RobotInterface
-        self.setFocusPolicy(QtCore.Qt.StrongFocus)  # Essential for receiving key events
-        self.move_distance = 20  # Example value (cm), adjust as needed
-        self.turn_angle = 20  # Example value (degrees), adjust as needed
-        self.speed = 50  # Example value (unit/s), adjust as needed
-
-    def keyPressEvent(self, event: QtGui.QKeyEvent):
-        # Delegate the actual command logic to the RobotInterface
-        # Pass the event and key-specific parameters (move_distance, turn_angle, speed)
-        command_sent = self.robot_interface._handle_key_press(
-            event, self.move_distance, self.turn_angle, self.speed
-        )
-        if not command_sent:
-            super().keyPressEvent(event)
-
-    def mousePressEvent(self, event: QtGui.QMouseEvent):
-        """
-        Handles mouse press events on the plot.
-        If a left-click occurs, it attempts to move the robot to that location.
-        """
-        if event.button() == QtCore.Qt.LeftButton:
-            # Get the position of the mouse click in the plot's view coordinates
-            pos = self.plotItem.vb.mapSceneToView(event.pos())
-            target_x = pos.x()
-            target_y = pos.y()
-
-            self.robot_interface.logger.info(f"Mouse clicked at plot coordinates: X={target_x:.2f}, Y={target_y:.2f}")
-
-            # Optionally, you can prompt for an angle or use the current robot angle
-            # For simplicity, we'll set a default target angle (e.g., current robot angle or 0 degrees)
-            # A more advanced UX could involve a click and drag to set angle or two clicks.
-            current_angle = self.robot_interface.get_robot_sensor_value(0)
-            if current_angle is None:
-                self.robot_interface.logger.warning("Cannot set target via mouse: current robot angle not available for determining target orientation.")
-                # Fallback to 0 or arbitrary angle if current angle is crucial for the move logic
-                target_angle = 0.0 # Default angle
-            else:
-                target_angle = current_angle # Maintain current robot's orientation relative to target
-
-            self.robot_interface.move_to_target_by_click(target_x, target_y, target_angle, self.speed)
-            event.accept() # Indicate that the event has been handled
-        else:
-            super().mousePressEvent(event) # Pass other mouse events up the chain
-
-
 class RobotInterface:
     """
-    Manages communication with a robot via Wi-Fi and provides 2D plotting
-    of robot path and ToF sensor data.
+    Manages communication with a robot via Wi-Fi and keeps the robot state:
+    sensor values, odometry, the ToF map and the move-to-target controller.
+
+    This core has no GUI dependency. Received data is parsed on the receiving
+    thread; ToF scans are projected into the map on a separate processing thread,
+    after which subscribers (e.g. robot_view.RobotPlotView) are notified.
     """
-    def __init__(self, host_receive: str, port_receive: int, host_send: str, port_send: int):
+    def __init__(self, host_receive: str, port_receive: int, host_send: str, port_send: int,
+                 ingest_mode: str = "blocking", recv_buffer_size: int = None, clock=time.monotonic):
+        """
+        Args:
+            host_receive: Local address to bind the telemetry socket to.
+            port_receive: Local UDP port for telemetry from the ESP32.
+            host_send: ESP32 address for commands.
+            port_send: ESP32 UDP port for commands.
+            ingest_mode: "blocking" reads one datagram per recvfrom call, "batched" drains
+                every queued datagram per wakeup (see udp_ingest.BatchedUdpReceiver).
+            recv_buffer_size: Optional SO_RCVBUF size in bytes for the telemetry socket.
+            clock: Monotonic time source in seconds used to timestamp received data.
+                Replay (see replay.py) substitutes a simulated clock.
+        """
+        if ingest_mode not in ("blocking", "batched"):
+            raise ValueError(f"Unknown ingest mode: {ingest_mode}")
         self.host_receive = host_receive
         self.port_receive = port_receive
         self.host_send = host_send
         self.port_send = port_send
+        self.ingest_mode = ingest_mode
+        self.recv_buffer_size = recv_buffer_size
+        self.clock = clock
         self.udp_socket = None
+        self.udp_receiver: BatchedUdpReceiver = None
         self.receiving_thread = None
         self.running = False # Control flag for the receiving loop         
+        self.decode_errors = 0 # Datagrams that were not valid UTF-8
+        self.binary_decode_errors = 0 # Binary telemetry datagrams that could not be decoded
+        self.parse_failures = collections.Counter() # Rejected text lines by failure type
+        self.datagrams_received = 0
+        # Render statistics reported by the view (see report_frame_time)
+        self.frames_rendered = 0
+        self.frame_time_sum = 0.0
+        self.last_frame_time = 0.0
+
+        # Loss/reordering/jitter statistics for telemetry that carries a sequence header.
+        # The firmware sends a datagram every 10 ms.
+        self.link_monitor = LinkMonitor(expected_interval_ms=10.0)
 
         # Sensor data storage, initialized for consistency and numerical operations
         self.tof_sensor_values = np.zeros(8) # 8 ToF sensors, values in millimeters
         self.robot_sensor_values = np.zeros(7) # 7 general robot sensor values
 
+        # ToF frame generation tracking: every fresh MF frame bumps tof_frame_seq and
+        # each generation is projected into the map exactly once.
+        self.tof_frame_seq = 0
+        self._last_tof_payload = None # Raw MF payload of the last accepted frame
+        self._last_tof_datagram_seq = None # SQ sequence number that delivered it, None without a header
+        # The firmware re-sends its last ToF line with the datagrams (10 ms apart) that follow
+        # until the sensor produces a new one. An identical line arriving this many sequence
+        # numbers later is a new reading of an unchanged scene, e.g. a robot parked at a wall.
+        self.tof_resend_window = 10
+        self._tof_frame_time = 0.0 # Arrival time of the last accepted frame (self.clock)
+        self.stale_tof_frames = 0 # MF frames re-sent by the ESP32 without a new sensor line
+
         self.plot_history_length = 10000 # Example: Keep last 2000 points visible on plot
-        self.x_points = collections.deque([0.0], maxlen=self.plot_history_length)
-        self.y_points = collections.deque([0.0], maxlen=self.plot_history_length)
 
-        self.end_points = collections.deque(maxlen=self.plot_history_length)
-        
-        self.prev_distance = 0.0
-        self.prev_angle = 0.0
+        # Pose is integrated on every RB sample in the receive path, the plot only reads it.
+        # Wheel base and encoder resolution in map units (cm); calibrate for the actual robot.
+        self.odometry = DifferentialDriveOdometry(capacity=self.plot_history_length,
+                                                  wheel_base=15.0, ticks_per_cm=20.0)
+        # Filtered pose (gyro, odometer and encoders fused by an EKF). The map, the path
+        # plot and the move-to-target controller use this one; self.odometry keeps the
+        # raw dead-reckoning estimate for comparison.
+        self.pose_estimator = PoseEKF(capacity=self.plot_history_length, wheel_base=15.0, ticks_per_cm=20.0)
+
+        # ToF endpoint cloud, deduplicated per (x, y) cell with hit counts
+        self.end_points = SpatialHashPointMap(cell_size=1.0)
+
+        # Occupancy grid (map units, same as the plot). Grows with the explored area only.
+        self.occupancy_grid = OccupancyGrid(resolution=2.0, max_range=200.0)
+
+        # Fresh ToF frames waiting to be projected into the map: (arrival time, values)
+        self._pending_scans = collections.deque(maxlen=256)
+
+        # Processing loop: woken whenever new data was parsed
+        self._data_event = threading.Event()
+        self.processing_thread = None
+        self._subscribers = []
+        self._subscribers_lock = threading.Lock()
 
         # Relative angles for 8 ToF sensors, in radians
         # These angles are relative to the robot's forward direction.
@@ -102,56 +129,41 @@ class RobotInterface:
 
         self._data_lock = threading.Lock() # Protects shared sensor data from race conditions
         
-        self._current_move_thread: threading.Thread = None
-        self._cancel_move_flag = threading.Event() # Event to signal cancellation
-
-        
+        # Single long-lived command socket with coalescing and rate limiting
+        self.command_channel = CommandChannel(self.host_send, self.port_send)
 
         # Logging setup
         self.logger = logging.getLogger(__name__)
+        # Telemetry parse problems get their own subsystem logger, so that a flood of
+        # them can be rate limited separately (see logger_config.setup_queue_logging)
+        self.parse_logger = logging.getLogger(__name__ + ".parse")
         self.set_logging_level(logging.WARNING) # Default to warnings to minimize console output
         self.logging_enabled = False # Tracks current logging state
 
-        # PyQtGraph plotting setup
-        self.logger.info("📈 Initializing live plot window...")
-        self.plot_widget = CustomPlotWidget(self) # Pass self to CustomPlotWidget
-        self.plot_widget.setWindowTitle("Robot Navigation Map")
-        self.plot_widget.setLabel('bottom', "X Position", units='mm')
-        self.plot_widget.setLabel('left', "Y Position", units='mm')
-        self.plot_widget.showGrid(x=True, y=True)
-        self.plot_widget.setAspectLocked(True) # Ensures proper scaling
-
-        # Initialize plot items
-        self.path_curve = self.plot_widget.plot(
-            self.x_points, self.y_points,
-            pen=pg.mkPen(color='b', width=2), symbol='o', symbolSize=5, name='Robot Path'
-        )
-        self.current_pos_scatter = pg.ScatterPlotItem(
-            size=12, pen=pg.mkPen(None), brush=pg.mkBrush(255, 0, 0), symbol='o', name='Current Position'
-        )
-        self.plot_widget.addItem(self.current_pos_scatter)
-        self.end_points_scatter = pg.ScatterPlotItem(
-            x=[], y=[], pen=pg.mkPen('g', width=1), brush=pg.mkBrush('g'),
-            size=5, symbol='s', name='ToF Endpoints'
-        )
-        self.plot_widget.addItem(self.end_points_scatter)
-        
-        self.arrow = pg.ArrowItem(angle=0, headLen=40, headWidth=10, tailLen=10, brush='r', pxMode =True)
-        self.plot_widget.addItem(self.arrow)
-        
-        self.robot_info_text = pg.TextItem(text="", anchor=(0, 0), color=(255, 255, 255))
-        self.plot_widget.addItem(self.robot_info_text)
-        self.robot_info_text.setPos(10, -30)
+        # A* planner on the occupancy grid for move-to-target; set to None to drive straight to the target
+        self.path_planner = GridPlanner(self.occupancy_grid)
+
+        # Move-to-target controller, woken by every robot telemetry sample
+        self.motion_controller = MotionController(self)
+
+        # Optional binary log of all datagrams, samples and commands (see start_flight_recording)
+        self.flight_recorder: FlightRecorder = None
+
+        # Optional per-datagram latency tracing (see enable_tracing); None when disabled
+        self.tracer: LatencyTracer = None
+        self._trace_dump_path = None
 
-        # QTimer for periodic plot updates
-        self.timer = QtCore.QTimer()
-        self.timer.setInterval(10) # 10 updates per second
-        self.timer.timeout.connect(self.update_plot)
-        self.timer.start()
+        # Optional ICP drift correction against the map (see enable_scan_matching); None when disabled
+        self.scan_matcher: ScanMatcher = None
 
-        # Tolerances for movement and turning
-        self.ANGLE_TOLERANCE_DEG = 2.0  # Degrees
-        self.DISTANCE_TOLERANCE_MM = 5.0 # Millimeters
+        # Optional particle-filter localization in a saved map (see enable_localization); None when disabled
+        self.localizer: MapLocalizer = None
+
+        # Optional pose graph with loop closure (see enable_pose_graph); None when disabled
+        self.pose_graph: PoseGraph = None
+
+        # Optional Prometheus /metrics endpoint (see start_metrics_server)
+        self.metrics_server: MetricsServer = None
 
 
     def set_logging_level(self, level: int):
@@ -161,19 +173,84 @@ class RobotInterface:
         self.logger.debug(f"Logging set to: {logging.getLevelName(level)}")
 
 
+    def subscribe(self, callback):
+        """
+        Registers a callback that is invoked without arguments after new data has
+        been processed. It runs on the processing thread and must return quickly.
+        """
+        with self._subscribers_lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._subscribers_lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def _notify_subscribers(self):
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback()
+            except Exception as e:
+                self.logger.error(f"❌ Error in subscriber callback: {e}", exc_info=True)
+
+    def process_pending(self) -> bool:
+        """
+        Runs one processing step: projects all pending ToF scans into the map and
+        notifies subscribers. Called by the processing thread, but can also be
+        called directly to process data synchronously.
+
+        Returns:
+            True if sufficient sensor data was available for processing.
+        """
+        tracer = self.tracer
+        if tracer is not None:
+            trace_count = tracer.trace_count # Everything received so far is included in this step
+        processed = self._calculate_points_for_plot()
+        if tracer is not None:
+            tracer.mark_mapped(trace_count)
+        self._notify_subscribers()
+        return processed
+
+    def _processing_loop(self):
+        """Processes new data as soon as the receiving thread signals it."""
+        while self.running:
+            if not self._data_event.wait(timeout=0.5):
+                continue
+            self._data_event.clear()
+            try:
+                self.process_pending()
+            except Exception as e:
+                self.logger.error(f"❌ Error while processing robot data: {e}", exc_info=True)
+
     def start_receiving(self):
-        """Starts the data receiving loop in a separate thread."""
+        """Starts the data receiving loop and the processing loop in separate threads."""
         if not self.running:
             try:
                 # Create and bind the socket ONLY ONCE here
                 self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                if self.recv_buffer_size:
+                    self.udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.recv_buffer_size)
+                    self.logger.info(
+                        f"UDP receive buffer: requested {self.recv_buffer_size} bytes, "
+                        f"got {self.udp_socket.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)} bytes."
+                    )
                 self.udp_socket.bind((self.host_receive, self.port_receive))
-                self.udp_socket.settimeout(1) # Set a timeout for recvfrom
+
+                if self.ingest_mode == "batched":
+                    self.udp_receiver = BatchedUdpReceiver(self.udp_socket)
+                    loop = self._get_data_from_wifi_batched_loop
+                else:
+                    self.udp_socket.settimeout(1) # Set a timeout for recvfrom
+                    loop = self._get_data_from_wifi_loop
 
                 self.running = True
-                self.receiving_thread = threading.Thread(target=self._get_data_from_wifi_loop, daemon=True)
+                self.receiving_thread = threading.Thread(target=loop, daemon=True)
                 self.receiving_thread.start()
-                self.logger.info(f"👂Started UDP receiving thread.")
+                self.processing_thread = threading.Thread(target=self._processing_loop, daemon=True)
+                self.processing_thread.start()
+                self.logger.info(f"👂Started UDP receiving thread ({self.ingest_mode} mode).")
             except Exception as e:
                 self.logger.error(f"❌ Failed to start UDP receiving: {e}", exc_info=True)
                 self.running = False # Ensure flag is false if startup fails
@@ -191,27 +268,207 @@ class RobotInterface:
                     self.logger.warning("UDP receiving thread did not terminate gracefully.")
                 else:
                     self.logger.info("UDP receiving thread stopped.")
+            if self.processing_thread and self.processing_thread.is_alive():
+                self._data_event.set() # Wake the processing loop so it sees running == False
+                self.processing_thread.join(timeout=2)
+            if self.udp_receiver:
+                self.udp_receiver.close()
+            self.udp_receiver = None
             if self.udp_socket:
                 self.udp_socket.close() # Close socket cleanly
             self.udp_socket = None # Clear reference
         else:
             self.logger.warning("UDP receiving thread is not running.")
 
+    def close(self):
+        """Stops receiving, the motion controller, the command channel and all optional diagnostics."""
+        if self.running:
+            self.stop_receiving()
+        self.motion_controller.close()
+        self.command_channel.close()
+        self.disable_scan_matching()
+        self.disable_localization()
+        self.disable_pose_graph()
+        self.stop_flight_recording()
+        self.disable_tracing()
+        self.stop_metrics_server()
+
+    def start_flight_recording(self, path: str = None, **kwargs) -> FlightRecorder:
+        """
+        Starts logging every received datagram, parsed sample and sent command to a
+        binary flight log (see flight_recorder.py). Export it to CSV offline with
+        `python flight_recorder.py export <log> <csv>`.
+
+        Args:
+            path: Log file. Defaults to flight_<date>_<time>.bin in the working directory.
+            **kwargs: Passed on to FlightRecorder.
+
+        Returns:
+            The running FlightRecorder.
+        """
+        self.stop_flight_recording()
+        if path is None:
+            path = datetime.now().strftime('flight_%Y%m%d_%H%M%S.bin')
+        recorder = FlightRecorder(path, **kwargs)
+        recorder.start()
+        self.flight_recorder = recorder
+        return recorder
+
+    def stop_flight_recording(self):
+        """Stops the flight recorder (if running) after writing all pending records."""
+        recorder = self.flight_recorder
+        if recorder is not None:
+            self.flight_recorder = None
+            recorder.stop()
+
+    def enable_tracing(self, dump_path: str = None, capacity: int = 1 << 16) -> LatencyTracer:
+        """
+        Starts tracing the latency of every datagram from socket receipt through parsing,
+        pose integration and map insertion to the plot redraw (see latency_tracer.py).
+
+        Args:
+            dump_path: If given, the raw traces are written to this CSV file by disable_tracing().
+            capacity: Number of most recent traces kept for the dump.
+        """
+        self._trace_dump_path = dump_path
+        self.tracer = LatencyTracer(capacity)
+        return self.tracer
+
+    def disable_tracing(self):
+        """Stops tracing and dumps the traces if a dump path was given to enable_tracing()."""
+        tracer = self.tracer
+        if tracer is None:
+            return
+        self.tracer = None
+        if self._trace_dump_path:
+            count = tracer.dump(self._trace_dump_path)
+            self.logger.info(f"💾 Wrote {count} latency traces to '{self._trace_dump_path}'.")
+
+    def enable_scan_matching(self, threaded: bool = True, **kwargs) -> ScanMatcher:
+        """
+        Starts correcting the pose by ICP matching of recent ToF scans against the
+        older map (see scan_matcher.py).
+
+        Args:
+            threaded: Match in a worker thread. If False, call scan_matcher.match()
+                yourself, e.g. for deterministic replay.
+            **kwargs: Passed to ScanMatcher, e.g. window or time_budget.
+        """
+        self.disable_scan_matching()
+        matcher = ScanMatcher(self.pose_estimator, **kwargs)
+        if threaded:
+            matcher.start()
+        self.scan_matcher = matcher
+        return matcher
+
+    def disable_scan_matching(self):
+        matcher = self.scan_matcher
+        if matcher is not None:
+            self.scan_matcher = None
+            matcher.stop()
+
+    def enable_localization(self, saved_map, threaded: bool = True, initial_pose: tuple = None,
+                            **kwargs) -> MapLocalizer:
+        """
+        Starts Monte Carlo localization in a saved map (see localization.py). Once
+        localized, the filtered pose, the path and new map points are in the frame
+        of the saved map.
+
+        Args:
+            saved_map: Path of a map saved by `replay.py --save-map`, or a LikelihoodField.
+            threaded: Update in a worker thread. If False, call localizer.step() yourself.
+            initial_pose: Optional (x, y, theta_rad) start pose in the saved map;
+                without it the particles are spread over the whole map.
+            **kwargs: Passed to MapLocalizer and MonteCarloLocalizer, e.g. n_particles.
+        """
+        self.disable_localization()
+        field = saved_map if isinstance(saved_map, LikelihoodField) else LikelihoodField.load(saved_map)
+        localizer = MapLocalizer(field, self.odometry, self.pose_estimator, **kwargs)
+        if initial_pose is not None:
+            localizer.filter.initialize_pose(*initial_pose)
+        if threaded:
+            localizer.start()
+        self.localizer = localizer
+        return localizer
+
+    def disable_localization(self):
+        localizer = self.localizer
+        if localizer is not None:
+            self.localizer = None
+            localizer.stop()
+
+    def enable_pose_graph(self, threaded: bool = True, **kwargs) -> PoseGraph:
+        """
+        Starts recording keyframes into a pose graph that closes loops and corrects
+        earlier poses and their map points (see pose_graph.py). Only scans projected
+        from now on can be re-projected.
+
+        Args:
+            threaded: Detect loops and optimize in a worker thread. If False, call
+                pose_graph.step() yourself.
+            **kwargs: Passed to PoseGraph, e.g. keyframe_distance or loop_radius.
+        """
+        self.disable_pose_graph()
+        graph = PoseGraph(self.pose_estimator, self.end_points, self.occupancy_grid,
+                          self.relative_angles_rad, **kwargs)
+        if threaded:
+            graph.start()
+        self.pose_graph = graph
+        return graph
+
+    def disable_pose_graph(self):
+        graph = self.pose_graph
+        if graph is not None:
+            self.pose_graph = None
+            graph.stop()
+
+    def start_metrics_server(self, port: int = 9100, host: str = "127.0.0.1") -> MetricsServer:
+        """
+        Serves ingest, parse, command, map, render and controller metrics in the
+        Prometheus text format on http://<host>:<port>/metrics.
+        """
+        self.stop_metrics_server()
+        self.metrics_server = MetricsServer(self, host, port)
+        self.metrics_server.start()
+        return self.metrics_server
+
+    def stop_metrics_server(self):
+        server = self.metrics_server
+        if server is not None:
+            self.metrics_server = None
+            server.stop()
+
+    def report_frame_time(self, seconds: float):
+        """Called by the view after every redraw with the time the frame took."""
+        self.frames_rendered += 1
+        self.frame_time_sum += seconds
+        self.last_frame_time = seconds
+
+    def get_latency_stats(self) -> dict:
+        """Returns per-stage latency histograms and percentiles, or None if tracing is disabled."""
+        tracer = self.tracer
+        return tracer.snapshot() if tracer is not None else None
+
 
     def send_command_to_esp(self, command_string):
         """
         Sends a command string to the ESP32 via UDP.
+        The command is queued on the persistent command channel, which coalesces
+        superseded MOVE/TURN commands and sends STOP ahead of everything else.
         
         :param command_string: The command string to send (e.g., "MOVE,100,50").
         """
+        recorder = self.flight_recorder
+        if recorder is not None:
+            recorder.record_command(self.clock(), command_string)
         try:
-            # Create a socket just for sending, or reuse the receiving socket if it's open.
-            # Creating a new one for each command is simpler and safe for UDP.
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as send_sock:
-                send_sock.sendto(command_string.encode('utf-8'), (self.host_send, self.port_send))
-                self.logger.debug(f"⬆️ Sent command to {self.host_send}:{self.port_send}: '{command_string}'")
+            self.command_channel.send(command_string)
         except Exception as e:
             self.logger.error(f"❌ Failed to send command: {e}", exc_info=True)
+
+    def get_command_stats(self) -> dict:
+        """Returns send-latency and queue-depth statistics of the command channel."""
+        return self.command_channel.stats()
             
     def _get_data_from_wifi_loop(self):
         """Continuously receives data from the robot."""
@@ -230,104 +487,341 @@ class RobotInterface:
                 # Receive data (up to 1024 bytes) and the sender's address
                 # The ESP32 will send from 192.168.4.1 (its AP IP) on some ephemeral port
                 received_data, sender_address = self.udp_socket.recvfrom(255)
-                
-                # Decode and strip the received data
-                decoded_data = received_data.decode('utf-8').strip()
-                
-                if decoded_data:
-                    self.logger.debug(f"⬇️ Received from {sender_address}: '{decoded_data}'")
-                    # You can optionally store the sender_address if you need to reply
-                    # For this setup, we assume the ESP32 is sending unsolicited telemetry
-                    
-                    # Process the received data (e.g., update robot state)
-                    self._parse_received_data(decoded_data)
+                # For this setup, we assume the ESP32 is sending unsolicited telemetry
+                self._handle_datagram(received_data)
                 # No 'else' for connection closed by peer, as UDP is connectionless.
                 # An empty packet might indicate a specific protocol message, but not a connection close.
 
             except socket.timeout:
                 # No data received within the timeout period. This is normal.
-                self.logger.debug(f"No data recieved during UDP data reception.")
+                self.logger.debug("No data recieved during UDP data reception.")
                 pass 
             except Exception as e:
-                self.logger.error(f"❌ Error during UDP data reception: {e}", exc_info=True)
+                self.logger.error("❌ Error during UDP data reception: %s", e, exc_info=True)
                 # Consider a small pause to prevent a tight loop on continuous errors
                 time.sleep(0.1) 
 
 
+    def _get_data_from_wifi_batched_loop(self):
+        """
+        Receives data from the robot in batches: each wakeup drains every queued
+        datagram from the socket before the batch is handed to the parser.
+        """
+        self.logger.debug(f"👂 Listening for UDP data on {self.host_receive}:{self.port_receive} (batched)")
+        receiver = self.udp_receiver
+        while self.running:
+            try:
+                batch = receiver.wait_and_drain(timeout=1.0)
+                # Consecutive binary datagrams are decoded together in one np.frombuffer call
+                binary_run = []
+                for datagram in batch:
+                    if telemetry_codec.is_binary_frame(datagram):
+                        binary_run.append(datagram)
+                        continue
+                    if binary_run:
+                        self._handle_binary_run(binary_run)
+                        binary_run = []
+                    self._handle_datagram(datagram)
+                if binary_run:
+                    self._handle_binary_run(binary_run)
+            except Exception as e:
+                if not self.running: # Socket closed by stop_receiving()
+                    break
+                self.logger.error("❌ Error during batched UDP data reception: %s", e, exc_info=True)
+                time.sleep(0.1)
+
+    def _handle_datagram(self, datagram):
+        """
+        Decodes one received datagram (bytes or memoryview) and parses it.
+        Binary telemetry frames are recognized by their magic bytes, everything
+        else is treated as MF/RB text.
+        """
+        self.datagrams_received += 1
+        tracer = self.tracer
+        if tracer is not None:
+            tracer.begin()
+        recorder = self.flight_recorder
+        if recorder is not None:
+            recorder.record_datagram(self.clock(), datagram)
+        if telemetry_codec.is_binary_frame(datagram):
+            self._handle_binary_frames(datagram)
+            return
+        try:
+            decoded_data = str(datagram, 'utf-8').strip()
+        except UnicodeDecodeError:
+            self.decode_errors += 1
+            self.parse_logger.warning("❓ Received a datagram that is not valid UTF-8.")
+            return
+        if decoded_data:
+            self.logger.debug("⬇️ Received: '%s'", decoded_data)
+            # Process the received data (e.g., update robot state)
+            self._parse_received_data(decoded_data)
+            self._data_event.set()
+
+    def _handle_binary_run(self, datagrams: list):
+        """Decodes several binary datagrams at once, falling back to one by one on errors."""
+        self.datagrams_received += len(datagrams)
+        tracer = self.tracer
+        if tracer is not None:
+            tracer.begin() # One trace for the whole run, it is decoded and applied at once
+        recorder = self.flight_recorder
+        if recorder is not None:
+            arrival = self.clock()
+            for datagram in datagrams:
+                recorder.record_datagram(arrival, datagram)
+        if len(datagrams) == 1:
+            self._handle_binary_frames(datagrams[0])
+            return
+        try:
+            frames = telemetry_codec.decode_frames(b''.join(datagrams))
+        except TelemetryDecodeError:
+            for datagram in datagrams:
+                self._handle_binary_frames(datagram)
+            return
+        self._apply_binary_frames(frames)
+
+    def _handle_binary_frames(self, data):
+        """Decodes one buffer of binary telemetry frames and applies them."""
+        try:
+            frames = telemetry_codec.decode_frames(data)
+        except TelemetryDecodeError as e:
+            self.binary_decode_errors += 1
+            self.parse_logger.warning("❓ Invalid binary telemetry: %s", e)
+            return
+        self._apply_binary_frames(frames)
+
+    def _apply_binary_frames(self, frames: np.ndarray):
+        """Applies decoded binary frames in order, exactly like an MF line followed by an RB line."""
+        tof_rows = telemetry_codec.tof_values(frames)
+        robot_rows = telemetry_codec.robot_values(frames)
+        raw_tof = frames["tof"]
+        sequenced = "seq" in frames.dtype.names
+        arrival = self.clock()
+        accepted = []
+        for i in range(len(frames)):
+            # Out-of-order and duplicate frames never reach odometry
+            if sequenced and not self.link_monitor.observe(int(frames["seq"][i]), int(frames["timestamp_ms"][i]), arrival):
+                continue
+            accepted.append(i)
+            frame_key = raw_tof[i].tobytes()
+            datagram_seq = int(frames["seq"][i]) if sequenced else None
+            if self._is_stale_tof(frame_key, datagram_seq):
+                self.stale_tof_frames += 1
+            else:
+                self._update_tof_values(tof_rows[i], frame_key, datagram_seq)
+        if len(accepted) == 1:
+            # The usual single-frame datagram takes the scalar path of an RB line
+            self._update_robot_values(robot_rows[accepted[0]])
+        elif accepted:
+            # All frames of a buffer arrived together, so their poses are integrated as one batch
+            self._update_robot_batch(robot_rows[accepted])
+        self._data_event.set()
+
+    def get_ingest_stats(self) -> dict:
+        """Returns receive-side counters (batched mode adds batch and drop counters)."""
+        stats = {"mode": self.ingest_mode, "decode_errors": self.decode_errors,
+                 "binary_decode_errors": self.binary_decode_errors}
+        if self.udp_receiver:
+            stats.update(self.udp_receiver.stats())
+        return stats
+
+    def get_link_stats(self) -> dict:
+        """Returns loss, reordering, duplicate and jitter statistics of the sequenced telemetry."""
+        return self.link_monitor.snapshot()
+
+    def _accept_sequenced_frame(self, header: str) -> tuple:
+        """
+        Checks an "SQ\t<seq>\t<sender millis>" header against the link monitor.
+
+        Returns:
+            (accepted, seq): accepted is False if the frame is a duplicate or arrived
+            out of order; seq is None if the header could not be parsed.
+        """
+        fields = header.strip().split('\t')
+        try:
+            seq, sender_ms = int(fields[1]), int(fields[2])
+        except (IndexError, ValueError):
+            self.parse_failures["sequence_header"] += 1
+            self.parse_logger.warning("⚠️ Invalid sequence header: '%s'", header.strip())
+            return True, None # Still process the payload, just without ordering information
+        return self.link_monitor.observe(seq, sender_ms, self.clock()), seq
+
+    def _is_stale_tof(self, frame_key, datagram_seq) -> bool:
+        """
+        Returns True if a ToF frame is the ESP32 re-sending its last line.
+        With a sequence header, an identical line only counts as re-sent within
+        tof_resend_window sequence numbers of the datagram that delivered it;
+        without one, the payload comparison is all there is to go on.
+        """
+        if frame_key != self._last_tof_payload:
+            return False
+        last_seq = self._last_tof_datagram_seq
+        if datagram_seq is None or last_seq is None:
+            return True
+        # A restarted sender counts from 0 again, which is never a re-send
+        return 0 <= datagram_seq - last_seq < self.tof_resend_window
+
     def _parse_received_data(self, data_string: str):
         """Parses incoming data strings and dispatches to appropriate handlers."""
+        # Optional sequence header line in front of the MF/RB lines
+        datagram_seq = None
+        if data_string.startswith("SQ\t"):
+            header, _, data_string = data_string.partition('\n')
+            accepted, datagram_seq = self._accept_sequenced_frame(header)
+            if not accepted:
+                self.parse_logger.debug("Dropped duplicate or out-of-order frame: '%s'", header.strip())
+                return
+
         # Split on the first occurrence of '\r\n' to handle multi-line messages
         parts = data_string.split('\r\n', 1)
         
         # Check for "MF" data (ToF sensors)
         if parts[0].startswith("MF\t"):
-            self.parse_tof_data(parts[0])
+            self.parse_tof_data(parts[0], datagram_seq)
         else:
-            self.logger.warning(f"❓ Unknown data format in part 1: '{parts[0]}'")           
+            self.parse_failures["unknown_part1"] += 1
+            self.parse_logger.warning("❓ Unknown data format in part 1: '%s'", parts[0])
         
         # Check for "RB" data (Robot sensors)
         if len(parts) > 1 and parts[1].startswith("RB\t"):
             self.parse_robot_data(parts[1])
         elif len(parts) > 1: # If there's a second part but it's not "RB"
-            self.logger.warning(f"❓ Unknown data format in part 2: '{parts[1]}'")
+            self.parse_failures["unknown_part2"] += 1
+            self.parse_logger.warning("❓ Unknown data format in part 2: '%s'", parts[1])
         elif len(parts) == 1 and not parts[0].startswith("MF\t"): # If only one part and it wasn't MF
-            self.logger.warning(f"❓ Unknown single data format: '{data_string}'")
+            self.parse_failures["unknown_single"] += 1
+            self.parse_logger.warning("❓ Unknown single data format: '%s'", data_string)
 
 
     def parse_robot_data(self, data_string: str):
         """Parses robot sensor data (gyro, distance, etc.)."""
         if '[ERROR]' in data_string:
-          self.logger.error(f"❌ Error from Mobile Base: {data_string.split('[ERROR]')[1].strip()}")
+          self.parse_failures["robot_error_report"] += 1
+          self.parse_logger.error("❌ Error from Mobile Base: %s", data_string.split('[ERROR]')[1].strip())
           return
         
         if not data_string.startswith("RB\t"):
-            self.logger.warning("⚠️ Invalid robot data format: Missing 'RB\\t' prefix.")
+            self.parse_failures["robot_prefix"] += 1
+            self.parse_logger.warning("⚠️ Invalid robot data format: Missing 'RB\\t' prefix.")
             return
         values_str = data_string[3:].split(',')
         try:
             if not values_str or all(not s.strip() for s in values_str):
-                self.logger.warning("⚠️ Robot data values are empty or whitespace-only.")
+                self.parse_failures["robot_empty"] += 1
+                self.parse_logger.warning("⚠️ Robot data values are empty or whitespace-only.")
                 return
 
             float_values = [float(v.strip()) for v in values_str if v.strip()]
-            with self._data_lock:
-                self.robot_sensor_values = np.array(float_values)
-            self.logger.debug("✅ Robot sensor values updated: %s", self.robot_sensor_values)
+            self._update_robot_values(np.array(float_values))
+            self.parse_logger.debug("✅ Robot sensor values updated: %s", self.robot_sensor_values)
         except ValueError as e:
-            self.logger.error(f"❌ Error parsing robot sensor values '{data_string}': {e}")
+            self.parse_failures["robot_value"] += 1
+            self.parse_logger.error("❌ Error parsing robot sensor values '%s': %s", data_string, e)
         except Exception as e:
-            self.logger.error(f"❌ Unexpected error parsing robot data: {e}", exc_info=True)
+            self.parse_logger.error("❌ Unexpected error parsing robot data: %s", e, exc_info=True)
+
 
+    def parse_tof_data(self, data_string: str, datagram_seq: int = None):
+        """
+        Parses ToF sensor data.
+        The ESP32 forwards its last ToF line with every datagram, even when the sensor
+        has not produced a new one. Such a re-sent line is treated as stale and does
+        not start a new frame generation (see _is_stale_tof).
 
-    def parse_tof_data(self, data_string: str):
-        """Parses ToF sensor data."""
+        Args:
+            data_string: The "MF\t..." line.
+            datagram_seq: Sequence number from the SQ header of the datagram, if any.
+        """
         if not data_string.startswith("MF\t"):
-            self.logger.warning("⚠️ Invalid ToF data format: Missing 'MF\\t' prefix.")
+            self.parse_failures["tof_prefix"] += 1
+            self.parse_logger.warning("⚠️ Invalid ToF data format: Missing 'MF\\t' prefix.")
+            return
+
+        payload = data_string[3:].rstrip()
+        if self._is_stale_tof(payload, datagram_seq):
+            self.stale_tof_frames += 1
             return
 
         values_str = data_string[3:].split('\t')
         try:
             if not values_str or all(not s.strip() for s in values_str):
-                self.logger.warning("⚠️ ToF data values are empty or whitespace-only.")
+                self.parse_failures["tof_empty"] += 1
+                self.parse_logger.warning("⚠️ ToF data values are empty or whitespace-only.")
                 return
 
             expected_sensors = len(self.relative_angles_rad)
             if len(values_str) != expected_sensors:
-                self.logger.warning(
-                    f"⚠️ ToF value count mismatch. Expected {expected_sensors}, got {len(values_str)} from '{data_string}'."
+                self.parse_failures["tof_count_mismatch"] += 1
+                self.parse_logger.warning(
+                    "⚠️ ToF value count mismatch. Expected %d, got %d from '%s'.", expected_sensors, len(values_str), data_string
                 )
                 return
 
             float_values = [float(v.strip()) for v in values_str if v.strip()]
-            with self._data_lock:
-                self.tof_sensor_values = np.array(float_values)
-                self.tof_sensor_values[1] = self.tof_sensor_values[1] # Converting Distance from CM to MM
-            self.logger.debug("✅ ToF sensor values updated: %s", self.tof_sensor_values)
+            self._update_tof_values(np.array(float_values), payload, datagram_seq)
+            self.parse_logger.debug("✅ ToF sensor values updated: %s", self.tof_sensor_values)
         except ValueError as e:
-            self.logger.error(f"❌ Error parsing ToF values '{data_string}': {e}")
+            self.parse_failures["tof_value"] += 1
+            self.parse_logger.error("❌ Error parsing ToF values '%s': %s", data_string, e)
         except Exception as e:
-            self.logger.error(f"❌ Unexpected error parsing ToF data: {e}", exc_info=True)
+            self.parse_logger.error("❌ Unexpected error parsing ToF data: %s", e, exc_info=True)
+
 
+    def _update_robot_values(self, values: np.ndarray):
+        """Stores one robot telemetry sample and integrates the pose from it."""
+        tracer = self.tracer
+        if tracer is not None:
+            tracer.mark(latency_tracer.PARSED)
+        now = self.clock()
+        with self._data_lock:
+            self.robot_sensor_values = values
+        recorder = self.flight_recorder
+        if recorder is not None:
+            recorder.record_sample(flight_recorder.ROBOT_SAMPLE, now, values)
+        # Integrate the pose for every sample, independent of the plot refresh rate
+        if len(values) >= 7:
+            self.odometry.update(values[0], values[1], now, values[5], values[6])
+            self.pose_estimator.update(values[0], values[1], now, values[5], values[6])
+        elif len(values) >= 2:
+            self.odometry.update(values[0], values[1], now)
+            self.pose_estimator.update(values[0], values[1], now)
+        if tracer is not None and len(values) >= 2:
+            tracer.mark(latency_tracer.POSE)
+        self.motion_controller.notify_sample()
+
+    def _update_robot_batch(self, rows: np.ndarray):
+        """Stores a batch of robot telemetry samples received together and integrates them at once."""
+        tracer = self.tracer
+        if tracer is not None:
+            tracer.mark(latency_tracer.PARSED)
+        now = self.clock()
+        with self._data_lock:
+            self.robot_sensor_values = rows[-1]
+        recorder = self.flight_recorder
+        if recorder is not None:
+            for values in rows:
+                recorder.record_sample(flight_recorder.ROBOT_SAMPLE, now, values)
+        self.odometry.update_batch(rows, now)
+        self.pose_estimator.update_batch(rows, now)
+        if tracer is not None:
+            tracer.mark(latency_tracer.POSE)
+        self.motion_controller.notify_sample()
+
+    def _update_tof_values(self, values: np.ndarray, frame_key, datagram_seq: int = None):
+        """
+        Stores one fresh ToF frame and starts a new frame generation.
+        frame_key and datagram_seq identify the raw frame so that re-sent copies can be detected.
+        """
+        with self._data_lock:
+            self.tof_sensor_values = values
+            self._last_tof_payload = frame_key
+            self._last_tof_datagram_seq = datagram_seq
+            self._tof_frame_time = self.clock()
+            self.tof_frame_seq += 1
+            self._pending_scans.append((self._tof_frame_time, values))
+        recorder = self.flight_recorder
+        if recorder is not None:
+            recorder.record_sample(flight_recorder.TOF_SAMPLE, self._tof_frame_time, values)
 
     def get_robot_sensor_value(self, index: int, default=None):
         """Safely retrieves a robot sensor value by index."""
@@ -360,7 +854,11 @@ class RobotInterface:
 
 
     def save_sensor_data_to_csv(self, filename: str = 'sensor_data.csv'):
-        """Appends current sensor readings to a CSV file."""
+        """
+        Appends the current sensor readings to a CSV file as a single row.
+        This reopens the file on every call; for continuous logging at the telemetry
+        rate use start_flight_recording() and export the log to CSV afterwards.
+        """
         try:
             file_exists = os.path.isfile(filename)
             with open(filename, mode='a', newline='') as file:
@@ -394,438 +892,135 @@ class RobotInterface:
 
     def _calculate_points_for_plot(self) -> bool:
         """
-        Calculates and updates robot path and ToF endpoint coordinates.
-        Always returns True if sufficient sensor data is available for processing,
-        ensuring the plot is consistently updated.
+        Projects all pending ToF scans into the map. The pose itself is integrated
+        in the receive path (see parse_robot_data), so this only reads it from
+        the pose history.
+        Returns True if sufficient sensor data is available for processing.
         """
+        if self.pose_estimator.sample_count == 0:
+            self.logger.debug("Robot sensor data insufficient for plot calculation (need gyro and distance).")
+            return False
+
+        # Each ToF frame generation is projected into the map exactly once.
         with self._data_lock:
-            # Check for sufficient robot sensor data
-            if len(self.robot_sensor_values) < 2:
-                self.logger.debug("Robot sensor data insufficient for plot calculation (need gyro and distance).")
-                return False
-
-            current_distance = self.robot_sensor_values[1]
-            gyro_angle = -self.robot_sensor_values[0]
-
-            # Initialize prev_distance on the very first valid data point.
-            # This ensures incremental_distance is correctly calculated from the second point onwards.
-            if self.x_points == [0.0] and self.y_points == [0.0] and self.prev_distance == 0.0:
-                self.prev_distance = current_distance
-                self.logger.debug("First sensor data received. Initializing previous distance for path calculation.")
-                # We proceed to calculate ToF points for this initial static position.
-                # The robot's own path won't extend until actual movement.
-
-            incremental_distance = current_distance - self.prev_distance
-            self.prev_distance = current_distance # Update prev_distance for the next iteration
-
-            theta = np.deg2rad(gyro_angle) # Robot's absolute heading in radians
-
-            # Calculate incremental change in X and Y.
-            # If incremental_distance is 0, dx and dy will be 0, and the same point
-            # will be appended, correctly representing a stationary robot on the path.
-            dx = incremental_distance * np.cos(theta)
-            dy = incremental_distance * np.sin(theta)
-
-            # Update robot's current position lists.
-            self.x_points.append(self.x_points[-1] + dx)
-            self.y_points.append(self.y_points[-1] + dy)
-            self.logger.debug(f"Robot position calculated: X={self.x_points[-1]:.2f}, Y={self.y_points[-1]:.2f}")
-
-
-            # Calculate and accumulate ToF endpoints (building a map).
-            # This logic now always runs if ToF sensor data is available,
-            # regardless of whether the robot's distance changed.
-            if len(self.tof_sensor_values) > 0:
-                # IMPORTANT: Adjust unit conversion (/10) if your ToF values are NOT in mm
-                # and you intend for the plot to be in a different unit (e.g., cm).
-                # 'slam_values' will be in the same unit as your plot axes.
-                slam_values = self.tof_sensor_values / 10 # Example: Converting mm to cm for plot
-
-                angles_absolute = theta + self.relative_angles_rad
-
-                # Filter out invalid ToF readings (e.g., negative values)
-                valid_indices = slam_values >= 0
-                valid_distances = slam_values[valid_indices]
-                valid_angles = angles_absolute[valid_indices]
-
-                if len(valid_distances) > 0:
-                    # Calculate absolute coordinates of ToF endpoint readings
-                    end_x_coords = self.x_points[-1] + valid_distances * np.cos(valid_angles)
-                    end_y_coords = self.y_points[-1] + valid_distances * np.sin(valid_angles)
-
-                    # Stack new ToF points onto the accumulated 'end_points' array
-                    new_tof_points = np.c_[end_x_coords, end_y_coords]
-                    for x_val, y_val in zip(end_x_coords, end_y_coords):
-                      self.end_points.append((x_val, y_val))
-                    self.logger.debug(f"Added {len(new_tof_points)} ToF points. Total: {len(self.end_points)}")
-                else:
-                    self.logger.debug("No valid ToF endpoints to plot for this scan.")
+            scans = list(self._pending_scans)
+            self._pending_scans.clear()
+
+        for frame_time, tof_values in scans:
+            self._project_scan(frame_time, tof_values)
+        return True
+
+    def _project_scan(self, frame_time: float, tof_values: np.ndarray):
+        """Projects one ToF scan into the map using the filtered pose at the time it arrived."""
+        robot_x, robot_y, theta = self.pose_estimator.pose_at(frame_time)
+
+        # Calculate and accumulate ToF endpoints (building a map).
+        if len(tof_values) > 0:
+            # IMPORTANT: Adjust unit conversion (/10) if your ToF values are NOT in mm
+            # and you intend for the plot to be in a different unit (e.g., cm).
+            # 'slam_values' will be in the same unit as your plot axes.
+            slam_values = tof_values / 10 # Example: Converting mm to cm for plot
+
+            angles_absolute = theta + self.relative_angles_rad
+
+            # Ray-cast the whole scan into the occupancy grid (free space and hits). If it
+            # updated any cell, a running move repairs its path around newly seen obstacles.
+            if self.occupancy_grid.integrate_scan(robot_x, robot_y, angles_absolute, slam_values):
+                self.motion_controller.notify_map_update()
+
+            # Filter out invalid ToF readings (e.g., negative values)
+            valid_indices = slam_values >= 0
+            valid_distances = slam_values[valid_indices]
+            valid_angles = angles_absolute[valid_indices]
+
+            if len(valid_distances) > 0:
+                # Calculate absolute coordinates of ToF endpoint readings
+                end_x_coords = robot_x + valid_distances * np.cos(valid_angles)
+                end_y_coords = robot_y + valid_distances * np.sin(valid_angles)
+
+                self.end_points.add_points(end_x_coords, end_y_coords)
+                self.logger.debug("Added %d ToF points. Total: %d", len(end_x_coords), len(self.end_points))
+
+                matcher = self.scan_matcher
+                if matcher is not None:
+                    matcher.add_scan(robot_x, robot_y, theta, valid_distances,
+                                     self.relative_angles_rad[valid_indices])
+                localizer = self.localizer
+                if localizer is not None:
+                    localizer.add_scan(frame_time, valid_distances, self.relative_angles_rad[valid_indices])
             else:
-                self.logger.debug("No ToF sensor values available for point calculation.")
+                self.logger.debug("No valid ToF endpoints to plot for this scan.")
 
-            # Always return True to ensure update_plot is triggered by the timer,
-            # allowing the plot to refresh its display, even if only ToF data updated
-            # or robot position remained static.
-            self.logger.debug(f"📊 Plot data prepared. Robot: ({self.x_points[-1]:.2f}, {self.y_points[-1]:.2f}), ToF Map Points: {len(self.end_points)}")
-            return True
-
-    def update_plot(self):
-        """Updates the 2D plot with the latest robot position and ToF data."""
-        self._calculate_points_for_plot() # Recalculate points based on new sensor data
-
-        # Update robot path line
-        self.path_curve.setData(self.x_points, self.y_points)
-
-        # Update current robot position marker
-        if self.x_points: # Check if points exist before accessing last element
-          x, y = self.x_points[-1], self.y_points[-1]
-          angle_deg = self.robot_sensor_values[0] if len(self.robot_sensor_values) > 0 else 0
-          
-          # Check if robot position or angle has changed
-          if (x != self.x_points[-2] or y != self.y_points[-2] or angle_deg != self.prev_angle):
-            self.current_pos_scatter.setData([x], [y])
-            self.arrow.setPos(x, y)
-            self.arrow.setStyle(angle=angle_deg + 180) # Adjust for PyQTGraph's arrow orientation
-            
+            # Registered after both maps hold the scan, so a re-projection can take it back
+            graph = self.pose_graph
+            if graph is not None:
+                graph.add_scan(robot_x, robot_y, theta, slam_values)
         else:
-            self.current_pos_scatter.clear()
-            self.arrow.hide()  # Hide the arrow if no position data
-            self.robot_info_text.setText("")  # Clear the text if no position data
-
-        # Update ToF endpoints (showing all accumulated points)
-        if self.end_points:
-            all_tof_points = list(self.end_points) 
-            if all_tof_points: # Ensure the list is not empty before converting to array
-                # Convert the list of (x,y) tuples into a 2D NumPy array (N, 2)
-                # np.array can handle a list of tuples correctly to form a 2D array
-                tof_points_array = np.array(all_tof_points)
-                
-                # Now, slice the 2D array for x and y coordinates
-                self.end_points_scatter.setData(tof_points_array[:, 0], tof_points_array[:, 1])
-            else:
-                self.end_points_scatter.clear() # Clear if all_tof_points is empty
-        else:
-            self.end_points_scatter.clear()
+            self.logger.debug("No ToF sensor values available for point calculation.")
 
-        self.plot_widget.autoRange()
-        # self.plot_widget.setXRange(-1000, 1000) # Example: x from -1000mm to +1000mm
-        # self.plot_widget.setYRange(-1000, 1000) # Example: y from -1000mm to +1000mm
+        self.logger.debug("📊 Plot data prepared. Robot: (%.2f, %.2f), ToF Map Points: %d", robot_x, robot_y, len(self.end_points))
 
+    def move_by(self, distance: float, speed: float) -> bool:
+        """
+        Moves the robot forward (positive) or backward (negative) by a distance,
+        relative to its current odometer reading.
 
-    def _handle_key_press(self, event: QtGui.QKeyEvent, move_distance: float, turn_angle: float, speed: float) -> bool:
+        Returns:
+            True if a command was sent, False if no distance data is available yet.
         """
-        Processes key press events to generate and send robot commands.
-        Called by the CustomPlotWidget's keyPressEvent.
+        current_distance = self.get_robot_sensor_value(1)
+        if current_distance is None:
+            self.logger.warning("Sensor data (distance) unavailable for 'MOVE' command. Please wait for robot data.")
+            return False
+        command = f"MOVE,{current_distance + distance},{speed}"
+        self.logger.info(f"Sending command: {command}")
+        self.send_command_to_esp(command)
+        return True
 
-        Args:
-            event: The QtGui.QKeyEvent object.
-            move_distance: The distance to move forward/backward.
-            turn_angle: The angle to turn left/right.
-            speed: The speed for movement/turning.
+    def turn_by(self, angle: float, speed: float) -> bool:
+        """
+        Turns the robot by an angle (degrees) relative to its current heading.
 
         Returns:
-            True if a command was sent, False otherwise.
+            True if a command was sent, False if no angle data is available yet.
         """
-        current_distance_in_mm = self.get_robot_sensor_value(1)
         current_angle = self.get_robot_sensor_value(0)
-        command = ""
-        self.logger.debug(f"Key pressed. Current robot angle: {current_angle}")
-        
-        # Define a dictionary to map keys to command generation logic
-        key_actions = {
-            QtCore.Qt.Key_W: lambda dist: f"MOVE,{dist + move_distance},{speed}",
-            QtCore.Qt.Key_S: lambda dist: f"MOVE,{dist - move_distance},{speed}",
-            QtCore.Qt.Key_A: lambda _: f"TURN,{current_angle - turn_angle},{speed}",
-            QtCore.Qt.Key_D: lambda _: f"TURN,{current_angle + turn_angle},{speed}",
-            QtCore.Qt.Key_R: lambda _: "STOP,0,0",
-            QtCore.Qt.Key_G: lambda _: self.move_to_target_prompt(speed), # 'G' key for Go to Target (manual input)
-        }
-
-        # Check for 'MOVE' commands requiring distance sensor data first
-        if event.key() in (QtCore.Qt.Key_W, QtCore.Qt.Key_S) and current_distance_in_mm is None:
-            self.logger.warning("Sensor data (distance) unavailable for 'MOVE' command. Please wait for robot data.")
-            return False  # Indicate that no command was sent
-
-        # Check for 'TURN' commands requiring angle sensor data first
-        if event.key() in (QtCore.Qt.Key_A, QtCore.Qt.Key_D) and current_angle is None:
+        if current_angle is None:
             self.logger.warning("Sensor data (angle) unavailable for 'TURN' command. Please wait for robot data.")
-            return False  # Indicate that no command was sent
-
-        # Process the key if it's in our defined actions
-        if event.key() in key_actions:
-            if event.key() == QtCore.Qt.Key_G:
-                key_actions[event.key()](speed)
-                return True
-            else:
-                command = key_actions[event.key()](current_distance_in_mm) # Pass current_distance for MOVE, ignored by TURN
-            self.logger.info(f"Sending command: {command}")
-        else:
-            return False  # Key not handled by robot commands
+            return False
+        command = f"TURN,{current_angle + angle},{speed}"
+        self.logger.info(f"Sending command: {command}")
+        self.send_command_to_esp(command)
+        return True
 
-        if command:
-            self.send_command_to_esp(command)
-            return True
-        return False
+    def stop_robot(self) -> bool:
+        """Sends a STOP command."""
+        self.logger.info("Sending command: STOP,0,0")
+        self.send_command_to_esp("STOP,0,0")
+        return True
 
     def path_planning(self, command: str):
         """Sends a command for path planning."""
         self.send_command_to_esp(command)
 
-    def move_to_target_prompt(self, speed: float):
-        """
-        Prompts the user for target x, y coordinates and angle,
-        then initiates the movement to that target.
-        """
-        try:
-            target_x_str, ok_x = QtWidgets.QInputDialog.getText(self.plot_widget, 'Target X', 'Enter target X position (mm):')
-            if not ok_x: return
-            target_x = float(target_x_str)
-
-            target_y_str, ok_y = QtWidgets.QInputDialog.getText(self.plot_widget, 'Target Y', 'Enter target Y position (mm):')
-            if not ok_y: return
-            target_y = float(target_y_str)
-
-            target_angle_str, ok_angle = QtWidgets.QInputDialog.getText(self.plot_widget, 'Target Angle', 'Enter target angle (degrees, 0-360):')
-            if not ok_angle: return
-            target_angle = float(target_angle_str)
-            # Ensure target_angle is normalized to 0-360
-            target_angle = (target_angle % 360 + 360) % 360 
-
-            # Start the movement in a new thread to avoid blocking the GUI
-            threading.Thread(target=self._move_to_target, 
-                             args=(target_x, target_y, target_angle, speed),
-                             daemon=True).start()
-
-        except ValueError:
-            self.logger.error("Invalid input for target coordinates or angle. Please enter numbers.")
-        except Exception as e:
-            self.logger.error(f"Error getting target input: {e}")
-
-    def _cancel_current_move(self):
-        """
-        Signals the currently running _move_to_target thread to stop and waits for it.
-        """
-        if self._current_move_thread and self._current_move_thread.is_alive():
-            self.logger.warning("🛑 New move request received. Cancelling current robot movement...")
-            self.send_command_to_esp("STOP,0,0") # Send a STOP command to the robot
-            self._cancel_move_flag.set() # Set the event to signal cancellation
-            self._current_move_thread.join(timeout=2) # Wait a bit for the old thread to terminate
-            if self._current_move_thread.is_alive():
-                self.logger.error("❌ Previous move thread did not terminate gracefully.")
-            else:
-                self.logger.info("✅ Previous move thread terminated.")
-        self._cancel_move_flag.clear() # Clear the flag for the new thread
-
-    def move_to_target_by_click(self, target_x: float, target_y: float, target_angle: float, speed: float):
-        """
-        Initiates robot movement to a target specified by a mouse click.
-        This function is called by the CustomPlotWidget's mousePressEvent.
-        """
-        # Ensure target_angle is normalized to 0-360
-        target_angle = (target_angle % 360 + 360) % 360 
-        self.logger.info(f"Move to target requested via mouse click: X={target_x:.2f}mm, Y={target_y:.2f}mm, Angle={target_angle:.2f}° at speed {speed}")
-        # Start the movement in a new thread to avoid blocking the GUI
-        threading.Thread(target=self._move_to_target,
-                         args=(target_x, target_y, target_angle, speed),
-                         daemon=True).start()
-
-    def _move_to_target(self, target_x: float, target_y: float, target_angle: float, speed: float):
+    def move_to_target(self, target_x: float, target_y: float, target_angle: float, speed: float):
         """
-        Moves the robot from its current position and angle to the specified
-        target coordinates and angle. This is a blocking function and should be
-        run in a separate thread.
+        Starts moving the robot to the target pose on the motion controller thread.
 
         Args:
             target_x: The target X coordinate in mm.
             target_y: The target Y coordinate in mm.
-            target_angle: The target angle in degrees (0-360).
+            target_angle: The target angle in degrees.
             speed: The speed for movement and turning.
         """
-        self.logger.info(f"Initiating movement to Target: X={target_x:.2f}mm, Y={target_y:.2f}mm, Angle={target_angle:.2f}° at speed {speed}")
-
-        if self._cancel_move_flag.is_set():
-            self.logger.info("Movement cancelled before starting.")
-            return
-
-        current_x = self.x_points[-1] if self.x_points else 0.0
-        current_y = self.y_points[-1] if self.y_points else 0.0
-        current_angle = self.get_robot_sensor_value(0) # Assuming index 0 is gyro angle
-
-        if current_angle is None:
-            self.logger.error("Cannot move to target: current robot angle not available.")
-            return
-
-        # Normalize current_angle to 0-360 just in case it's not already
-        current_angle = (current_angle % 360 + 360) % 360
-
-        # 1. Calculate initial turn to face the target position
-        delta_x = target_x - current_x
-        delta_y = target_y - current_y
-        
-        angle_to_target_rad = -np.arctan2(delta_y, delta_x)
-        angle_to_target_deg = np.degrees(angle_to_target_rad)
-
-        # Normalize angle_to_target_deg to 0-360
-        angle_to_target_deg = (angle_to_target_deg % 360 + 360) % 360
-
-        # Calculate the absolute target angle for the first turn command.
-        # This is the direction the robot needs to *face* to point towards the target point.
-        target_heading_for_move = angle_to_target_deg
-
-        # Calculate the angular difference for the shortest turn
-        # This part is for *calculating* the turn needed, not for sending the command directly.
-        angle_diff_to_face_target = target_heading_for_move - current_angle
-        if angle_diff_to_face_target > 180:
-            angle_diff_to_face_target -= 360
-        elif angle_diff_to_face_target < -180:
-            angle_diff_to_face_target += 360
-
-        # Check if a turn is needed based on tolerance
-        if abs(angle_diff_to_face_target) > self.ANGLE_TOLERANCE_DEG:
-            self.logger.info(f"Turning from {current_angle:.2f}° to face target point ({target_x:.2f}, {target_y:.2f}). Required turn: {angle_diff_to_face_target:.2f}°")
-            
-            # Send the absolute target heading to the robot's TURN command
-            command_turn = f"TURN,{target_heading_for_move},{speed}" 
-            self.send_command_to_esp(command_turn)
-            
-            # --- Active Wait for Turn Completion ---
-            start_time = time.time()
-            timeout = 10.0 # Max time to wait for turn (e.g., 10 seconds)
-            
-            while time.time() - start_time < timeout:
-                if self._cancel_move_flag.is_set():
-                    self.logger.info("Movement cancelled during initial turn.")
-                    self.send_command_to_esp("STOP,0,0") # Stop the robot
-                    return # Exit the function
-              
-                current_angle = self.get_robot_sensor_value(0)
-                if current_angle is None:
-                    self.logger.warning("No angle data while waiting for turn. Continuing to wait...")
-                    time.sleep(0.1) # Small sleep to avoid busy-waiting without data
-                    continue
-                
-                # Normalize current angle for comparison
-                current_angle_normalized = (current_angle % 360 + 360) % 360
-
-                # Calculate the difference, accounting for 360-degree wrap around
-                angle_diff = abs(target_heading_for_move - current_angle_normalized)
-                if angle_diff > 180:
-                    angle_diff = 360 - angle_diff
-
-                if angle_diff <= self.ANGLE_TOLERANCE_DEG:
-                    self.logger.info(f"✅ Robot reached target angle within tolerance ({self.ANGLE_TOLERANCE_DEG}°). Current: {current_angle_normalized:.2f}° (Target: {target_heading_for_move:.2f}°)")
-                    break
-                time.sleep(0.05) # Check every 50ms
-            else:
-                self.logger.warning(f"❌ Robot did not reach initial turn target angle {target_heading_for_move:.2f}° within {timeout}s. Current: {current_angle_normalized:.2f}°")
-                self.send_command_to_esp("STOP,0,0") # Attempt to stop the robot
-                time.sleep(0.5)
-            
-            # Re-read current angle after turn (if it completed or timed out)
-            # This is important for the next step's calculations.
-            current_angle = self.get_robot_sensor_value(0)
-            if current_angle is None:
-                self.logger.error("Current angle not available after initial turn attempt.")
-                return
-
+        # Runs on the motion controller thread so the caller (e.g. the GUI) is not blocked.
+        # A new target preempts the move in progress.
+        self.motion_controller.submit(target_x, target_y, target_angle, speed)
 
-        # 2. Move to the target position
-        distance_to_target_in_mm = np.sqrt(delta_x**2 + delta_y**2)
-        if distance_to_target_in_mm > self.DISTANCE_TOLERANCE_MM: # Only move if significant distance
-            initial_robot_distance_in_mm = self.get_robot_sensor_value(1) # Assuming index 1 is distance
-            if initial_robot_distance_in_mm is None:
-                self.logger.error("Current robot distance not available for move command.")
-                return
-
-            # The MOVE command uses the *current* distance sensor reading as a baseline
-            # and adds the desired incremental movement. We need to define a target
-            # distance *value* that the robot's odometer should reach.
-            target_distance_value_in_mm = initial_robot_distance_in_mm + distance_to_target_in_mm
-            self.logger.info(f"Moving to target position. Distance needed: {distance_to_target_in_mm:.2f}mm. Target distance value: {target_distance_value_in_mm:.2f}")
-            command_move = f"MOVE,{target_distance_value_in_mm},{speed}"
-            self.send_command_to_esp(command_move)
-
-            # --- Active Wait for Move Completion ---
-            start_time = time.time()
-            timeout = distance_to_target_in_mm / speed * 2.0 if speed > 0 else 10.0 # Double estimated time as timeout
-            timeout = max(timeout, 5.0) # Ensure a minimum timeout
-
-            while time.time() - start_time < timeout:
-                current_distance_in_mm = self.get_robot_sensor_value(1)
-                
-                if current_distance_in_mm is None:
-                    self.logger.warning("No distance data while waiting for move. Continuing to wait...")
-                    time.sleep(0.1)
-                    continue
-
-                # Check if current distance is close to or past the target distance value
-                # We check for abs(diff) AND if current is >= target to ensure it doesn't stop short if it's very close
-                if abs(target_distance_value_in_mm - current_distance_in_mm) <= self.DISTANCE_TOLERANCE_MM or \
-                   current_distance_in_mm >= target_distance_value_in_mm: # Added check for reaching/passing target
-                    self.logger.info(f"✅ Robot reached target distance within tolerance ({self.DISTANCE_TOLERANCE_MM}mm) or passed. Current: {current_distance_in_mm:.2f}mm")
-                    break
-                
-                # Also check if the robot has overshot significantly (could indicate an issue)
-                if current_distance_in_mm > target_distance_value_in_mm + self.DISTANCE_TOLERANCE_MM * 5: # Overshot by more than 5x tolerance
-                    self.logger.warning(f"⚠️ Robot significantly overshot target distance. Current: {current_distance_in_mm:.2f}mm, Target: {target_distance_value_in_mm:.2f}mm")
-                    break # Stop waiting, proceed to next step
-                
-                time.sleep(0.05) # Check every 50ms
-            else:
-                self.logger.warning(f"❌ Robot did not reach target distance {target_distance_value_in_mm:.2f}mm within {timeout:.1f}s. Current: {current_distance_in_mm:.2f}mm")
-                self.send_command_to_esp("STOP,0,0")
-                time.sleep(0.5)
-
-
-        # 3. Final turn to the target angle
-        current_angle = self.get_robot_sensor_value(0) # Re-read current angle
-        if current_angle is None:
-            self.logger.error("Current robot angle not available for final turn.")
-            return
-
-        # Normalize current_angle for comparison
-        current_angle_normalized = (current_angle % 360 + 360) % 360
-        # Normalize target_angle (already done at function entry, but good for clarity)
-        target_angle_normalized = (target_angle % 360 + 360) % 360
-
-        # Calculate the angular difference for the shortest turn to the *final* target angle
-        angle_diff_final_turn = target_angle_normalized - current_angle_normalized
-        if angle_diff_final_turn > 180:
-            angle_diff_final_turn -= 360
-        elif angle_diff_final_turn < -180:
-            angle_diff_final_turn += 360
-
-        if abs(angle_diff_final_turn) > self.ANGLE_TOLERANCE_DEG: # Only turn if significant angle
-            self.logger.info(f"Performing final turn to target angle: {target_angle_normalized:.2f}°. Required turn: {angle_diff_final_turn:.2f}°")
-            
-            # Send the absolute final target angle to the robot's TURN command
-            command_final_turn = f"TURN,{target_angle_normalized},{speed}" 
-            self.send_command_to_esp(command_final_turn)
-            
-            # --- Active Wait for Final Turn Completion ---
-            start_time = time.time()
-            timeout = 10.0 # Max time to wait for turn
-            
-            while time.time() - start_time < timeout:
-                current_angle = self.get_robot_sensor_value(0)
-                if current_angle is None:
-                    self.logger.warning("No angle data while waiting for final turn. Continuing to wait...")
-                    time.sleep(0.1)
-                    continue
-
-                current_angle_normalized = (current_angle % 360 + 360) % 360
-
-                angle_diff = abs(target_angle_normalized - current_angle_normalized)
-                if angle_diff > 180:
-                    angle_diff = 360 - angle_diff
-
-                if angle_diff <= self.ANGLE_TOLERANCE_DEG:
-                    self.logger.info(f"✅ Robot reached final target angle within tolerance ({self.ANGLE_TOLERANCE_DEG}°). Current: {current_angle_normalized:.2f}° (Target: {target_angle_normalized:.2f}°)")
-                    break
-                time.sleep(0.05)
-            else:
-                self.logger.warning(f"❌ Robot did not reach final target angle {target_angle_normalized:.2f}° within {timeout}s. Current: {current_angle_normalized:.2f}°")
-                self.send_command_to_esp("STOP,0,0")
-                time.sleep(0.5)
-
-        self.logger.info("✅ Robot reached target position and angle.")
\ No newline at end of file
+    def move_to_target_by_click(self, target_x: float, target_y: float, target_angle: float, speed: float):
+        """
+        Initiates robot movement to a target specified by a mouse click.
+        This function is called by the view's mousePressEvent (see robot_view.CustomPlotWidget).
+        """
+        self.logger.info(f"Move to target requested via mouse click: X={target_x:.2f}mm, Y={target_y:.2f}mm, Angle={(target_angle % 360 + 360) % 360:.2f}° at speed {speed}")
+        self.move_to_target(target_x, target_y, target_angle, speed)
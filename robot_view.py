@@ -0,0 +1,238 @@
+import logging
+import math
+import threading
+import time
+import pyqtgraph as pg
+from PyQt5 import QtWidgets, QtCore, QtGui
+
+from robot_interface import RobotInterface
+
+
+class CustomPlotWidget(pg.PlotWidget):
+    """
+    A pg.PlotWidget subclass that handles keyboard events for robot control
+    and mouse click events for target navigation.
+    It passes key and mouse events to its associated RobotPlotView instance.
+    """
+
+    def __init__(self, robot_view, parent=None):
+        super().__init__(parent)
+        self.robot_view = robot_view  # Store reference to RobotPlotView
+        self.setFocusPolicy(QtCore.Qt.StrongFocus)  # Essential for receiving key events
+        self.move_distance = 20  # Example value (cm), adjust as needed
+        self.turn_angle = 20  # Example value (degrees), adjust as needed
+        self.speed = 50  # Example value (unit/s), adjust as needed
+
+    def keyPressEvent(self, event: QtGui.QKeyEvent):
+        # Delegate the actual command logic to the RobotPlotView
+        # Pass the event and key-specific parameters (move_distance, turn_angle, speed)
+        command_sent = self.robot_view._handle_key_press(
+            event, self.move_distance, self.turn_angle, self.speed
+        )
+        if not command_sent:
+            super().keyPressEvent(event)
+
+    def mousePressEvent(self, event: QtGui.QMouseEvent):
+        """
+        Handles mouse press events on the plot.
+        If a left-click occurs, it attempts to move the robot to that location.
+        """
+        robot = self.robot_view.robot
+        if event.button() == QtCore.Qt.LeftButton:
+            # Get the position of the mouse click in the plot's view coordinates
+            pos = self.plotItem.vb.mapSceneToView(event.pos())
+            target_x = pos.x()
+            target_y = pos.y()
+
+            self.robot_view.logger.info(f"Mouse clicked at plot coordinates: X={target_x:.2f}, Y={target_y:.2f}")
+
+            # Optionally, you can prompt for an angle or use the current robot angle
+            # For simplicity, we'll set a default target angle (e.g., current robot angle or 0 degrees)
+            # A more advanced UX could involve a click and drag to set angle or two clicks.
+            # The heading is taken from the pose estimate (map frame, clockwise degrees like the
+            # robot yaw); the controller converts it to the yaw frame of the mobile base.
+            if robot.get_robot_sensor_value(0) is None:
+                self.robot_view.logger.warning("Cannot set target via mouse: current robot angle not available for determining target orientation.")
+                # Fallback to 0 or arbitrary angle if current angle is crucial for the move logic
+                target_angle = 0.0 # Default angle
+            else:
+                _, _, theta, _ = robot.pose_estimator.latest_pose()
+                target_angle = -math.degrees(theta) # Maintain current robot's orientation relative to target
+
+            robot.move_to_target_by_click(target_x, target_y, target_angle, self.speed)
+            event.accept() # Indicate that the event has been handled
+        else:
+            super().mousePressEvent(event) # Pass other mouse events up the chain
+
+
+class RobotPlotView:
+    """
+    PyQtGraph view of a RobotInterface: robot path, current pose and ToF map,
+    plus keyboard and mouse control.
+
+    The view subscribes to the robot core and only reads its state. Rendering is
+    driven by a QTimer and skipped when the core reported no change since the
+    last frame.
+    """
+
+    def __init__(self, robot: RobotInterface, refresh_interval_ms: int = 10):
+        self.robot = robot
+        self.logger = logging.getLogger(__name__)
+
+        self.prev_angle = 0.0
+        self._last_drawn_pose = None # (x, y, angle_deg) of the last rendered position marker
+        self._dirty = threading.Event() # Set by the core whenever new data was processed
+        self._dirty.set()
+
+        # PyQtGraph plotting setup
+        self.logger.info("📈 Initializing live plot window...")
+        self.plot_widget = CustomPlotWidget(self) # Pass self to CustomPlotWidget
+        self.plot_widget.setWindowTitle("Robot Navigation Map")
+        self.plot_widget.setLabel('bottom', "X Position", units='mm')
+        self.plot_widget.setLabel('left', "Y Position", units='mm')
+        self.plot_widget.showGrid(x=True, y=True)
+        self.plot_widget.setAspectLocked(True) # Ensures proper scaling
+
+        # Initialize plot items
+        self.path_curve = self.plot_widget.plot(
+            *robot.pose_estimator.path(),
+            pen=pg.mkPen(color='b', width=2), symbol='o', symbolSize=5, name='Robot Path'
+        )
+        self.current_pos_scatter = pg.ScatterPlotItem(
+            size=12, pen=pg.mkPen(None), brush=pg.mkBrush(255, 0, 0), symbol='o', name='Current Position'
+        )
+        self.plot_widget.addItem(self.current_pos_scatter)
+        self.end_points_scatter = pg.ScatterPlotItem(
+            x=[], y=[], pen=pg.mkPen('g', width=1), brush=pg.mkBrush('g'),
+            size=5, symbol='s', name='ToF Endpoints'
+        )
+        self.plot_widget.addItem(self.end_points_scatter)
+
+        self.arrow = pg.ArrowItem(angle=0, headLen=40, headWidth=10, tailLen=10, brush='r', pxMode =True)
+        self.plot_widget.addItem(self.arrow)
+
+        self.robot_info_text = pg.TextItem(text="", anchor=(0, 0), color=(255, 255, 255))
+        self.plot_widget.addItem(self.robot_info_text)
+        self.robot_info_text.setPos(10, -30)
+
+        robot.subscribe(self._on_robot_update)
+
+        # QTimer for periodic plot updates
+        self.timer = QtCore.QTimer()
+        self.timer.setInterval(refresh_interval_ms)
+        self.timer.timeout.connect(self.update_plot)
+        self.timer.start()
+
+    def _on_robot_update(self):
+        """Called by the robot core (from its processing thread) after new data was processed."""
+        self._dirty.set()
+
+    def show(self):
+        self.plot_widget.show()
+        self.plot_widget.setFocus()
+
+    def close(self):
+        self.timer.stop()
+        self.robot.unsubscribe(self._on_robot_update)
+
+    def update_plot(self):
+        """Updates the 2D plot with the latest robot position and ToF data."""
+        if not self._dirty.is_set():
+            return
+        self._dirty.clear()
+        frame_start = time.perf_counter()
+        robot = self.robot
+
+        # Update robot path line from the filtered pose history
+        path_x, path_y = robot.pose_estimator.path()
+        self.path_curve.setData(path_x, path_y)
+
+        # Update current robot position marker
+        if len(path_x) > 0:
+          x, y, theta, _ = robot.pose_estimator.latest_pose()
+          angle_deg = -math.degrees(theta) # Map-frame heading, clockwise like the robot yaw
+
+          # Check if robot position or angle has changed
+          if self._last_drawn_pose != (x, y, angle_deg):
+            self._last_drawn_pose = (x, y, angle_deg)
+            self.prev_angle = angle_deg
+            self.current_pos_scatter.setData([x], [y])
+            self.arrow.setPos(x, y)
+            self.arrow.setStyle(angle=angle_deg + 180) # Adjust for PyQTGraph's arrow orientation
+
+        else:
+            self.current_pos_scatter.clear()
+            self.arrow.hide()  # Hide the arrow if no position data
+            self.robot_info_text.setText("")  # Clear the text if no position data
+
+        # Update ToF endpoints (one point per occupied map cell)
+        if len(robot.end_points) > 0:
+            tof_x, tof_y, _ = robot.end_points.arrays()
+            self.end_points_scatter.setData(tof_x, tof_y)
+        else:
+            self.end_points_scatter.clear()
+
+        self.plot_widget.autoRange()
+        robot.report_frame_time(time.perf_counter() - frame_start)
+
+        tracer = robot.tracer
+        if tracer is not None:
+            tracer.mark_drawn()
+        # self.plot_widget.setXRange(-1000, 1000) # Example: x from -1000mm to +1000mm
+        # self.plot_widget.setYRange(-1000, 1000) # Example: y from -1000mm to +1000mm
+
+
+    def _handle_key_press(self, event: QtGui.QKeyEvent, move_distance: float, turn_angle: float, speed: float) -> bool:
+        """
+        Processes key press events to generate and send robot commands.
+        Called by the CustomPlotWidget's keyPressEvent.
+
+        Args:
+            event: The QtGui.QKeyEvent object.
+            move_distance: The distance to move forward/backward.
+            turn_angle: The angle to turn left/right.
+            speed: The speed for movement/turning.
+
+        Returns:
+            True if a command was sent, False otherwise.
+        """
+        robot = self.robot
+        key_actions = {
+            QtCore.Qt.Key_W: lambda: robot.move_by(move_distance, speed),
+            QtCore.Qt.Key_S: lambda: robot.move_by(-move_distance, speed),
+            QtCore.Qt.Key_A: lambda: robot.turn_by(-turn_angle, speed),
+            QtCore.Qt.Key_D: lambda: robot.turn_by(turn_angle, speed),
+            QtCore.Qt.Key_R: robot.stop_robot,
+            QtCore.Qt.Key_G: lambda: self.move_to_target_prompt(speed), # 'G' key for Go to Target (manual input)
+        }
+
+        action = key_actions.get(event.key())
+        if action is None:
+            return False  # Key not handled by robot commands
+        result = action()
+        return result is not False
+
+    def move_to_target_prompt(self, speed: float):
+        """
+        Prompts the user for target x, y coordinates and angle,
+        then initiates the movement to that target.
+        """
+        try:
+            target_x_str, ok_x = QtWidgets.QInputDialog.getText(self.plot_widget, 'Target X', 'Enter target X position (mm):')
+            if not ok_x: return
+            target_x = float(target_x_str)
+
+            target_y_str, ok_y = QtWidgets.QInputDialog.getText(self.plot_widget, 'Target Y', 'Enter target Y position (mm):')
+            if not ok_y: return
+            target_y = float(target_y_str)
+
+            target_angle_str, ok_angle = QtWidgets.QInputDialog.getText(self.plot_widget, 'Target Angle', 'Enter target angle (degrees, 0-360):')
+            if not ok_angle: return
+            target_angle = float(target_angle_str)
+
+            self.robot.move_to_target(target_x, target_y, target_angle, speed)
+
+        except ValueError:
+            self.logger.error("Invalid input for target coordinates or angle. Please enter numbers.")
+        except Exception as e:
+            self.logger.error(f"Error getting target input: {e}")
@@ -0,0 +1,371 @@
+import collections
+import logging
+import math
+import threading
+import time
+import numpy as np
+
+from point_map import SpatialHashPointMap
+
+
+class GridNeighborIndex:
+    """
+    Nearest-neighbour lookup over the cells of a SpatialHashPointMap.
+
+    The packed cell keys are sorted once per rebuild; a query looks up the
+    (2r+1)^2 cells around each point with a single vectorized searchsorted call
+    and keeps the closest cell representative. Exact within `radius`.
+
+    rebuild() also estimates a surface normal per map point from its neighbours
+    (principal axis of their scatter) for point-to-line matching. Points on
+    corners or isolated points get a NaN normal.
+    """
+
+    def __init__(self, point_map: SpatialHashPointMap, radius: float, normal_radius: float = None):
+        self.point_map = point_map
+        self.reach = max(1, math.ceil(radius / point_map.cell_size))
+        offsets = np.arange(-self.reach, self.reach + 1, dtype=np.int64)
+        self._offset_x, self._offset_y = (a.ravel() for a in np.meshgrid(offsets, offsets))
+        self.normal_radius = normal_radius or radius
+        self.rebuild()
+
+    def rebuild(self):
+        """Re-indexes the point map, e.g. after new points were added."""
+        xs, ys, _ = self.point_map.arrays()
+        keys = self.point_map.cell_keys(xs, ys)
+        order = np.argsort(keys)
+        self._keys = keys[order]
+        self.points = np.column_stack((xs[order], ys[order]))
+        self.normals = self._estimate_normals(self.points)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _candidates(self, points: np.ndarray) -> tuple:
+        """Returns the (n, k) map slots of the cells around each point and which of them exist."""
+        size = self.point_map.cell_size
+        ix = np.floor(points[:, 0] / size).astype(np.int64)[:, None] + self._offset_x
+        iy = np.floor(points[:, 1] / size).astype(np.int64)[:, None] + self._offset_y
+        keys = (ix << 32) | (iy & 0xFFFFFFFF)
+        slots = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+        return slots, self._keys[slots] == keys
+
+    def _estimate_normals(self, points: np.ndarray) -> np.ndarray:
+        normals = np.full_like(points, np.nan)
+        if len(points) < 3:
+            return normals
+        slots, found = self._candidates(points)
+        neighbours = self.points[slots] - points[:, None, :]
+        weights = found & ((neighbours ** 2).sum(axis=2) <= self.normal_radius ** 2)
+        count = weights.sum(axis=1)
+        mean = (neighbours * weights[..., None]).sum(axis=1) / np.maximum(count, 1)[:, None]
+        centered = (neighbours - mean[:, None, :]) * weights[..., None]
+        sxx = (centered[..., 0] ** 2).sum(axis=1)
+        syy = (centered[..., 1] ** 2).sum(axis=1)
+        sxy = (centered[..., 0] * centered[..., 1]).sum(axis=1)
+        # Principal axis of the 2x2 scatter matrix; the normal is perpendicular to it
+        axis = 0.5 * np.arctan2(2 * sxy, sxx - syy)
+        spread = np.sqrt((sxx - syy) ** 2 + 4 * sxy ** 2)
+        smallest, largest = (sxx + syy - spread) / 2, (sxx + syy + spread) / 2
+        # Only well-defined lines: enough neighbours and a thin scatter
+        line = (count >= 3) & (smallest <= 0.1 * largest) & (largest > 0)
+        normals[line, 0] = -np.sin(axis[line])
+        normals[line, 1] = np.cos(axis[line])
+        return normals
+
+    def nearest(self, points: np.ndarray) -> tuple:
+        """
+        Returns (slots, squared distances) of the nearest map point of each of the
+        (n, 2) query points; index self.points and self.normals with the slots.
+        Points without a neighbour within the index radius get an infinite distance.
+        """
+        n = len(points)
+        if len(self._keys) == 0 or n == 0:
+            return np.zeros(n, dtype=np.int64), np.full(n, np.inf)
+        slots, found = self._candidates(points)
+        d2 = np.where(found, ((self.points[slots] - points[:, None, :]) ** 2).sum(axis=2), np.inf)
+        best = d2.argmin(axis=1)
+        rows = np.arange(n)
+        return slots[rows, best], d2[rows, best]
+
+
+def _rotation(theta: float) -> np.ndarray:
+    c, s = math.cos(theta), math.sin(theta)
+    return np.array(((c, -s), (s, c)))
+
+
+def _point_to_point_step(p: np.ndarray, q: np.ndarray) -> tuple:
+    """Closed-form 2D rigid alignment of paired points: the rotation angle maximizing sum(q . R p)."""
+    p_mean, q_mean = p.mean(axis=0), q.mean(axis=0)
+    p_c, q_c = p - p_mean, q - q_mean
+    d_theta = math.atan2(float((p_c[:, 0] * q_c[:, 1] - p_c[:, 1] * q_c[:, 0]).sum()), float((p_c * q_c).sum()))
+    return d_theta, q_mean - _rotation(d_theta) @ p_mean
+
+
+def _point_to_line_step(p: np.ndarray, q: np.ndarray, normals: np.ndarray, min_information: float) -> tuple:
+    """
+    One Gauss-Newton step minimizing the distances of p to the lines through q.
+    Directions the lines do not constrain (e.g. along a corridor) are left
+    unchanged instead of drifting.
+    """
+    center = p.mean(axis=0)
+    arm = p - center
+    scale = max(float(np.sqrt((arm ** 2).sum(axis=1).mean())), 1e-6)  # Makes the rotation column unitless
+    jacobian = np.column_stack((normals, (normals[:, 1] * arm[:, 0] - normals[:, 0] * arm[:, 1]) / scale))
+    residuals = ((p - q) * normals).sum(axis=1)
+    information = jacobian.T @ jacobian
+    eigenvalues, eigenvectors = np.linalg.eigh(information)
+    usable = eigenvalues >= min_information * len(p)
+    gradient = eigenvectors.T @ (jacobian.T @ residuals)
+    delta = eigenvectors[:, usable] @ (-gradient[usable] / eigenvalues[usable])
+    d_theta = float(delta[2]) / scale
+    rotation = _rotation(d_theta)
+    # Rotation about the centroid, expressed as rotation about the origin plus translation
+    return d_theta, center - rotation @ center + delta[:2]
+
+
+def icp(source: np.ndarray, index: GridNeighborIndex, max_distance: float, max_iterations: int = 20,
+        min_matches: int = 20, method: str = "point_to_line", deadline: float = None) -> dict:
+    """
+    ICP aligning the (n, 2) source points to the indexed map.
+
+    Each iteration pairs every source point with its nearest map point within
+    max_distance, then solves for the rigid motion of the pairs: in closed form
+    for "point_to_point", or by minimizing the distance to the map's local line
+    for "point_to_line" (pairs without a map normal are dropped).
+
+    Returns:
+        A dict with the rigid transform (theta, tx, ty) mapping source to map
+        coordinates (rotation about the origin), the number of matched points,
+        their RMS distance, the iterations run and whether it converged. theta is
+        None if there were never enough matches.
+    """
+    theta, translation = 0.0, np.zeros(2)
+    result = {"theta": None, "tx": 0.0, "ty": 0.0, "matches": 0, "rms": math.inf,
+              "iterations": 0, "converged": False}
+    max_d2 = max_distance ** 2
+    for iteration in range(1, max_iterations + 1):
+        moved = source @ _rotation(theta).T + translation
+        slots, d2 = index.nearest(moved)
+        matched = d2 <= max_d2
+        if method == "point_to_line":
+            normals = index.normals[slots]
+            matched &= ~np.isnan(normals[:, 0])
+        count = int(matched.sum())
+        result["iterations"] = iteration
+        if count < min_matches:
+            break
+        p, q = moved[matched], index.points[slots[matched]]
+        if method == "point_to_line":
+            d_theta, d_translation = _point_to_line_step(p, q, normals[matched], min_information=0.05)
+        else:
+            d_theta, d_translation = _point_to_point_step(p, q)
+        theta += d_theta
+        translation = _rotation(d_theta) @ translation + d_translation
+        result.update(theta=theta, tx=float(translation[0]), ty=float(translation[1]), matches=count,
+                      rms=math.sqrt(float(d2[matched].mean())))
+        if abs(d_theta) < 1e-5 and float(np.hypot(*d_translation)) < 1e-3:
+            result["converged"] = True
+            break
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+    return result
+
+
+class ScanMatcher:
+    """
+    Corrects odometry drift by registering recent ToF scans against the older map.
+
+    The last `window` scans are aggregated into a local submap (8 beams per scan
+    are too sparse to match alone) and aligned with ICP against a reference map
+    built from the scans that have left the window, so the submap is never matched
+    against itself. An accepted alignment is applied to the current pose as an
+    absolute pose measurement of the PoseEKF and to the window, so later poses and
+    the path continue from the corrected pose.
+
+    Matching runs in its own worker thread with a time budget per match; add_scan()
+    only appends to the window, so the receive and render threads never block on it.
+    The reference index is rebuilt outside the lock and swapped in when it is ready.
+    """
+
+    def __init__(self, pose_estimator, window: int = 30, match_every: int = 10, cell_size: float = 2.0,
+                 max_correspondence: float = 6.0, max_iterations: int = 20, min_matches: int = 40,
+                 max_correction: float = 10.0, max_rotation_deg: float = 5.0, time_budget: float = 0.1,
+                 position_std: float = 2.0, heading_std_deg: float = 1.0):
+        """
+        Args:
+            pose_estimator: The PoseEKF that receives the corrections.
+            window: Number of most recent scans in the submap.
+            match_every: Run a match after this many new scans.
+            cell_size: Resolution of the reference map in map units (cm).
+            max_correspondence: Maximum distance of a matched point pair in cm.
+            max_iterations: ICP iteration limit.
+            min_matches: Minimum number of matched points for a usable alignment.
+            max_correction: Alignments that shift the submap further than this (cm) are rejected.
+            max_rotation_deg: Alignments that rotate the submap more than this are rejected.
+            time_budget: Seconds one match may take; ICP stops iterating when it is used up.
+            position_std: Standard deviation of an accepted correction in cm.
+            heading_std_deg: Standard deviation of an accepted heading correction in degrees.
+        """
+        self.pose_estimator = pose_estimator
+        self.window = window
+        self.match_every = match_every
+        self.max_correspondence = max_correspondence
+        self.max_iterations = max_iterations
+        self.min_matches = min_matches
+        self.max_correction = max_correction
+        self.max_rotation = math.radians(max_rotation_deg)
+        self.time_budget = time_budget
+        self.position_var = position_std ** 2
+        self.heading_var = math.radians(heading_std_deg) ** 2
+        self.logger = logging.getLogger(__name__)
+
+        # Recent scans: [x, y, theta, points in the robot frame (n, 2)]
+        self._scans = collections.deque()
+        self.reference = SpatialHashPointMap(cell_size=cell_size)
+        self._index = GridNeighborIndex(self.reference, max_correspondence)
+        self._index_dirty = False
+        self._new_scans = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+
+        # Statistics
+        self.matches_accepted = 0
+        self.matches_rejected = 0
+        self.last_result = None
+        self.last_duration = 0.0
+        self.last_rebuild_duration = 0.0
+
+    def add_scan(self, x: float, y: float, theta: float, distances, relative_angles):
+        """
+        Adds a projected scan: the pose it was projected from and its valid beams.
+        Called from the processing thread; never blocks on matching.
+        """
+        distances = np.asarray(distances, dtype=np.float64)
+        if len(distances) == 0:
+            return
+        points = np.column_stack((distances * np.cos(relative_angles), distances * np.sin(relative_angles)))
+        with self._lock:
+            self._scans.append([x, y, theta, points])
+            while len(self._scans) > self.window:
+                self._retire(self._scans.popleft())
+            self._new_scans += 1
+            due = self._new_scans >= self.match_every
+        if due:
+            self._wakeup.set()
+
+    def _retire(self, scan):
+        """Moves a scan that left the window into the reference map. Caller must hold the lock."""
+        world = self._to_world(*scan)
+        self.reference.add_points(world[:, 0], world[:, 1])
+        self._index_dirty = True
+
+    @staticmethod
+    def _to_world(x, y, theta, points) -> np.ndarray:
+        return points @ _rotation(theta).T + (x, y)
+
+    def match(self) -> dict:
+        """
+        Runs one match of the current window against the reference map and applies
+        the correction if it is accepted. Can be called directly instead of start()
+        for synchronous (deterministic) processing.
+
+        Returns:
+            The ICP result with an added "accepted" flag, or None if there was not
+            enough data to match.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            self._new_scans = 0
+            if len(self._scans) < self.window:
+                return None
+            submap = np.concatenate([self._to_world(*scan) for scan in self._scans])
+            rebuild = self._index_dirty
+            self._index_dirty = False
+            index = self._index
+        if rebuild:
+            # Re-indexing takes seconds for a large reference map, so add_scan() must not
+            # wait for it. Scans retired meanwhile mark the new index dirty again.
+            rebuild_start = time.perf_counter()
+            index = GridNeighborIndex(self.reference, self.max_correspondence)
+            with self._lock:
+                self._index = index
+            self.last_rebuild_duration = time.perf_counter() - rebuild_start
+        if len(index) < self.min_matches or len(submap) < self.min_matches:
+            return None
+
+        # The rebuild counts against the time budget; ICP still runs at least one iteration
+        result = icp(submap, index, self.max_correspondence, self.max_iterations,
+                     self.min_matches, deadline=start + self.time_budget)
+        theta = result["theta"]
+        shift = math.hypot(result["tx"], result["ty"])
+        result["accepted"] = (theta is not None and abs(theta) <= self.max_rotation
+                              and shift <= self.max_correction)
+        if result["accepted"]:
+            self._apply(theta, result["tx"], result["ty"])
+            self.matches_accepted += 1
+        else:
+            self.matches_rejected += 1
+        self.last_result = result
+        self.last_duration = time.perf_counter() - start
+        if self.last_duration > self.time_budget:
+            self.logger.warning("⏱️ Scan match took %.0f ms (budget %.0f ms, index rebuild %.0f ms).",
+                                self.last_duration * 1e3, self.time_budget * 1e3,
+                                self.last_rebuild_duration * 1e3 if rebuild else 0.0)
+        self.logger.debug("🧩 Scan match: %s", result)
+        return result
+
+    def _apply(self, theta: float, tx: float, ty: float):
+        """
+        Feeds a world-frame rigid correction of the window to the pose estimator and
+        moves the window by the part of it that the estimator accepted.
+        """
+        x, y, heading, _ = self.pose_estimator.latest_pose()
+        corrected_x, corrected_y = _rotation(theta) @ (x, y) + (tx, ty)
+        self.pose_estimator.correct_pose(float(corrected_x), float(corrected_y), heading + theta,
+                                         self.position_var, self.heading_var)
+        new_x, new_y, new_heading, _ = self.pose_estimator.latest_pose()
+        applied = new_heading - heading
+        rotation = _rotation(applied)
+        shift = np.array((new_x, new_y)) - rotation @ (x, y)
+        with self._lock:
+            for scan in self._scans:
+                scan[0], scan[1] = rotation @ (scan[0], scan[1]) + shift
+                scan[2] += applied
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="ScanMatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _run(self):
+        while self._running:
+            if not self._wakeup.wait(timeout=0.5):
+                continue
+            self._wakeup.clear()
+            if not self._running:
+                break
+            try:
+                self.match()
+            except Exception as e:
+                self.logger.error(f"❌ Scan matching failed: {e}", exc_info=True)
+
+    def stats(self) -> dict:
+        """Returns match counters, the last result and its duration."""
+        return {
+            "accepted": self.matches_accepted,
+            "rejected": self.matches_rejected,
+            "reference_cells": len(self.reference),
+            "last_result": self.last_result,
+            "last_duration_s": self.last_duration,
+            "last_rebuild_s": self.last_rebuild_duration,
+        }
@@ -0,0 +1,136 @@
+"""
+Binary telemetry wire format.
+
+A binary datagram carries one or more fixed-size frames back to back. Every
+frame starts with MAGIC (two bytes that can never start a valid UTF-8 text
+datagram, so binary and MF/RB text telemetry can be told apart from the first
+bytes) followed by a format version. All fields are little-endian and packed.
+
+Version 1 (38 bytes):
+
+    offset  type      field
+    0       u8[2]     magic (0xA5 0x5A)
+    2       u8        version (1)
+    3       u8        flags (reserved, 0)
+    4       i16[8]    ToF ranges in mm, -1 for an invalid reading
+    20      i16       robotYawDegrees            (telemetryPacket)
+    22      i32       robotDistanceCm            (telemetryPacket)
+    26      u8        ultrasonicDistanceCm       (telemetryPacket)
+    27      u8        leftIR_Detected            (telemetryPacket)
+    28      u8        rightIR_Detected           (telemetryPacket)
+    29      u8        padding
+    30      i32       leftMotorEncoderValue      (telemetryPacket)
+    34      i32       rightMotorEncoderValue     (telemetryPacket)
+
+Version 2 (46 bytes) inserts a sequence header after the flags byte and is
+otherwise identical to version 1 (all later offsets shift by 8):
+
+    4       u32       sequence number
+    8       u32       sender timestamp (ESP32 millis())
+"""
+import struct
+import numpy as np
+
+MAGIC = b"\xA5\x5A"
+
+FRAME_V1 = np.dtype([
+    ("magic", "u1", (2,)),
+    ("version", "u1"),
+    ("flags", "u1"),
+    ("tof", "<i2", (8,)),
+    ("yaw", "<i2"),
+    ("distance", "<i4"),
+    ("ultrasonic", "u1"),
+    ("left_ir", "u1"),
+    ("right_ir", "u1"),
+    ("pad", "u1"),
+    ("left_encoder", "<i4"),
+    ("right_encoder", "<i4"),
+])
+
+FRAME_V2 = np.dtype([
+    ("magic", "u1", (2,)),
+    ("version", "u1"),
+    ("flags", "u1"),
+    ("seq", "<u4"),
+    ("timestamp_ms", "<u4"),
+] + [(name, FRAME_V1.fields[name][0]) for name in FRAME_V1.names[3:]])
+
+FRAME_DTYPES = {1: FRAME_V1, 2: FRAME_V2}
+
+# Robot value order, identical to the comma separated RB text line
+ROBOT_FIELDS = ("yaw", "distance", "ultrasonic", "left_ir", "right_ir", "left_encoder", "right_encoder")
+
+_FRAME_V1_STRUCT = struct.Struct("<2sBB8hhiBBBxii")
+_FRAME_V2_STRUCT = struct.Struct("<2sBBII8hhiBBBxii")
+assert _FRAME_V1_STRUCT.size == FRAME_V1.itemsize
+assert _FRAME_V2_STRUCT.size == FRAME_V2.itemsize
+
+
+class TelemetryDecodeError(ValueError):
+    """Raised when a binary telemetry buffer cannot be decoded."""
+
+
+def is_binary_frame(data) -> bool:
+    """Returns True if the datagram starts with the binary telemetry magic."""
+    return len(data) >= 2 and data[0] == MAGIC[0] and data[1] == MAGIC[1]
+
+
+def decode_frames(data) -> np.ndarray:
+    """
+    Decodes a buffer of concatenated frames of the same version without copying.
+
+    Args:
+        data: bytes, bytearray or memoryview holding whole frames.
+
+    Returns:
+        A structured array with one record per frame.
+
+    Raises:
+        TelemetryDecodeError: If the version is unknown, the length is not a multiple
+            of the frame size or a frame has a bad magic/version.
+    """
+    if len(data) < 3 or not is_binary_frame(data):
+        raise TelemetryDecodeError("Missing binary telemetry magic.")
+    dtype = FRAME_DTYPES.get(data[2])
+    if dtype is None:
+        raise TelemetryDecodeError(f"Unsupported binary telemetry version {data[2]}.")
+    if len(data) % dtype.itemsize:
+        raise TelemetryDecodeError(
+            f"Buffer length {len(data)} is not a multiple of the v{data[2]} frame size {dtype.itemsize}."
+        )
+    frames = np.frombuffer(data, dtype=dtype)
+    if len(frames) > 1 and (np.any(frames["magic"] != np.frombuffer(MAGIC, dtype="u1"))
+                            or np.any(frames["version"] != data[2])):
+        raise TelemetryDecodeError("Corrupt frame in binary telemetry buffer.")
+    return frames
+
+
+def tof_values(frames: np.ndarray) -> np.ndarray:
+    """Returns the ToF ranges of all frames as a float (n, 8) array in mm."""
+    return frames["tof"].astype(np.float64)
+
+
+def robot_values(frames: np.ndarray) -> np.ndarray:
+    """Returns the telemetryPacket fields of all frames as a float (n, 7) array (RB order)."""
+    out = np.empty((len(frames), len(ROBOT_FIELDS)))
+    for i, name in enumerate(ROBOT_FIELDS):
+        out[:, i] = frames[name]
+    return out
+
+
+def encode_frame(tof, robot, seq: int = None, timestamp_ms: int = 0) -> bytes:
+    """
+    Encodes one frame; version 2 if a sequence number is given, version 1 otherwise.
+
+    Args:
+        tof: 8 ToF ranges in mm.
+        robot: The 7 telemetryPacket values in RB order.
+        seq: Optional frame sequence number.
+        timestamp_ms: Sender timestamp, only used with a sequence number.
+    """
+    tof = (int(round(v)) for v in tof)
+    robot = (int(round(v)) for v in robot)
+    if seq is None:
+        return _FRAME_V1_STRUCT.pack(MAGIC, 1, 0, *tof, *robot)
+    return _FRAME_V2_STRUCT.pack(MAGIC, 2, 0, seq % (1 << 32), timestamp_ms % (1 << 32), *tof, *robot)
@@ -0,0 +1,388 @@
+"""
+Performance benchmarks for the host pipeline.
+
+Measures
+  - parse throughput of parse_tof_data / parse_robot_data / _parse_received_data (lines/s),
+  - receive-loop capacity against a localhost sender (blocking and batched ingest),
+  - per-scan cost of _calculate_points_for_plot,
+  - replay throughput of a recorded flight log (--log),
+  - particle-filter localization update rate with 5k particles,
+  - pose graph optimization time for a 1000-keyframe loop,
+  - click-to-go path planning time on a 500 x 500 cell occupancy grid,
+  - update_plot frame time at 1k/10k/100k map points (offscreen Qt, skipped without PyQt5),
+
+and writes the results as JSON. With --baseline, results are compared against a
+previous run and the script exits with status 1 if any metric regressed by more
+than --tolerance:
+
+    python tests/test_Benchmarks/benchmark.py --output baseline.json
+    python tests/test_Benchmarks/benchmark.py --baseline baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, REPO_ROOT)
+
+import numpy as np
+from robot_interface import RobotInterface
+import telemetry_codec
+
+
+def make_robot(**kwargs) -> RobotInterface:
+    # Commands are never sent by the benchmarks; the send address is a placeholder.
+    return RobotInterface('127.0.0.1', 0, '127.0.0.1', 12345, **kwargs)
+
+
+def best_rate(func, count: int, repeat: int) -> float:
+    """Runs func (which handles count items) repeat times and returns the best items/s."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return count / best
+
+
+def synthetic_lines(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    tof = rng.integers(50, 2000, size=(n, 8))
+    tof_lines = ["MF\t" + "\t".join(map(str, row)) for row in tof]
+    robot_lines = [f"RB\t{i % 360},{i},120,0,0,{20 * i},{20 * i}" for i in range(n)]
+    datagrams = [f"{a}\r\n{b}" for a, b in zip(tof_lines, robot_lines)]
+    return tof_lines, robot_lines, datagrams
+
+
+def bench_parse(n: int, repeat: int) -> dict:
+    tof_lines, robot_lines, datagrams = synthetic_lines(n)
+    robot = make_robot()
+
+    def parse_tof():
+        robot._last_tof_payload = None
+        for line in tof_lines:
+            robot.parse_tof_data(line)
+        robot._pending_scans.clear()
+
+    def parse_robot():
+        robot.odometry.reset()
+        robot.pose_estimator.reset()
+        for line in robot_lines:
+            robot.parse_robot_data(line)
+
+    def parse_datagram():
+        robot.odometry.reset()
+        robot.pose_estimator.reset()
+        for data in datagrams:
+            robot._parse_received_data(data)
+        robot._pending_scans.clear()
+
+    results = {
+        "parse_tof_lines_per_s": best_rate(parse_tof, n, repeat),
+        "parse_robot_lines_per_s": best_rate(parse_robot, n, repeat),
+        "parse_datagram_per_s": best_rate(parse_datagram, n, repeat),
+    }
+    robot.close()
+    return results
+
+
+def bench_receive(mode: str, data_format: str, duration: float) -> dict:
+    """Blasts prebuilt datagrams at a receiving RobotInterface and counts what it parsed."""
+    robot = RobotInterface('127.0.0.1', 0, '127.0.0.1', 12345, ingest_mode=mode, recv_buffer_size=1 << 20)
+    robot.start_receiving()
+    port = robot.udp_socket.getsockname()[1]
+
+    _, _, text = synthetic_lines(1024, seed=1)
+    rng = np.random.default_rng(2)
+    if data_format == "binary":
+        payloads = [telemetry_codec.encode_frame(rng.integers(50, 2000, 8), [i % 360, i, 120, 0, 0, 20 * i, 20 * i])
+                    for i in range(1024)]
+    else:
+        payloads = [d.encode() for d in text]
+
+    robot.odometry.reset()
+    robot.pose_estimator.reset()
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sent = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        for payload in payloads:
+            try:
+                sender.sendto(payload, ('127.0.0.1', port))
+                sent += 1
+            except OSError:
+                pass
+    time.sleep(0.2)  # Let the receiver drain its queue
+    parsed = robot.odometry.sample_count
+    robot.close()
+    sender.close()
+    return {
+        f"receive_{mode}_{data_format}_datagrams_per_s": parsed / duration,
+        f"receive_{mode}_{data_format}_loss_rate": 1 - parsed / sent if sent else 0.0,
+    }
+
+
+def bench_scan_projection(scans: int, repeat: int) -> dict:
+    robot = make_robot()
+    rng = np.random.default_rng(3)
+    # A pose history to interpolate in, then scans spread over it
+    for i in range(scans):
+        robot.pose_estimator.update((i * 0.5) % 360, i * 0.2, i * 0.01)
+    times = np.arange(scans) * 0.01 + 0.005
+    tof = rng.uniform(100, 2000, size=(scans, 8))
+
+    def project():
+        robot._pending_scans.clear()
+        robot._pending_scans.extend(zip(times[-robot._pending_scans.maxlen:], tof))
+        robot._calculate_points_for_plot()
+
+    project()  # Warm-up: grows the map to its final extent
+    count = min(scans, robot._pending_scans.maxlen)
+    rate = best_rate(project, count, repeat)
+    robot.close()
+    return {"scan_projection_us_per_scan": 1e6 / rate}
+
+
+def bench_replay(log_path: str) -> dict:
+    from replay import ReplayEngine
+    engine = ReplayEngine(log_path)
+    stats = engine.run()
+    engine.robot.close()
+    return {
+        "replay_datagrams_per_s": stats["datagrams"] / stats["wall_time_s"] if stats["wall_time_s"] else 0.0,
+        "replay_speedup": stats["speedup"],
+    }
+
+
+def bench_localization(particles: int, updates: int) -> dict:
+    from localization import LikelihoodField, MonteCarloLocalizer
+    # A 300 x 200 cm room at 2 cm resolution
+    occupied = np.zeros((150, 100), dtype=bool)
+    occupied[[0, -1], :] = True
+    occupied[:, [0, -1]] = True
+    field = LikelihoodField(occupied, ~occupied, (-75, -50), 2.0)
+    mcl = MonteCarloLocalizer(field, n_particles=particles, seed=5)
+    angles = np.deg2rad(np.arange(22.15, 342.15, 45))
+    rng = np.random.default_rng(6)
+    ranges = rng.uniform(20, 150, size=(updates, 8))
+
+    def run():
+        pose = (0.0, 0.0, 0.0)
+        for i in range(updates):
+            new_pose = (pose[0] + 2.0, pose[1], pose[2] + 0.01)
+            mcl.predict(pose, new_pose)
+            mcl.correct(ranges[i], angles)
+            pose = new_pose
+
+    rate = best_rate(run, updates, 3)
+    return {f"localization_updates_per_s_{particles // 1000}k_particles": rate}
+
+
+def bench_pose_graph(keyframes: int, repeat: int) -> dict:
+    from pose_graph import optimize_pose_graph, compose, between
+    # A circular drive with noisy odometry edges, closed by loop edges back to the start
+    angles = np.linspace(0, 2 * np.pi, keyframes, endpoint=False)
+    truth = np.column_stack((300 * np.cos(angles), 300 * np.sin(angles), angles + np.pi / 2))
+    rng = np.random.default_rng(7)
+    i = np.arange(keyframes - 1)
+    measured = between(truth[i], truth[i + 1]) + rng.normal(0, (1.0, 1.0, 0.002), (keyframes - 1, 3))
+    initial = [truth[0]]
+    for z in measured:
+        initial.append(compose(initial[-1], z))
+    loops_i = np.arange(0, 30, 3)
+    loops_j = keyframes - 1 - loops_i
+    edges_i = np.concatenate((i, loops_i))
+    edges_j = np.concatenate((i + 1, loops_j))
+    z = np.concatenate((measured, between(truth[loops_i], truth[loops_j])))
+    information = np.tile(np.diag((1.0, 1.0, 2.5e5)), (len(z), 1, 1))
+
+    def run():
+        optimize_pose_graph(np.array(initial), edges_i, edges_j, z, information)
+
+    per_second = best_rate(run, 1, repeat)
+    return {f"pose_graph_optimize_ms_{keyframes // 1000}k_keyframes": 1e3 / per_second}
+
+
+def bench_path_planner(cells: int, repeat: int) -> dict:
+    from occupancy_grid import OccupancyGrid
+    from path_planner import GridPlanner, IncrementalPlanner
+    # A 10 x 10 m floor at 2 cm resolution: four walls with two doors each, plus scattered boxes
+    grid = OccupancyGrid(resolution=2.0)
+    log_odds = np.full((cells, cells), -2.0, dtype=np.float32)
+    rng = np.random.default_rng(8)
+    for k in range(1, 5):
+        x = k * cells // 5
+        log_odds[x:x + 3, :] = 3.0
+        for door in rng.integers(20, cells - 20, 2):
+            log_odds[x:x + 3, door:door + 30] = -2.0
+    for cx, cy in rng.integers(0, cells - 8, (60, 2)):
+        log_odds[cx:cx + 8, cy:cy + 8] = 3.0
+    grid.log_odds = log_odds
+    planner = GridPlanner(grid)
+    goal = 2.0 * cells - 20
+    planner.plan(20, 20, goal, goal)  # Builds the cached cost map
+
+    def run():
+        if planner.plan(20, 20, goal, goal) is None:
+            raise RuntimeError("benchmark floor has no path")
+
+    per_second = best_rate(run, 1, repeat)
+    results = {f"path_planner_ms_{cells}x{cells}_grid": 1e3 / per_second}
+
+    # Path repair during a move: the robot advances 1 cm per scan along the diagonal
+    # and every scan sees obstacles at random ranges, then the path is repaired
+    repairer = IncrementalPlanner(grid)
+    repairer.plan(20, 20, goal, goal)
+    angles = np.deg2rad(np.arange(22.5, 360, 45))
+    ranges = rng.uniform(30, 150, (200, len(angles)))
+    elapsed = 0.0
+    for i, distances in enumerate(ranges):
+        position = 20 + i / np.sqrt(2)
+        grid.integrate_scan(position, position, angles, distances)
+        start = time.perf_counter()
+        repairer.replan(position, position)
+        elapsed += time.perf_counter() - start
+    results["path_repair_ms_per_scan"] = elapsed * 1e3 / len(ranges)
+    return results
+
+
+def bench_render(point_counts, frames: int) -> dict:
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PyQt5 import QtWidgets
+        from robot_view import RobotPlotView
+    except ImportError:
+        return {}
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+    results = {}
+    rng = np.random.default_rng(4)
+    for n in point_counts:
+        robot = make_robot()
+        for i in range(200):
+            robot.pose_estimator.update(i % 360, i, i * 0.01)
+        xy = rng.uniform(-5000, 5000, size=(2, n))
+        robot.end_points.add_points(xy[0], xy[1])
+        view = RobotPlotView(robot, refresh_interval_ms=1000000)
+        view.timer.stop()
+        timings = []
+        for _ in range(frames):
+            view._dirty.set()
+            start = time.perf_counter()
+            view.update_plot()
+            app.processEvents()
+            timings.append(time.perf_counter() - start)
+        results[f"update_plot_ms_{n // 1000}k_points"] = statistics.median(timings) * 1e3
+        view.close()
+        robot.close()
+    return results
+
+
+# Metrics where a larger value is a regression; every other metric is a rate.
+LOWER_IS_BETTER = ("_us_per_scan", "_ms_", "_loss_rate")
+
+
+def lower_is_better(name: str) -> bool:
+    return any(token in name for token in LOWER_IS_BETTER)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Returns (metric, baseline, current, change) for every metric worse than tolerance."""
+    regressions = []
+    for name, value in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        if name.endswith("_loss_rate"):
+            # Absolute comparison: loss rates are often zero
+            change = value - old
+            worse = change > tolerance
+        elif old == 0:
+            continue
+        else:
+            change = (value - old) / abs(old)
+            worse = change > tolerance if lower_is_better(name) else change < -tolerance
+        if worse:
+            regressions.append((name, old, value, change))
+    return regressions
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the TeraRanger TwinDrive host pipeline.")
+    parser.add_argument("--output", default=None, help="Write the JSON results to this file (default: stdout).")
+    parser.add_argument("--baseline", default=None, help="Previous JSON results to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative slowdown before a metric counts as a regression.")
+    parser.add_argument("--log", default=None, help="Flight log to benchmark replay with.")
+    parser.add_argument("--lines", type=int, default=20000, help="Lines per parse benchmark run.")
+    parser.add_argument("--receive-duration", type=float, default=2.0, help="Seconds per receive benchmark.")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions (the best one counts).")
+    parser.add_argument("--skip", nargs="*", default=[],
+                        choices=["parse", "receive", "scan", "replay", "localization", "pose_graph", "path_planner",
+                                 "render"],
+                        help="Benchmarks to skip.")
+    args = parser.parse_args()
+
+    results = {}
+    if "parse" not in args.skip:
+        results.update(bench_parse(args.lines, args.repeat))
+    if "receive" not in args.skip:
+        for mode in ("blocking", "batched"):
+            for data_format in ("text", "binary"):
+                results.update(bench_receive(mode, data_format, args.receive_duration))
+    if "scan" not in args.skip:
+        results.update(bench_scan_projection(4096, args.repeat))
+    if "replay" not in args.skip and args.log:
+        results.update(bench_replay(args.log))
+    if "localization" not in args.skip:
+        results.update(bench_localization(5000, 50))
+    if "pose_graph" not in args.skip:
+        results.update(bench_pose_graph(1000, args.repeat))
+    if "path_planner" not in args.skip:
+        results.update(bench_path_planner(500, args.repeat))
+    if "render" not in args.skip:
+        results.update(bench_render((1000, 10000, 100000), frames=20))
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for name, old, value, change in regressions:
+            print(f"❌ Regression in {name}: {old:.4g} -> {value:.4g} ({change:+.1%})", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"✅ No regressions against '{args.baseline}' (tolerance {args.tolerance:.0%}).", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Tests for the CommandChannel queue policy.
+
+    python -m pytest tests/test_Command_Channel
+"""
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, REPO_ROOT)
+
+from command_channel import CommandChannel  # noqa: E402
+
+
+@pytest.fixture
+def channel():
+    """A channel whose sender thread is stopped, so queued commands stay in the queue."""
+    channel = CommandChannel("127.0.0.1", 9)
+    channel.close()
+    yield channel
+    channel.sock.close()
+
+
+def queued(channel: CommandChannel) -> list:
+    return [entry[1] for entry in channel._queue]
+
+
+def test_newest_move_goes_to_the_tail(channel):
+    channel.send("MOVE,100,50")
+    channel.send("TURN,90,50")
+    channel.send("LED,1")
+    channel.send("MOVE,200,50")
+    assert queued(channel) == ["TURN,90,50", "LED,1", "MOVE,200,50"]
+    assert channel.coalesced == 1
+
+
+def test_newest_turn_replaces_the_pending_one(channel):
+    channel.send("TURN,90,50")
+    channel.send("MOVE,100,50")
+    channel.send("TURN,-45,50")
+    assert queued(channel) == ["MOVE,100,50", "TURN,-45,50"]
+    assert channel.coalesced == 1
+
+
+def test_stop_jumps_the_queue_and_drops_moves(channel):
+    channel.send("LED,1")
+    channel.send("MOVE,100,50")
+    channel.send("TURN,90,50")
+    channel.send("STOP")
+    assert queued(channel) == ["STOP", "LED,1"]
+    assert channel.preempted == 2
+    assert channel.stats()["queue_depth"] == 2
@@ -0,0 +1,75 @@
+"""
+Tests for the LinkMonitor sequence accounting.
+
+    python -m pytest tests/test_Link_Monitor
+"""
+import os
+import sys
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, REPO_ROOT)
+
+from link_monitor import LinkMonitor  # noqa: E402
+
+INTERVAL_MS = 10
+
+
+def feed(monitor: LinkMonitor, seqs, start_ms: int = 100000) -> list:
+    """Observes the given sequence numbers, each sent and received at seq * INTERVAL_MS."""
+    return [monitor.observe(seq, start_ms + seq * INTERVAL_MS, (start_ms + seq * INTERVAL_MS) / 1e3)
+            for seq in seqs]
+
+
+def test_in_order_stream():
+    monitor = LinkMonitor(expected_interval_ms=INTERVAL_MS)
+    assert all(feed(monitor, range(100)))
+    stats = monitor.snapshot()
+    assert (stats["accepted"], stats["lost"], stats["reordered"], stats["duplicates"]) == (100, 0, 0, 0)
+    assert stats["jitter_ms"] == 0.0
+
+
+def test_loss_reorder_and_duplicates():
+    monitor = LinkMonitor(expected_interval_ms=INTERVAL_MS)
+    accepted = feed(monitor, [0, 1, 3, 2, 3, 6, 7, 7])
+    assert accepted == [True, True, True, False, False, True, True, False]
+    stats = monitor.snapshot()
+    # 2 arrived late (no longer lost), 4 and 5 never arrived
+    assert stats["lost"] == 2
+    assert stats["reordered"] == 1
+    assert stats["duplicates"] == 2
+    assert stats["accepted"] == 5
+    assert stats["received"] == 8
+    assert stats["loss_rate"] == 2 / 7
+
+
+def test_late_frame_seen_twice_is_a_duplicate():
+    monitor = LinkMonitor(expected_interval_ms=INTERVAL_MS)
+    feed(monitor, [0, 2, 1, 1])
+    stats = monitor.snapshot()
+    assert (stats["lost"], stats["reordered"], stats["duplicates"]) == (0, 1, 1)
+
+
+def test_sequence_wraps_at_32_bits():
+    monitor = LinkMonitor(expected_interval_ms=INTERVAL_MS)
+    assert all(feed(monitor, [2 ** 32 - 2, 2 ** 32 - 1]))
+    assert monitor.observe(0, 200000, 200.0)
+    assert monitor.snapshot()["lost"] == 0
+
+
+def test_restart_detected_from_sender_timestamp():
+    monitor = LinkMonitor(expected_interval_ms=INTERVAL_MS)
+    feed(monitor, range(50), start_ms=600000)
+    # The ESP32 rebooted: its counter and millis() start over, only a few frames in
+    assert monitor.observe(3, 2000, 700.0)
+    assert monitor.observe(4, 2010, 700.01)
+    stats = monitor.snapshot()
+    assert stats["restarts"] == 1
+    assert (stats["duplicates"], stats["reordered"]) == (0, 0)
+
+
+def test_reordered_frame_is_not_a_restart():
+    monitor = LinkMonitor(expected_interval_ms=INTERVAL_MS)
+    feed(monitor, range(50))
+    # A few send intervals late: same sender clock, older sequence number
+    assert not monitor.observe(45, 100000 + 45 * INTERVAL_MS, 100.6)
+    assert monitor.snapshot()["restarts"] == 0
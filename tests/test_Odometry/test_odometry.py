@@ -0,0 +1,66 @@
+"""
+Tests that batched odometry integration matches the per-sample update.
+
+    python -m pytest tests/test_Odometry
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, REPO_ROOT)
+
+from odometry import DifferentialDriveOdometry  # noqa: E402
+
+TICKS_PER_CM = 20.0
+WHEEL_BASE = 15.0
+
+
+def telemetry_stream(count: int, seed: int = 7) -> tuple:
+    """
+    Returns (rows, timestamps) of a robot alternating between straight stretches
+    and turns in both directions, with RB yaw wrapping at 360 and a noisy gyro.
+    """
+    rng = np.random.default_rng(seed)
+    left = right = 0.0
+    heading = 0.0  # Clockwise, like the RB yaw
+    odometer = 0.0
+    rows = []
+    for i in range(count):
+        step = rng.uniform(0.0, 1.0)
+        turn = (0.0, 0.4, -0.6)[(i // 40) % 3] * rng.uniform(0.5, 1.0)
+        d_left, d_right = step + turn, step - turn
+        left += d_left * TICKS_PER_CM
+        right += d_right * TICKS_PER_CM
+        heading += np.degrees((d_left - d_right) / WHEEL_BASE)
+        odometer += step
+        gyro = (heading + rng.normal(0.0, 0.5)) % 360
+        rows.append([gyro, round(odometer), 100, 0, 0, round(left), round(right)])
+    return np.array(rows), 0.01 * np.arange(count)
+
+
+def make_odometry() -> DifferentialDriveOdometry:
+    odometry = DifferentialDriveOdometry(capacity=2000, wheel_base=WHEEL_BASE, ticks_per_cm=TICKS_PER_CM)
+    odometry.reset(timestamp=-0.01)  # The origin pose is stamped with the wall clock otherwise
+    return odometry
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 8, 500])
+def test_update_batch_matches_update(chunk):
+    rows, timestamps = telemetry_stream(1500)
+
+    scalar = make_odometry()
+    for row, t in zip(rows, timestamps):
+        scalar.update(row[0], row[1], t, row[5], row[6])
+
+    batched = make_odometry()
+    for start in range(0, len(rows), chunk):
+        batched.update_batch(rows[start:start + chunk], timestamps[start:start + chunk])
+
+    assert batched.sample_count == scalar.sample_count == len(rows)
+    expected, actual = scalar.history.view(), batched.history.view()
+    assert expected.shape == actual.shape
+    assert np.allclose(actual, expected, rtol=0.0, atol=1e-6)
+    assert np.allclose(batched.latest_pose(), scalar.latest_pose(), rtol=0.0, atol=1e-6)
@@ -0,0 +1,98 @@
+"""
+Tests that the incremental cost map and path repairs match planning from scratch.
+
+    python -m pytest tests/test_Path_Planner
+"""
+import math
+import os
+import sys
+
+import numpy as np
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, REPO_ROOT)
+
+from esp32_emulator import FloorPlan  # noqa: E402
+from occupancy_grid import OccupancyGrid  # noqa: E402
+from path_planner import CostMap, IncrementalPlanner  # noqa: E402
+
+# A 300 x 200 cm room with two partition walls
+WALLS = [(-150, -100, 150, -100), (150, -100, 150, 100), (150, 100, -150, 100), (-150, 100, -150, -100),
+         (40, -50, 40, 100), (-60, -100, -60, 20)]
+# Obstacles the robot only discovers while driving
+HIDDEN_WALLS = WALLS + [(-20, -100, -20, -30), (80, 20, 80, 100)]
+BEAM_ANGLES = np.deg2rad(np.arange(22.15, 342.15, 45))  # The 8 ToF sensors
+MAX_RANGE = 200.0
+
+
+def integrate(grid: OccupancyGrid, floor_plan: FloorPlan, x: float, y: float, theta: float):
+    """Integrates the scan the ToF sensors would see at the given pose."""
+    angles = theta + BEAM_ANGLES
+    distances = floor_plan.raycast(x, y, angles, MAX_RANGE)
+    distances = np.where(distances > 0, distances, np.inf)
+    grid.integrate_scan(x, y, angles, np.minimum(distances, MAX_RANGE + 50))
+
+
+def explored_grid(scans: int, rng: np.random.Generator) -> OccupancyGrid:
+    grid = OccupancyGrid()
+    floor_plan = FloorPlan(WALLS)
+    for _ in range(scans):
+        integrate(grid, floor_plan, rng.uniform(-140, 140), rng.uniform(-90, 90), rng.uniform(0, math.tau))
+    return grid
+
+
+def cost_to_goal(planner: IncrementalPlanner) -> float:
+    start = planner._start
+    return min(planner._g[start], planner._rhs[start])
+
+
+def test_replan_matches_fresh_plan():
+    grid = explored_grid(400, np.random.default_rng(1))
+    hidden = FloorPlan(HIDDEN_WALLS)
+    goal_x, goal_y = 120.0, 80.0
+    x, y = -120.0, -80.0
+    planner = IncrementalPlanner(grid)
+    waypoints = planner.plan(x, y, goal_x, goal_y)
+    assert waypoints
+
+    checked = 0
+    for _ in range(2000):
+        if not waypoints or math.hypot(goal_x - x, goal_y - y) < 3:
+            break
+        waypoint_x, waypoint_y = waypoints[0]
+        distance = math.hypot(waypoint_x - x, waypoint_y - y)
+        if distance < 1.0:
+            waypoints = waypoints[1:]
+            continue
+        theta = math.atan2(waypoint_y - y, waypoint_x - x)
+        x += min(0.5, distance) * math.cos(theta)
+        y += min(0.5, distance) * math.sin(theta)
+        integrate(grid, hidden, x, y, theta)
+        waypoints = planner.replan(x, y)
+        if planner.repairs > checked * 5:
+            fresh = IncrementalPlanner(grid)
+            fresh_waypoints = fresh.plan(x, y, goal_x, goal_y)
+            assert (waypoints is None) == (fresh_waypoints is None)
+            # Costs come from float32 obstacle distances, so allow for their rounding
+            assert math.isclose(cost_to_goal(planner), cost_to_goal(fresh), rel_tol=1e-6)
+            checked += 1
+    assert checked >= 10
+    # The hidden walls were discovered and driven around
+    assert math.hypot(goal_x - x, goal_y - y) < 3
+
+
+def test_journaled_update_matches_rebuild():
+    rng = np.random.default_rng(3)
+    grid = explored_grid(50, rng)
+    floor_plan = FloorPlan(WALLS)
+    cost_map = CostMap()
+    assert cost_map.update(grid) is None  # The first update builds the layout
+    for _ in range(300):
+        integrate(grid, floor_plan, rng.uniform(-140, 140), rng.uniform(-90, 90), rng.uniform(0, math.tau))
+        cost_map.update(grid)
+    assert cost_map.partial_updates > 0
+
+    rebuilt = CostMap()
+    rebuilt.update(grid)
+    assert (rebuilt.shape, rebuilt.origin_cell) == (cost_map.shape, cost_map.origin_cell)
+    assert np.allclose(cost_map.costs, rebuilt.costs, rtol=1e-6, atol=0.0)
@@ -0,0 +1,68 @@
+"""
+Regression tests for PoseEKF pose corrections.
+
+    python -m pytest tests/test_Pose_Estimator
+"""
+import math
+import os
+import sys
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, REPO_ROOT)
+
+from pose_estimator import PoseEKF  # noqa: E402
+
+# Tight variances, as used by the localization reset and the pose graph
+POSITION_VAR = 1e-9
+HEADING_VAR = 1e-12
+
+
+def drive_straight(ekf: PoseEKF, start: int, count: int, step_cm: float = 0.5, ticks_per_cm: float = 20.0):
+    """Feeds samples of a robot driving straight ahead with a constant gyro yaw of 0."""
+    for i in range(start, start + count):
+        ticks = i * step_cm * ticks_per_cm
+        ekf.update(0, i * step_cm, i * 0.01, ticks, ticks)
+
+
+def test_heading_stays_after_lateral_fix():
+    ekf = PoseEKF()
+    drive_straight(ekf, 0, 6)  # 2.5 cm straight ahead
+    ekf.correct_pose(2.5, 1.0, 0.0, POSITION_VAR, HEADING_VAR)
+    _, _, theta, _ = ekf.latest_pose()
+    assert abs(theta) < 1e-6
+    assert abs(ekf.robot_yaw_deg(0.0)) < 1e-3
+
+    drive_straight(ekf, 6, 24)
+    x, y, theta, _ = ekf.latest_pose()
+    assert abs(math.degrees(theta)) < 0.1
+    assert abs(y - 1.0) < 0.05
+    assert x > 2.5
+
+
+def test_far_fix_sets_heading_and_gyro_offset():
+    ekf = PoseEKF()
+    drive_straight(ekf, 0, 6)
+    ekf.correct_pose(100.0, 100.0, 1.0, POSITION_VAR, HEADING_VAR)
+    _, _, theta, _ = ekf.latest_pose()
+    assert abs(theta - 1.0) < 1e-6
+    # The gyro still reads 0, so the offset is the whole applied heading change
+    assert abs(math.radians(ekf.robot_yaw_deg(0.0)) - 1.0) < 1e-6
+
+    drive_straight(ekf, 6, 24)
+    _, _, theta, _ = ekf.latest_pose()
+    assert abs(theta - 1.0) < math.radians(0.1)
+
+
+def test_set_pose_applies_the_whole_move():
+    ekf = PoseEKF()
+    drive_straight(ekf, 0, 6)
+    # Stationary between two pose graph optimizations: the covariance is already tiny
+    ekf.correct_pose(60.0, 0.0, 0.0, POSITION_VAR, HEADING_VAR)
+    ekf.set_pose(70.0, 5.0, 0.5)
+    x, y, theta, _ = ekf.latest_pose()
+    assert (round(x, 6), round(y, 6), round(theta, 6)) == (70.0, 5.0, 0.5)
+    assert abs(math.radians(ekf.robot_yaw_deg(0.0)) - 0.5) < 1e-6
+
+    drive_straight(ekf, 6, 10)
+    _, _, theta, _ = ekf.latest_pose()
+    assert abs(theta - 0.5) < math.radians(0.1)
@@ -0,0 +1,68 @@
+"""
+Round-trip tests for the binary telemetry wire format.
+
+    python -m pytest tests/test_Telemetry_Codec
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, REPO_ROOT)
+
+import telemetry_codec  # noqa: E402
+from telemetry_codec import TelemetryDecodeError  # noqa: E402
+
+TOF = [120, -1, 2000, 0, 455, 32767, -32768, 7]
+ROBOT = [359, -123456, 255, 1, 0, 2 ** 31 - 1, -2 ** 31]
+
+
+def test_v1_round_trip():
+    data = telemetry_codec.encode_frame(TOF, ROBOT)
+    assert len(data) == telemetry_codec.FRAME_V1.itemsize
+    assert telemetry_codec.is_binary_frame(data)
+    frames = telemetry_codec.decode_frames(data)
+    assert frames.dtype == telemetry_codec.FRAME_V1
+    assert telemetry_codec.tof_values(frames).tolist() == [TOF]
+    assert telemetry_codec.robot_values(frames).tolist() == [ROBOT]
+
+
+def test_v2_round_trip_of_several_frames():
+    data = b"".join(telemetry_codec.encode_frame(TOF, ROBOT, seq=seq, timestamp_ms=10 * seq)
+                    for seq in (2 ** 32 - 1, 2 ** 32, 5))
+    frames = telemetry_codec.decode_frames(data)
+    assert frames.dtype == telemetry_codec.FRAME_V2
+    # The sequence number and the timestamp wrap at 32 bits
+    assert frames["seq"].tolist() == [2 ** 32 - 1, 0, 5]
+    assert frames["timestamp_ms"].tolist() == [(10 * (2 ** 32 - 1)) % 2 ** 32, (10 * 2 ** 32) % 2 ** 32, 50]
+    assert np.array_equal(telemetry_codec.tof_values(frames), np.tile(TOF, (3, 1)))
+    assert np.array_equal(telemetry_codec.robot_values(frames), np.tile(ROBOT, (3, 1)))
+
+
+def test_text_datagram_is_not_binary():
+    assert not telemetry_codec.is_binary_frame(b"MF\t1\t2")
+    with pytest.raises(TelemetryDecodeError):
+        telemetry_codec.decode_frames(b"SQ\t1\t10\r\nMF\t1")
+
+
+def test_bad_magic_inside_a_buffer():
+    frame = telemetry_codec.encode_frame(TOF, ROBOT, seq=1)
+    with pytest.raises(TelemetryDecodeError):
+        telemetry_codec.decode_frames(frame + b"\x00" + frame[1:])
+
+
+def test_unknown_version():
+    frame = bytearray(telemetry_codec.encode_frame(TOF, ROBOT))
+    frame[2] = 9
+    with pytest.raises(TelemetryDecodeError):
+        telemetry_codec.decode_frames(bytes(frame))
+
+
+@pytest.mark.parametrize("seq", [None, 1])
+def test_short_frame(seq):
+    frame = telemetry_codec.encode_frame(TOF, ROBOT, seq=seq)
+    for length in (2, len(frame) - 1, len(frame) + 3):
+        with pytest.raises(TelemetryDecodeError):
+            telemetry_codec.decode_frames((frame * 2)[:length])
@@ -0,0 +1,117 @@
+import logging
+import selectors
+import socket
+import struct
+import threading
+
+# Linux reports the number of datagrams the kernel dropped on a socket (receive
+# buffer full) as ancillary data when SO_RXQ_OVFL is enabled.
+SO_RXQ_OVFL = getattr(socket, "SO_RXQ_OVFL", 40)
+
+
+class BatchedUdpReceiver:
+    """
+    Non-blocking UDP ingest that drains every queued datagram per wakeup.
+
+    A selector waits for the socket to become readable, then all queued
+    datagrams are read with recv_into into a preallocated pool of fixed-size
+    slots and returned as one batch of memoryviews. No per-packet allocation
+    happens on the receive side; the views are only valid until the next drain.
+    """
+
+    def __init__(self, udp_socket: socket.socket, batch_size: int = 256, slot_size: int = 512):
+        """
+        Args:
+            udp_socket: A bound UDP socket; it is switched to non-blocking mode.
+            batch_size: Number of pool slots, i.e. the maximum datagrams per batch.
+            slot_size: Size of one pool slot in bytes. Longer datagrams are truncated and counted.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.sock = udp_socket
+        self.sock.setblocking(False)
+        self.batch_size = batch_size
+        self.slot_size = slot_size
+
+        self._pool = bytearray(batch_size * slot_size)
+        pool_view = memoryview(self._pool)
+        self._slots = [pool_view[i * slot_size:(i + 1) * slot_size] for i in range(batch_size)]
+
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.sock, selectors.EVENT_READ)
+
+        # recvmsg_into is not available everywhere (e.g. Windows); fall back to recv_into.
+        self._use_recvmsg = hasattr(self.sock, "recvmsg_into")
+        self._kernel_drops_supported = False
+        if self._use_recvmsg:
+            try:
+                self.sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+                self._kernel_drops_supported = True
+            except OSError:
+                self.logger.debug("SO_RXQ_OVFL not supported, kernel drop counter unavailable.")
+        self._ancbufsize = socket.CMSG_SPACE(4) if self._use_recvmsg else 0
+
+        self._stats_lock = threading.Lock()
+        self.datagrams = 0
+        self.bytes = 0
+        self.batches = 0
+        self.max_batch = 0
+        self.pool_full = 0  # Wakeups that filled every slot (remaining datagrams wait for the next drain)
+        self.truncated = 0  # Datagrams longer than slot_size
+        self.kernel_drops = 0  # Datagrams dropped by the kernel because the receive buffer was full
+
+    def wait_and_drain(self, timeout: float = 1.0) -> list:
+        """
+        Waits up to timeout seconds for data, then reads every queued datagram.
+
+        Returns:
+            A list of memoryviews, one per datagram (empty on timeout).
+        """
+        if not self._selector.select(timeout):
+            return []
+
+        batch = []
+        truncated = 0
+        for slot in self._slots:
+            try:
+                if self._use_recvmsg:
+                    nbytes, ancdata, flags, _ = self.sock.recvmsg_into([slot], self._ancbufsize)
+                    if flags & socket.MSG_TRUNC:
+                        truncated += 1
+                    for level, kind, data in ancdata:
+                        if level == socket.SOL_SOCKET and kind == SO_RXQ_OVFL and len(data) >= 4:
+                            # Cumulative counter maintained by the kernel for this socket
+                            self.kernel_drops = struct.unpack("=I", data[:4])[0]
+                else:
+                    nbytes = self.sock.recv_into(slot)
+            except (BlockingIOError, InterruptedError):
+                break
+            batch.append(slot[:nbytes])
+
+        with self._stats_lock:
+            n = len(batch)
+            self.datagrams += n
+            self.bytes += sum(len(v) for v in batch)
+            self.truncated += truncated
+            if n:
+                self.batches += 1
+                self.max_batch = max(self.max_batch, n)
+            if n == self.batch_size:
+                self.pool_full += 1
+        return batch
+
+    def stats(self) -> dict:
+        """Returns a snapshot of the ingest counters."""
+        with self._stats_lock:
+            return {
+                "datagrams": self.datagrams,
+                "bytes": self.bytes,
+                "batches": self.batches,
+                "max_batch": self.max_batch,
+                "avg_batch": self.datagrams / self.batches if self.batches else 0.0,
+                "pool_full": self.pool_full,
+                "truncated": self.truncated,
+                "kernel_drops": self.kernel_drops if self._kernel_drops_supported else None,
+            }
+
+    def close(self):
+        self._selector.close()